@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Memory and speed of the connection affinity table.
+
+Fills lb.affinity.AffinityTable with N connections and reports the memory
+it takes per entry (from tracemalloc), the cost of a lookup, and the cost
+of expiring all of them.  For comparison, "tuple-dict" keeps entries the
+way ip_loadbalancer does: a dict keyed by a tuple of IPAddrs and ports,
+holding an object with the server and a timeout, expired by scanning the
+whole dict.
+
+Run from the top of the repository:
+  python benchmarks/affinity_bench.py [--entries=N] [--json]
+"""
+
+import sys
+import os
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+import unittest # Makes pox.core initialize itself
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pox.lib.addresses import IPAddr
+from lb.affinity import AffinityTable, pack_key
+
+VIP = IPAddr("10.0.0.9")
+SERVERS = [IPAddr("10.0.0.%i" % i) for i in range(1, 5)]
+TTL = 300
+
+
+class Entry(object):
+    def __init__(self, server, timeout):
+        self.server = server
+        self.timeout = timeout
+
+
+class TupleDict(object):
+    """ The ip_loadbalancer way of doing it."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def insert(self, key, server, now):
+        self.entries[key] = Entry(server, now + TTL)
+
+    def lookup(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        entry.timeout = now + TTL
+        return entry.server
+
+    def expire(self, now):
+        for key in [k for k, e in self.entries.items() if e.timeout < now]:
+            del self.entries[key]
+
+
+def make_flows(count, seed=1):
+    rng = random.Random(seed)
+    return [(IPAddr(rng.getrandbits(32)), rng.randrange(1024, 65536))
+            for _ in range(count)]
+
+
+def fill(table, flows, keyfn):
+    for i, (src, sport) in enumerate(flows):
+        table.insert(keyfn(src, sport), SERVERS[i % len(SERVERS)], 0)
+
+
+def measure(make_table, keyfn, flows):
+    gc.collect()
+    tracemalloc.start()
+    table = make_table()
+    fill(table, flows, keyfn)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    probe = [keyfn(src, sport) for src, sport in flows[:100000]]
+    start = time.perf_counter()
+    for key in probe:
+        table.lookup(key, 1)
+    lookup = (time.perf_counter() - start) / len(probe) * 1e9
+
+    start = time.perf_counter()
+    table.expire(TTL + 10)
+    expire = time.perf_counter() - start
+
+    return {
+        'bytes_per_entry': size / len(flows),
+        'ns_per_lookup': lookup,
+        'expire_all_seconds': expire,
+    }
+
+
+def run(count):
+    flows = make_flows(count)
+    results = {}
+    results['tuple-dict'] = measure(
+        TupleDict,
+        lambda src, sport: (src, VIP, sport, 5001), flows)
+    results['affinity'] = measure(
+        lambda: AffinityTable(TTL, count + 1),
+        lambda src, sport: pack_key(src, VIP, 6, sport, 5001), flows)
+
+    # What a tick costs when nothing in its slot is due
+    table = AffinityTable(TTL, count + 1)
+    fill(table, flows, lambda src, sport: pack_key(src, VIP, 6, sport, 5001))
+    start = time.perf_counter()
+    for now in range(1, TTL):
+        table.expire(now)
+    results['affinity']['idle_tick_us'] = (time.perf_counter() - start) / (TTL - 1) * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    results = run(args.entries)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    print(f"{args.entries} entries")
+    print(f"{'table':<12}{'bytes/entry':>12}{'ns/lookup':>11}{'expire all (s)':>16}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['bytes_per_entry']:>12.0f}{r['ns_per_lookup']:>11.0f}"
+              f"{r['expire_all_seconds']:>16.2f}")
+    print(f"An affinity tick with nothing to expire: "
+          f"{results['affinity']['idle_tick_us']:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""
+How long new_lb takes to fail over from a dead server.
+
+Runs new_lb.LoadBalancer in-process on the topology.py switch graph, with
+stand-in switch connections which just count what is sent to them.  N
+client connections are set up through PacketIns, then one server stops
+answering health probes.  Reported:
+
+  detect     time from the server dying to it being marked down, over many
+             deaths at random points of the probe interval (simulated time)
+  flush      controller time to delete the dead server's rules, and how
+             many flow_mods and writes that took
+  recovery   whether the next packet of each of the dead server's
+             connections is sent somewhere else
+
+Run from the top of the repository:
+  python benchmarks/failover_bench.py [--connections=N] [--interval=S]
+                                      [--fall=N] [--json]
+"""
+
+import sys
+import os
+import json
+import time
+import logging
+import random
+import argparse
+import unittest # Makes pox.core initialize itself
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pox.core import core
+import pox.openflow
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.discovery import Link
+from pox.host_tracker.host_tracker import HostEvent, MacEntry
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.ipv4 import ipv4
+from pox.lib.packet.tcp import tcp
+
+import new_lb
+from lb.health import HealthChecker
+
+# (dpid1, port1, dpid2, port2), from topology.py
+LINKS = [(1, 3, 2, 1), (1, 4, 3, 3), (2, 2, 4, 1), (3, 4, 4, 2),
+         (2, 3, 5, 3), (4, 3, 6, 3), (1, 5, 4, 4), (2, 4, 3, 5)]
+SERVER_LOCATIONS = [(1, 1), (1, 2), (3, 1), (3, 2)]
+CLIENT_SWITCHES = [2, 4, 5, 6]
+CLIENT_PORT = 10
+
+
+class Switch(object):
+    """ Stands in for an of_01 Connection."""
+
+    def __init__(self, dpid):
+        self.dpid = dpid
+        self.writes = 0
+        self.flow_mods = 0
+        self.barriers = []
+
+    def send(self, data):
+        if not isinstance(data, bytes):
+            data = data.pack()
+        self.writes += 1
+        # Count flow_mods in what may be several messages
+        offset = 0
+        while offset < len(data):
+            if data[offset + 1] == of.OFPT_FLOW_MOD:
+                self.flow_mods += 1
+            elif data[offset + 1] == of.OFPT_BARRIER_REQUEST:
+                self.barriers.append(int.from_bytes(data[offset + 4:offset + 8], 'big'))
+            offset += int.from_bytes(data[offset + 2:offset + 4], 'big')
+
+    def answer_barriers(self, lb):
+        for xid in self.barriers:
+            event = Event()
+            event.dpid = self.dpid
+            event.xid = xid
+            lb._handle_openflow_BarrierIn(event)
+        self.barriers = []
+
+    def reset(self):
+        self.writes = self.flow_mods = 0
+
+
+class Discovery(object):
+    """ Stands in for openflow.discovery, whose links are fed in directly."""
+
+
+class Event(object):
+    pass
+
+
+def packet_in(switch, port, src, src_mac, sport):
+    t = tcp()
+    t.srcport = sport
+    t.dstport = new_lb.SERVICE_PORT
+    t.off = 5
+    i = ipv4(protocol=ipv4.TCP_PROTOCOL, srcip=src, dstip=new_lb.VIP)
+    i.payload = t
+    e = ethernet(type=ethernet.IP_TYPE, src=src_mac, dst=new_lb.VMAC)
+    e.payload = i
+    event = Event()
+    event.data = e.pack()
+    event.parsed = ethernet(event.data)
+    event.ofp = of.ofp_packet_in(data=event.data, in_port=port)
+    event.port = port
+    event.dpid = switch.dpid
+    event.connection = switch
+    return event
+
+
+def build(health_interval, fall):
+    pox.openflow.launch()
+    switches = {dpid: Switch(dpid) for dpid in range(1, 7)}
+    core.openflow._connections.update(switches)
+    discovery = Discovery()
+    core.register('openflow_discovery', discovery)
+
+    lb = new_lb.LoadBalancer()
+    for d1, p1, d2, p2 in LINKS:
+        for link in (Link(d1, p1, d2, p2), Link(d2, p2, d1, p1)):
+            event = Event()
+            event.added = True
+            event.link = link
+            lb._handle_openflow_discovery_LinkEvent(event)
+    for mac, (dpid, port) in zip(new_lb.SERVER_MACS, SERVER_LOCATIONS):
+        lb._handle_host_tracker_HostEvent(HostEvent(MacEntry(dpid, port, mac), join=True))
+
+    servers = list(zip(new_lb.SERVER_IPS, new_lb.SERVER_MACS))
+    health = HealthChecker(servers, lb.hosts.get, new_lb.VIP, new_lb.VMAC,
+                           health_interval, fall, start=False)
+    lb.set_health(health)
+    return lb, switches
+
+
+def connect(lb, switches, count, rng):
+    flows = []
+    for i in range(count):
+        dpid = CLIENT_SWITCHES[i % len(CLIENT_SWITCHES)]
+        src = IPAddr("10.%i.%i.%i" % (rng.randrange(1, 255), rng.randrange(256),
+                                      rng.randrange(1, 255)))
+        src_mac = EthAddr("02:00:00:%02x:%02x:%02x" % (i >> 16, (i >> 8) & 255, i & 255))
+        flows.append((switches[dpid], CLIENT_PORT, src, src_mac, rng.randrange(1024, 65536)))
+    start = time.perf_counter()
+    for flow in flows:
+        lb._handle_openflow_PacketIn(packet_in(*flow))
+        for switch in switches.values():
+            switch.answer_barriers(lb)
+    elapsed = time.perf_counter() - start
+    return flows, elapsed / count
+
+
+def probe_round(lb, dead, now):
+    """ A probe round in which everyone but dead answers."""
+    health = lb.health
+    health.probe(now)
+    for b in health._backends.values():
+        if b.ip != dead:
+            b.outstanding.clear()
+
+
+def measure_detection(interval, fall, trials, rng):
+    """ Simulated time from death to being marked down."""
+    delays = []
+    for _ in range(trials):
+        health = HealthChecker([(new_lb.S1, new_lb.S1MAC)], lambda mac: (1, 1),
+                               new_lb.VIP, new_lb.VMAC, interval, fall, start=False)
+        health._send = lambda dpid, data: True
+        downs = []
+        health.addListenerByName('BackendHealth', downs.append)
+        death = rng.uniform(0, interval)
+        now = 0.0
+        while not downs:
+            health.probe(now)
+            if now < death:
+                # Sent before it died, so it answers
+                health._backends[new_lb.S1].outstanding.clear()
+            now += interval
+        delays.append(now - interval - death)
+    delays.sort()
+    return {
+        'min': delays[0],
+        'median': delays[len(delays) // 2],
+        'max': delays[-1],
+    }
+
+
+def run(connections, interval, fall, seed=1):
+    rng = random.Random(seed)
+    lb, switches = build(interval, fall)
+    flows, setup = connect(lb, switches, connections, rng)
+
+    dead = new_lb.S1
+    rules = lb.server_rules.get(dead, {})
+    keys = set(k for k in rules if not isinstance(k, tuple))
+    on_dead = [f for f in flows
+               if new_lb.pack_key(f[2], new_lb.VIP, ipv4.TCP_PROTOCOL, f[4],
+                                  new_lb.SERVICE_PORT) in keys]
+    rule_count = sum(len(r) for r in rules.values())
+
+    probe_round(lb, None, 0.0)
+    for s in switches.values():
+        s.reset()
+    now = 0.0
+    while dead not in lb.health.down:
+        now += interval
+        start = time.perf_counter()
+        probe_round(lb, dead, now)
+        flush = time.perf_counter() - start
+    flow_mods = sum(s.flow_mods for s in switches.values())
+    # Leave the probes themselves out of the count
+    writes = sum(s.writes for s in switches.values()) - len(SERVER_LOCATIONS) * int(now / interval)
+
+    moved = 0
+    for flow in on_dead:
+        lb._handle_openflow_PacketIn(packet_in(*flow))
+        for switch in switches.values():
+            switch.answer_barriers(lb)
+        key = new_lb.pack_key(flow[2], new_lb.VIP, ipv4.TCP_PROTOCOL, flow[4],
+                              new_lb.SERVICE_PORT)
+        if key not in lb.server_rules.get(dead, {}):
+            moved += 1
+
+    return {
+        'connections': connections,
+        'setup_us_per_connection': setup * 1e6,
+        'detect_seconds': measure_detection(interval, fall, 1000, rng),
+        'flush': {
+            'seconds': flush,
+            'rules': rule_count,
+            'flow_mods': flow_mods,
+            'writes': writes,
+        },
+        'recovery': {
+            'connections_on_dead_server': len(on_dead),
+            'moved_on_next_packet': moved,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--fall", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = run(args.connections, args.interval, args.fall)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    d = results['detect_seconds']
+    f = results['flush']
+    r = results['recovery']
+    print(f"{results['connections']} connections, "
+          f"{results['setup_us_per_connection']:.0f} us each to set up")
+    print(f"detect: {d['min']:.2f}s to {d['max']:.2f}s, median {d['median']:.2f}s "
+          f"(probe every {args.interval}s, down after {args.fall} misses)")
+    print(f"flush:  {f['rules']} rules deleted with {f['flow_mods']} flow_mods in "
+          f"{f['writes']} writes, {f['seconds'] * 1000:.1f} ms")
+    print(f"recovery: {r['moved_on_next_packet']} of {r['connections_on_dead_server']} "
+          f"connections moved on their next packet")
+
+
+if __name__ == '__main__':
+    main()
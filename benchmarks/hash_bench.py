@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for per-packet flow hashing.
+
+Compares the md5 hexdigest hashing new_lb and hash_lb used to do on every
+PacketIn with lb.hashing.FlowHasher for each of its field sets.  Packets
+are parsed ipv4 objects, as the balancers see them.
+
+Run from the top of the repository:
+  python benchmarks/hash_bench.py [--packets=N] [--json]
+"""
+
+import sys
+import os
+import json
+import random
+import hashlib
+import timeit
+import argparse
+import unittest # Makes pox.core initialize itself
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pox.lib.addresses import IPAddr
+from pox.lib.packet.ipv4 import ipv4
+from pox.lib.packet.tcp import tcp
+from lb.hashing import FlowHasher, FIELDS
+
+
+def make_packets(count, seed=1):
+    rng = random.Random(seed)
+    packets = []
+    for _ in range(count):
+        t = tcp()
+        t.srcport = rng.randrange(1024, 65536)
+        t.dstport = 5001
+        ip = ipv4()
+        ip.srcip = IPAddr(rng.getrandbits(32))
+        ip.dstip = IPAddr("10.0.0.9")
+        ip.protocol = ipv4.TCP_PROTOCOL
+        ip.payload = t
+        packets.append(ipv4(raw=ip.pack()))
+    return packets
+
+
+def md5_hash(ip):
+    combined = str(ip.srcip) + str(ip.dstip)
+    return int(hashlib.md5(combined.encode()).hexdigest(), 16)
+
+
+def run(count):
+    packets = make_packets(count)
+    results = {}
+
+    def timed(fn):
+        return timeit.timeit(lambda: [fn(p) for p in packets], number=5) / (5 * count) * 1e9
+
+    results['md5'] = {'ns_per_packet': timed(md5_hash)}
+    for fields in FIELDS:
+        hasher = FlowHasher(fields)
+        buckets = [0] * 16
+        for p in packets:
+            buckets[hasher.hash(p) & 15] += 1
+        results[fields] = {
+            'ns_per_packet': timed(hasher.hash),
+            'bucket_spread': max(buckets) / (count / 16.0),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    results = run(args.packets)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    base = results['md5']['ns_per_packet']
+    print(f"{'hash':<14}{'ns/packet':>10}{'speedup':>9}{'max/mean of 16 buckets':>24}")
+    for name, r in results.items():
+        line = f"{name:<14}{r['ns_per_packet']:>10.0f}{base / r['ns_per_packet']:>8.1f}x"
+        if 'bucket_spread' in r:
+            line += f"{r['bucket_spread']:>24.2f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+"""
+cbench-style PacketIn throughput benchmark for new_lb and hash_lb.
+
+Like oflops' cbench, this connects many emulated switches to a controller
+and keeps them sending PacketIns, counting the controller's responses per
+loop, but the PacketIns are new connections to the VIP, so the balancer
+runs its real code path rather than cbench.py's dummy responder.  The
+load generator is bundled (it speaks just enough OpenFlow 1.0 itself, over
+local sockets), so no cbench binary or Mininet is needed.
+
+For each switch count the controller is started afresh in its own
+process, on a star fabric: switch 1 has the four servers, which announce
+themselves with ARP, and switches 2 to N+1 each have a client port and an
+uplink to it.  LLDP the controller sends out of a port is handed to the
+switch at the other end, and every uplink also gets one LLDP PacketIn of
+its own, as hash_lb has no discovery and learns its switch ports from
+them.  A response is the packet_out sending on the PacketIn's buffer,
+which new_lb only sends once the path's flow_mods are confirmed.
+
+Each switch keeps --window PacketIns outstanding (cbench's throughput
+mode; 1 is its latency mode), and one which hasn't been answered in a
+second is counted as lost and replaced.  Once every switch has had a
+response, --warmup loops are run and ignored, then --loops loops of
+--duration milliseconds are measured.  Reported per switch count, as
+JSON: responses a second per loop with min/max/mean/stdev, latency
+percentiles (milliseconds), responses per switch (min and max), flow_mods
+and lost PacketIns.
+
+Run from the top of the repository:
+  python benchmarks/lb_cbench.py [--controller=new_lb|hash_lb]
+                                 [--switches=1,4,16] [--window=N]
+                                 [--loops=N] [--warmup=N] [--duration=MS]
+                                 [--flows=N] [--workers=N] [--output=FILE]
+
+--workers=N runs hash_lb as N processes sharing the OpenFlow port (see
+lb.sharding), which only helps with as many cores to run them on.
+"""
+
+import sys
+import os
+import json
+import time
+import errno
+import socket
+import struct
+import random
+import argparse
+import selectors
+import statistics
+import subprocess
+import unittest # Makes pox.core initialize itself
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.discovery import LLDPSender
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.arp import arp
+from pox.lib.packet.ipv4 import ipv4
+from pox.lib.packet.tcp import tcp
+
+# From new_lb; not imported, as it needs a running core
+VIP = IPAddr("10.0.0.9")
+VMAC = EthAddr("00:00:00:00:00:09")
+SERVICE_PORT = 5001
+SERVERS = [(IPAddr("10.0.0.%i" % i), EthAddr("00:00:00:00:00:%02x" % i)) for i in range(1, 5)]
+
+HUB = 1
+UPLINK = 1
+CLIENT_PORT = 2
+
+# How long a PacketIn may go unanswered, how long the controller gets to
+# answer every switch, and how often the servers announce themselves
+RESPONSE_TIMEOUT = 1.0
+SETUP_TIMEOUT = 30
+ANNOUNCE_INTERVAL = 1.0
+
+CONTROLLERS = {
+    'new_lb': ["openflow.discovery", "--link_timeout=5", "host_tracker", "new_lb",
+               "--health_interval=0", "--affinity_ttl=0", "--slow_start=0"],
+    'hash_lb': ["hash_lb"],
+}
+
+_HEADER = struct.Struct("!BBHL")
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    rank = max(0, -(-len(values) * p // 100) - 1)
+    return values[int(rank)]
+
+
+def switch_mac(dpid, port):
+    return EthAddr(struct.pack("!BBHH", 2, 0, dpid, port))
+
+
+def packet_in(port, frame):
+    """ A packed PacketIn; the xid and buffer_id are filled in as it's sent."""
+    return bytearray(of.ofp_packet_in(buffer_id=0, in_port=port, reason=of.OFPR_NO_MATCH,
+                                      data=frame).pack())
+
+
+def client_flows(dpid, flows, seed):
+    """
+    PacketIns for flows new connections from behind an edge switch, from
+    250 client addresses of its own
+    """
+    rng = random.Random(seed * 65536 + dpid)
+    mac = switch_mac(dpid, CLIENT_PORT)
+    result = []
+    for i in range(flows):
+        t = tcp(srcport=1024 + i // 250, dstport=SERVICE_PORT)
+        t.SYN = True
+        t.off = 5
+        t.seq = rng.getrandbits(32)
+        ip = ipv4(protocol=ipv4.TCP_PROTOCOL, dstip=VIP,
+                  srcip=IPAddr("10.%i.%i.%i" % (100 + (dpid >> 8), dpid & 255, i % 250 + 1)))
+        ip.payload = t
+        e = ethernet(type=ethernet.IP_TYPE, src=mac, dst=VMAC)
+        e.payload = ip
+        result.append(packet_in(CLIENT_PORT, e.pack()))
+    return result
+
+
+def announcement(ip, mac):
+    """ An ARP request from a server, for host_tracker to see."""
+    a = arp(opcode=arp.REQUEST, protosrc=ip, hwsrc=mac, protodst=IPAddr("10.0.0.254"))
+    e = ethernet(type=ethernet.ARP_TYPE, src=mac, dst=EthAddr("ff:ff:ff:ff:ff:ff"))
+    e.payload = a
+    return e.pack()
+
+
+class EmulatedSwitch(object):
+    """ One switch's connection to the controller."""
+
+    def __init__(self, generator, dpid, ports, flows):
+        self.generator = generator
+        self.dpid = dpid
+        self.ports = ports
+        self.flows = flows
+        self.next_flow = 0
+        self.sock = None
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.up = False
+        self.xid = 0
+
+        # buffer_id -> when its PacketIn went out
+        self.outstanding = {}
+        self.next_buffer = 0
+        self.responses = 0
+
+    def connect(self, port):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        self.sock = sock
+
+    def send(self, data):
+        self.outbuf += data
+        self.flush()
+
+    def flush(self):
+        try:
+            sent = self.sock.send(self.outbuf)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+            sent = 0
+        del self.outbuf[:sent]
+        self.generator.want_write(self, bool(self.outbuf))
+
+    def _next_xid(self):
+        self.xid = (self.xid + 1) & 0xffffffff
+        return self.xid
+
+    def packet_in(self, port, frame):
+        """ Send a PacketIn which doesn't need a response."""
+        msg = of.ofp_packet_in(in_port=port, reason=of.OFPR_NO_MATCH, data=frame)
+        msg.xid = self._next_xid()
+        self.send(msg.pack())
+
+    def fill(self, window, now):
+        """ Send new connections until window of them are outstanding."""
+        while len(self.outstanding) < window:
+            msg = self.flows[self.next_flow]
+            self.next_flow = (self.next_flow + 1) % len(self.flows)
+            buffer_id = self.next_buffer
+            self.next_buffer = (buffer_id + 1) % of.NO_BUFFER
+            struct.pack_into("!LL", msg, 4, self._next_xid(), buffer_id)
+            self.outstanding[buffer_id] = now
+            self.outbuf += msg
+        self.flush()
+
+    def expire(self, now):
+        """ Forget PacketIns which weren't answered in time; returns how many."""
+        late = [b for b, sent in self.outstanding.items() if now - sent > RESPONSE_TIMEOUT]
+        for buffer_id in late:
+            del self.outstanding[buffer_id]
+        return len(late)
+
+    def read(self):
+        try:
+            data = self.sock.recv(65536)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        if not data:
+            raise RuntimeError(f"the controller closed switch {self.dpid}'s connection")
+        self.inbuf += data
+        buf = self.inbuf
+        offset = 0
+        while len(buf) - offset >= 8:
+            version, msg_type, length, xid = _HEADER.unpack_from(buf, offset)
+            if len(buf) - offset < length:
+                break
+            self.handle(msg_type, xid, bytes(buf[offset:offset + length]))
+            offset += length
+        del buf[:offset]
+
+    def handle(self, msg_type, xid, raw):
+        if msg_type == of.OFPT_PACKET_OUT:
+            buffer_id, = struct.unpack_from("!L", raw, 8)
+            if buffer_id != of.NO_BUFFER:
+                sent = self.outstanding.pop(buffer_id, None)
+                if sent is not None:
+                    self.responses += 1
+                    self.generator.response(self, sent)
+            else:
+                msg = of.ofp_packet_out()
+                msg.unpack(raw)
+                self.generator.packet_out(self, msg)
+        elif msg_type == of.OFPT_FLOW_MOD:
+            self.generator.flow_mods += 1
+        elif msg_type == of.OFPT_BARRIER_REQUEST:
+            self.send(of.ofp_barrier_reply(xid=xid).pack())
+            if not self.up:
+                # The controller's handshake ends with a barrier
+                self.up = True
+                self.generator.switch_up(self)
+        elif msg_type == of.OFPT_ECHO_REQUEST:
+            self.send(of.ofp_echo_reply(xid=xid, body=raw[8:]).pack())
+        elif msg_type == of.OFPT_FEATURES_REQUEST:
+            ports = [of.ofp_phy_port(port_no=p, hw_addr=switch_mac(self.dpid, p),
+                                     name="s%i-eth%i" % (self.dpid, p))
+                     for p in self.ports]
+            self.send(of.ofp_features_reply(xid=xid, datapath_id=self.dpid, ports=ports,
+                                            n_buffers=256, n_tables=1).pack())
+        elif msg_type == of.OFPT_GET_CONFIG_REQUEST:
+            self.send(of.ofp_get_config_reply(xid=xid).pack())
+
+
+class LoadGenerator(object):
+    """ N edge switches and a server switch, driven from one select loop."""
+
+    def __init__(self, port, switches, window, flows, seed):
+        self.port = port
+        self.window = window
+        self.selector = selectors.DefaultSelector()
+        self.hub = EmulatedSwitch(self, HUB, range(1, len(SERVERS) + switches + 1), [])
+        self.edges = [EmulatedSwitch(self, dpid, [UPLINK, CLIENT_PORT],
+                                     client_flows(dpid, flows, seed))
+                      for dpid in range(HUB + 1, HUB + switches + 1)]
+        self.switches = {s.dpid: s for s in [self.hub] + self.edges}
+
+        # (dpid, port) <-> (dpid, port) for the uplinks
+        self.peers = {}
+        for i, edge in enumerate(self.edges):
+            hub_port = len(SERVERS) + i + 1
+            self.peers[(edge.dpid, UPLINK)] = (HUB, hub_port)
+            self.peers[(HUB, hub_port)] = (edge.dpid, UPLINK)
+
+        self.measuring = False
+        self.latencies = []
+        self.responses = 0
+        self.flow_mods = 0
+        self.lost = 0
+
+    def want_write(self, switch, wanted):
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if wanted else 0)
+        self.selector.modify(switch.sock, events, switch)
+
+    def connect(self):
+        deadline = time.time() + SETUP_TIMEOUT
+        for switch in self.switches.values():
+            while True:
+                try:
+                    switch.connect(self.port)
+                    break
+                except ConnectionRefusedError:
+                    if time.time() > deadline:
+                        raise RuntimeError("the controller didn't start listening")
+                    time.sleep(0.1)
+            self.selector.register(switch.sock, selectors.EVENT_READ, switch)
+            switch.send(of.ofp_hello().pack())
+
+    def switch_up(self, switch):
+        # Tell hash_lb which ports go to other switches
+        for (dpid, port), (peer, peer_port) in self.peers.items():
+            if dpid == switch.dpid:
+                lldp = LLDPSender._create_discovery_packet(peer, peer_port,
+                                                           switch_mac(peer, peer_port), 120)
+                switch.packet_in(port, lldp.pack())
+        if switch is self.hub:
+            self.announce()
+
+    def announce(self):
+        if not self.hub.up:
+            return
+        for port, (ip, mac) in enumerate(SERVERS, 1):
+            self.hub.packet_in(port, announcement(ip, mac))
+
+    def packet_out(self, switch, msg):
+        """ Hand LLDP the controller sends to the switch at the other end."""
+        if len(msg.data) < 14 or struct.unpack_from("!H", msg.data, 12)[0] != ethernet.LLDP_TYPE:
+            return
+        for action in msg.actions:
+            peer = self.peers.get((switch.dpid, getattr(action, 'port', None)))
+            if peer is not None and self.switches[peer[0]].up:
+                self.switches[peer[0]].packet_in(peer[1], msg.data)
+
+    def response(self, switch, sent):
+        now = time.perf_counter()
+        if self.measuring:
+            self.responses += 1
+            self.latencies.append(now - sent)
+        switch.fill(self.window, now)
+
+    def run_for(self, seconds, until=None):
+        """ Run the loop for seconds, or until until() is true."""
+        end = time.perf_counter() + seconds
+        next_check = 0
+        while True:
+            now = time.perf_counter()
+            if now >= end or (until is not None and until()):
+                return
+            if now >= next_check:
+                next_check = now + 0.1
+                for switch in self.edges:
+                    if not switch.up:
+                        continue
+                    lost = switch.expire(now)
+                    if self.measuring:
+                        self.lost += lost
+                    switch.fill(self.window, now)
+                if now >= self._next_announce:
+                    self._next_announce = now + ANNOUNCE_INTERVAL
+                    self.announce()
+            for key, mask in self.selector.select(min(0.05, end - now)):
+                switch = key.data
+                if mask & selectors.EVENT_WRITE:
+                    switch.flush()
+                if mask & selectors.EVENT_READ:
+                    switch.read()
+
+    def run(self, loops, warmup, duration):
+        """ Measure loops loops of duration seconds; returns their rates."""
+        self._next_announce = 0
+        self.connect()
+        self.run_for(SETUP_TIMEOUT,
+                     until=lambda: all(s.responses for s in self.edges))
+        if not all(s.responses for s in self.edges):
+            raise RuntimeError("not every switch got a response")
+        self.run_for(warmup * duration)
+        start = {s.dpid: s.responses for s in self.edges}
+        self.measuring = True
+        rates = []
+        for i in range(loops):
+            before = self.responses
+            self.run_for(duration)
+            rates.append((self.responses - before) / duration)
+        self.measuring = False
+        per_switch = [s.responses - start[s.dpid] for s in self.edges]
+        return rates, per_switch
+
+    def close(self):
+        for switch in self.switches.values():
+            if switch.sock is not None:
+                if switch.sock in self.selector.get_map():
+                    self.selector.unregister(switch.sock)
+                switch.sock.close()
+        self.selector.close()
+
+
+def bench(args, switches):
+    port = free_port()
+    argv = [sys.executable, os.path.join(ROOT, "pox.py"), "openflow.of_01",
+            "--address=127.0.0.1", "--port=%i" % port] + CONTROLLERS[args.controller]
+    if args.controller in ('new_lb', 'hash_lb'):
+        argv.append("--selector=%s" % args.selector)
+    if args.workers > 1:
+        argv.append("--workers=%i" % args.workers)
+    output = None if args.verbose else subprocess.DEVNULL
+    controller = subprocess.Popen(argv, cwd=ROOT, stdout=output, stderr=output)
+    generator = LoadGenerator(port, switches, args.window, args.flows, args.seed)
+    result = {'switches': switches}
+    try:
+        rates, per_switch = generator.run(args.loops, args.warmup, args.duration / 1000.0)
+    except RuntimeError as e:
+        result['error'] = str(e)
+        return result
+    finally:
+        generator.close()
+        controller.terminate()
+        controller.wait()
+    latencies = sorted(generator.latencies)
+    result.update({
+        'responses_per_second': {
+            'loops': rates,
+            'min': min(rates),
+            'max': max(rates),
+            'mean': statistics.mean(rates),
+            'stdev': statistics.stdev(rates) if len(rates) > 1 else 0.0,
+        },
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000 if latencies else None,
+            'p90': percentile(latencies, 90) * 1000 if latencies else None,
+            'p99': percentile(latencies, 99) * 1000 if latencies else None,
+            'max': latencies[-1] * 1000 if latencies else None,
+        },
+        'per_switch': {'min': min(per_switch), 'max': max(per_switch)},
+        'flow_mods': generator.flow_mods,
+        'lost': generator.lost,
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--controller", choices=sorted(CONTROLLERS), default="new_lb")
+    parser.add_argument("--switches", default="1,4,16",
+                        help="comma separated edge switch counts to try")
+    parser.add_argument("--window", type=int, default=16,
+                        help="outstanding PacketIns per switch (1 for latency mode)")
+    parser.add_argument("--loops", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="loops to ignore first")
+    parser.add_argument("--duration", type=int, default=1000,
+                        help="milliseconds a loop")
+    parser.add_argument("--flows", type=int, default=1000,
+                        help="different connections each switch cycles through")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--selector", default="modulo")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="hash_lb controller processes sharing the port")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="show POX's output")
+    args = parser.parse_args()
+    if args.workers > 1 and args.controller != 'hash_lb':
+        parser.error("--workers is only for hash_lb")
+
+    params = {k: getattr(args, k) for k in ('controller', 'window', 'loops', 'warmup',
+                                            'duration', 'flows', 'seed', 'selector',
+                                            'workers')}
+    results = [bench(args, int(n)) for n in args.switches.split(",")]
+    text = json.dumps({'params': params, 'results': results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if any('error' in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
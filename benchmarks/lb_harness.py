@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of new_lb over emulated switches, without Mininet.
+
+Boots POX with openflow.of_01 on a local port, openflow.discovery,
+host_tracker and new_lb, and connects a SoftwareSwitch for each switch of
+topology.py to it over a real socket.  Links are wired up in-process, so
+discovery finds them as it would in Mininet, and the servers announce
+themselves so host_tracker finds them.  Then a seeded workload of new
+connections (Poisson arrivals at --rate a second, from clients behind
+h5-h8) is played in at the client switches, and each connection's first
+packet is followed until it comes out of a server's port.  Reported:
+
+  latency     time from a first packet entering its switch to it reaching
+              its server: the PacketIn, new_lb, the flow_mods and
+              barriers, and the packet_out (percentiles, milliseconds)
+  throughput  PacketIns the controller got a second, and connections set
+              up a second, over the workload
+  fairness    connections per server, with Jain's index and max/mean
+
+The switches run in the controller's process and share its CPU (and
+SoftwareSwitch's flow table, a linear search, is most of it), so the
+absolute numbers are pessimistic; compare runs with the same arguments.
+The same --seed always plays the same workload.
+
+Run from the top of the repository:
+  python benchmarks/lb_harness.py [--flows=N] [--rate=R] [--seed=S]
+                                  [--selector=NAME] [--output=FILE]
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Set up core ourselves, so the harness can listen to it; boot() uses it
+import pox.core
+core = pox.core.initialize()
+
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.arp import arp
+from pox.lib.packet.ipv4 import ipv4
+from pox.lib.packet.tcp import tcp
+from pox.lib.recoco import Timer
+from lb.fairness import jain_index, max_over_mean
+
+# (dpid1, port1, dpid2, port2), from topology.py
+LINKS = [(1, 3, 2, 1), (1, 4, 3, 3), (2, 2, 4, 1), (3, 4, 4, 2),
+         (2, 3, 5, 3), (4, 3, 6, 3), (1, 5, 4, 4), (2, 4, 3, 5)]
+
+# Where h1-h4 (the servers) and h5-h8 (the clients) are, from topology.py
+SERVER_PORTS = [(1, 1), (1, 2), (3, 1), (3, 2)]
+CLIENT_PORTS = [(5, 1), (5, 2), (6, 1), (6, 2)]
+CLIENT_MACS = [EthAddr("00:00:00:00:00:%02x" % i) for i in range(5, 9)]
+
+# How often queued connections are played in, and how long to wait for
+# the fabric to come up and for the last connections
+TICK = 0.005
+SETUP_TIMEOUT = 30
+DRAIN_TIMEOUT = 10
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def workload(flows, rate, seed):
+    """
+    The connections to play in, as (time, client index, client IP, source
+    port), with Poisson arrivals at rate a second (all at once if rate is 0).
+    """
+    rng = random.Random(seed)
+    now = 0.0
+    result = []
+    for i in range(flows):
+        if rate:
+            now += rng.expovariate(rate)
+        client = rng.randrange(len(CLIENT_PORTS))
+        ip = IPAddr("10.1.%i.%i" % (rng.randrange(256), rng.randrange(1, 255)))
+        result.append((now, client, ip, rng.randrange(1024, 65536)))
+    return result
+
+
+def first_packet(client, ip, sport):
+    import new_lb
+    t = tcp(srcport=sport, dstport=new_lb.SERVICE_PORT)
+    t.SYN = True
+    t.off = 5
+    i = ipv4(protocol=ipv4.TCP_PROTOCOL, srcip=ip, dstip=new_lb.VIP)
+    i.payload = t
+    e = ethernet(type=ethernet.IP_TYPE, src=CLIENT_MACS[client], dst=new_lb.VMAC)
+    e.payload = i
+    # Parsed again, as find() only works on parsed packets
+    return ethernet(e.pack())
+
+
+def announcement(ip, mac):
+    """ An ARP request from a server, for host_tracker to see."""
+    a = arp(opcode=arp.REQUEST, protosrc=ip, hwsrc=mac, protodst=IPAddr("10.0.0.254"))
+    e = ethernet(type=ethernet.ARP_TYPE, src=mac, dst=EthAddr("ff:ff:ff:ff:ff:ff"))
+    e.payload = a
+    return e
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    rank = max(0, -(-len(values) * p // 100) - 1)
+    return values[int(rank)]
+
+
+class Harness(object):
+    """ Drives the fabric and measures what comes out of it."""
+
+    def __init__(self, port, flows, rate, seed, output):
+        import new_lb
+        self.port = port
+        self.flows = workload(flows, rate, seed)
+        self.params = {'flows': flows, 'rate': rate, 'seed': seed}
+        self.output = output
+        self.servers = dict(zip(SERVER_PORTS, new_lb.SERVER_IPS))
+        self.switches = {}
+        self.peers = {}
+        for d1, p1, d2, p2 in LINKS:
+            self.peers[(d1, p1)] = (d2, p2)
+            self.peers[(d2, p2)] = (d1, p1)
+
+        # (client IP, source port) -> when it went in
+        self.sent = {}
+        # (client IP, source port) -> (latency, server)
+        self.done = {}
+        self.packet_ins = 0
+        self.results = None
+        self._timer = None
+        core.addListenerByName("UpEvent", self._handle_UpEvent)
+
+    def _handle_UpEvent(self, event):
+        from pox.datapaths import OpenFlowWorker
+        from pox.datapaths.switch import SoftwareSwitch
+        import pox.lib.ioworker
+
+        loop = pox.lib.ioworker.RecocoIOLoop()
+        loop.start()
+        for dpid in range(1, 7):
+            switch = SoftwareSwitch(dpid=dpid, name="s%i" % dpid, ports=6)
+            switch.addListenerByName("DpPacketOut", self._handle_DpPacketOut)
+            self.switches[dpid] = switch
+        # Only once they're all there, as LLDP may be passed on right away
+        for switch in self.switches.values():
+            OpenFlowWorker.begin(loop=loop, addr='127.0.0.1', port=self.port,
+                                 max_retry_delay=1, switch=switch)
+        # Ahead of new_lb, which may halt it
+        core.openflow.addListenerByName("PacketIn", self._handle_PacketIn, priority=2)
+        self._started = time.time()
+        self._timer = Timer(0.1, self._wait_for_fabric, recurring=True)
+
+    def _handle_PacketIn(self, event):
+        self.packet_ins += 1
+
+    def _handle_DpPacketOut(self, event):
+        key = (event.node.dpid, event.port.port_no)
+        peer = self.peers.get(key)
+        if peer is not None:
+            self.switches[peer[0]].rx_packet(event.packet, peer[1])
+            return
+        server = self.servers.get(key)
+        if server is None:
+            return
+        ip = event.packet.find("ipv4")
+        if ip is None or not isinstance(ip.payload, tcp):
+            return
+        flow = (ip.srcip, ip.payload.srcport)
+        sent = self.sent.get(flow)
+        if sent is not None and flow not in self.done:
+            self.done[flow] = (time.perf_counter() - sent, str(server))
+
+    def _wait_for_fabric(self):
+        import new_lb
+        lb = core.LoadBalancer
+        if time.time() - self._started > SETUP_TIMEOUT:
+            self._finish("the fabric didn't come up")
+            return False
+        if sum(len(n) for n in lb.paths.adjacency.values()) < 2 * len(LINKS):
+            return
+        missing = [(ip, mac, location) for ip, mac, location
+                   in zip(new_lb.SERVER_IPS, new_lb.SERVER_MACS, SERVER_PORTS)
+                   if mac not in lb.hosts]
+        if missing:
+            for ip, mac, (dpid, port) in missing:
+                self.switches[dpid].rx_packet(announcement(ip, mac), port)
+            return
+        self._start = time.perf_counter()
+        self._next = 0
+        self.packet_ins = 0
+        self._timer = Timer(TICK, self._play, recurring=True)
+        return False
+
+    def _play(self):
+        now = time.perf_counter()
+        elapsed = now - self._start
+        flows = self.flows
+        while self._next < len(flows) and flows[self._next][0] <= elapsed:
+            at, client, ip, sport = flows[self._next]
+            dpid, port = CLIENT_PORTS[client]
+            self.sent[(ip, sport)] = time.perf_counter()
+            self.switches[dpid].rx_packet(first_packet(client, ip, sport), port)
+            self._next += 1
+        if self._next < len(flows):
+            return
+        if len(self.done) == len(flows) or now - self._start > flows[-1][0] + DRAIN_TIMEOUT:
+            self._finish()
+            return False
+
+    def _finish(self, error=None):
+        import new_lb
+        results = {'params': self.params}
+        if error is not None:
+            results['error'] = error
+        else:
+            elapsed = max(self.done[f][0] + self.sent[f] for f in self.done) - self._start \
+                if self.done else 0.0
+            latencies = sorted(latency for latency, server in self.done.values())
+            counts = {str(ip): 0 for ip in new_lb.SERVER_IPS}
+            for latency, server in self.done.values():
+                counts[server] += 1
+            jain = jain_index(list(counts.values()))
+            skew = max_over_mean(list(counts.values()))
+            results.update({
+                'completed': len(self.done),
+                'lost': len(self.flows) - len(self.done),
+                'latency_ms': {
+                    'p50': percentile(latencies, 50) * 1000 if latencies else None,
+                    'p90': percentile(latencies, 90) * 1000 if latencies else None,
+                    'p99': percentile(latencies, 99) * 1000 if latencies else None,
+                    'max': latencies[-1] * 1000 if latencies else None,
+                },
+                'packet_ins': self.packet_ins,
+                'packet_ins_per_second': self.packet_ins / elapsed if elapsed else 0.0,
+                'connections_per_second': len(self.done) / elapsed if elapsed else 0.0,
+                'servers': counts,
+                'jain_index': jain,
+                'max_over_mean': skew,
+            })
+        self.results = results
+        text = json.dumps(results, indent=2, sort_keys=True)
+        if self.output:
+            with open(self.output, 'w') as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        core.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--flows", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=100,
+                        help="new connections a second (0 for all at once)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--selector", default="modulo")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="show POX's log")
+    args = parser.parse_args()
+
+    from pox.boot import boot
+    port = free_port()
+    argv = ["openflow.of_01", "--address=127.0.0.1", "--port=%i" % port,
+            "openflow.discovery", "--link_timeout=2", "host_tracker",
+            "new_lb", "--selector=%s" % args.selector, "--health_interval=0",
+            "--affinity_ttl=0", "--slow_start=0"]
+    if args.verbose:
+        argv = ["log.level", "--DEBUG"] + argv
+    else:
+        logging.disable(logging.WARNING)
+    harness = Harness(port, args.flows, args.rate, args.seed, args.output)
+    boot(argv)
+    if harness.results is None or 'error' in harness.results:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for of_01.Connection.read.
+
+Feeds a flood of PacketIns and a large OFPST_FLOW reply through
+Connection.read from an in-memory socket which hands out what it has as
+fast as it's asked, and compares it with the read() of_01 used to have:
+recv(2048), then buf += data and buf = buf[offset:] on every read.
+Message handling is a no-op, so the figures are the framing and
+unpacking cost.  The socket costs nothing, so what fewer, bigger reads save
+in system calls shows in the recv call counts rather than the times.
+
+Run from the top of the repository:
+  python benchmarks/of_read_bench.py [--packets=N] [--flows=N] [--json]
+"""
+
+import sys
+import os
+import gc
+import json
+import time
+import argparse
+import unittest # Makes pox.core initialize itself
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.of_01 as of_01
+
+
+class StreamSocket(object):
+    """ Hands out one byte string, as much at a time as is asked for."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+        self.calls = 0
+
+    def recv(self, size):
+        self.calls += 1
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return chunk.tobytes()
+
+    def recv_into(self, buffer, size=0):
+        self.calls += 1
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def send(self, data, *args):
+        return len(data)
+
+
+class FakeSender(object):
+    sending = False
+
+    def pending(self, con):
+        return 0
+
+
+class LegacyConnection(of_01.Connection):
+    """ Connection with the old read()."""
+
+    def read(self):
+        d = self.sock.recv(2048)
+        if len(d) == 0:
+            return False
+        self.buf += d
+        buf_len = len(self.buf)
+        offset = 0
+        while buf_len - offset >= 8:
+            ofp_type = self.buf[offset + 1]
+            msg_length = self.buf[offset + 2] << 8 | self.buf[offset + 3]
+            if buf_len - offset < msg_length:
+                break
+            new_offset, msg = self.unpackers[ofp_type](self.buf, offset)
+            offset = new_offset
+            self.handlers[ofp_type](self, msg)
+        if offset != 0:
+            self.buf = self.buf[offset:]
+        return True
+
+
+def run_one(cls, data, repeat=3):
+    """ The best of repeat runs."""
+    return min((run_once(cls, data) for _ in range(repeat)), key=lambda r: r['seconds'])
+
+
+def run_once(cls, data):
+    gc.collect()
+    sock = StreamSocket(data)
+    con = cls(sock)
+    if cls is LegacyConnection:
+        con.buf = b''
+    count = [0]
+
+    def handle(con, msg):
+        count[0] += 1
+    con.handlers = [handle] * 32
+    start = time.perf_counter()
+    while con.read():
+        pass
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'messages': count[0], 'recv_calls': sock.calls}
+
+
+def run(packets, flows):
+    of_01.deferredSender = FakeSender()
+    frame = b'\x00' * 60
+    flood = b''.join(of.ofp_packet_in(in_port=1, buffer_id=i, data=frame).pack()
+                     for i in range(packets))
+    stats = [of.ofp_flow_stats(match=of.ofp_match(in_port=i % 48 + 1), byte_count=i)
+             for i in range(flows)]
+    # One reply of many parts, as a switch splits them at 64kB
+    parts = []
+    per_part = 600
+    for i in range(0, flows, per_part):
+        reply = of.ofp_stats_reply(body=stats[i:i + per_part], xid=1)
+        reply.is_last_reply = i + per_part >= flows
+        parts.append(reply.pack())
+    reply = b''.join(parts)
+
+    results = {}
+    for name, data in (('packet_in_flood', flood), ('flow_stats_reply', reply)):
+        results[name] = {
+            'bytes': len(data),
+            'legacy': run_one(LegacyConnection, data),
+            'current': run_one(of_01.Connection, data),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=50000)
+    parser.add_argument("--flows", type=int, default=20000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.packets, args.flows)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    for name, r in results.items():
+        print(f"{name} ({r['bytes']} bytes)")
+        for impl in ('legacy', 'current'):
+            x = r[impl]
+            print(f"  {impl:8} {x['seconds'] * 1000:9.1f} ms  {x['recv_calls']:7} recv calls"
+                  f"  {x['messages']} messages")
+
+
+if __name__ == '__main__':
+    main()
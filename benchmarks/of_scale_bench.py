@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""
+How of_01 copes with thousands of switch connections.
+
+For each mode and connection count the controller is started afresh in
+its own process, running nothing but the OpenFlow listener, and that many
+emulated switches (lb_cbench's, speaking OpenFlow 1.0 over local
+sockets) connect to it.  Once they're all up, --active of them play echo
+ping-pong for --duration seconds, one echo request outstanding each,
+while the rest sit idle, which is what a big network mostly does, and
+what an event loop which looks at every connection on every wakeup pays
+for.  Reported per mode and count, as JSON: how long it took for every
+switch to come up, echo replies a second, and their latency percentiles
+(milliseconds).
+
+The modes are:
+  select    of_01's Select loop on the default select() hub, which can't
+            go past FD_SETSIZE (usually 1024) descriptors
+  epoll-sh  the same loop on the hub's epoll emulation (POX's --epoll-sh)
+  epoll     of_01 --epoll, which waits on one epoll object of its own
+  asyncio   openflow.of_01_asyncio, serving them on an asyncio loop
+
+Run from the top of the repository:
+  python benchmarks/of_scale_bench.py [--modes=epoll-sh,epoll]
+                                      [--connections=1000,5000,10000]
+                                      [--connecting=N] [--active=N]
+                                      [--duration=S]
+                                      [--output=FILE]
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import selectors
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lb_cbench import ROOT, EmulatedSwitch, free_port, percentile
+import pox.openflow.libopenflow_01 as of
+
+# POX's arguments for each mode; the listener's address and port go last
+MODES = {
+    'select': ["openflow.of_01"],
+    'epoll-sh': ["--epoll-sh", "openflow.of_01"],
+    'epoll': ["openflow.of_01", "--epoll"],
+    'asyncio': ["openflow.of_01_asyncio"],
+}
+
+# How long the controller gets to bring up each thousand switches
+SETUP_SECONDS_PER_1000 = 30
+
+
+class ScaleSwitch(EmulatedSwitch):
+    """ A switch which can play echo ping-pong."""
+
+    def __init__(self, generator, dpid):
+        EmulatedSwitch.__init__(self, generator, dpid, [1], [])
+        self.connected = False
+        self.echo_sent = None
+
+    def connect(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        sock.connect_ex(('127.0.0.1', port))
+        self.sock = sock
+
+    def connect_done(self):
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            raise RuntimeError(f"switch {self.dpid} couldn't connect: "
+                               f"{os.strerror(error)}")
+        self.connected = True
+        self.send(of.ofp_hello().pack())
+
+    def echo(self):
+        self.echo_sent = time.perf_counter()
+        self.send(of.ofp_echo_request(xid=self._next_xid()).pack())
+
+    def handle(self, msg_type, xid, raw):
+        if msg_type == of.OFPT_ECHO_REPLY:
+            self.generator.echo_reply(self, time.perf_counter() - self.echo_sent)
+        else:
+            EmulatedSwitch.handle(self, msg_type, xid, raw)
+
+
+class ScaleGenerator(object):
+    """ The switches, driven from one selector loop."""
+
+    def __init__(self, port, connections, connecting):
+        self.port = port
+        self.max_connecting = connecting
+        self.selector = selectors.DefaultSelector()
+        self.switches = [ScaleSwitch(self, dpid) for dpid in range(1, connections + 1)]
+        self.connecting = 0
+        self.next_connect = 0
+        self.up = 0
+        self.flow_mods = 0
+        self.latencies = []
+        self.pinging = False
+
+    def want_write(self, switch, wanted):
+        if not switch.connected:
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if wanted else 0)
+        self.selector.modify(switch.sock, events, switch)
+
+    def switch_up(self, switch):
+        self.up += 1
+
+    def packet_out(self, switch, msg):
+        pass
+
+    def echo_reply(self, switch, latency):
+        if self.pinging:
+            self.latencies.append(latency)
+            switch.echo()
+
+    def connect_more(self):
+        while self.connecting < self.max_connecting and self.next_connect < len(self.switches):
+            switch = self.switches[self.next_connect]
+            self.next_connect += 1
+            self.connecting += 1
+            switch.connect(self.port)
+            self.selector.register(switch.sock, selectors.EVENT_WRITE, switch)
+
+    def run_for(self, seconds, until=None):
+        """ Run the loop for seconds, or until until() is true."""
+        end = time.perf_counter() + seconds
+        while True:
+            now = time.perf_counter()
+            if now >= end or (until is not None and until()):
+                return
+            self.connect_more()
+            for key, mask in self.selector.select(min(0.05, end - now)):
+                switch = key.data
+                if not switch.connected:
+                    self.connecting -= 1
+                    switch.connect_done()
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    switch.flush()
+                if mask & selectors.EVENT_READ:
+                    switch.read()
+
+    def setup(self, timeout):
+        """ Connect every switch; returns how long it took for all to be up."""
+        start = time.perf_counter()
+        self.run_for(timeout, until=lambda: self.up == len(self.switches))
+        if self.up != len(self.switches):
+            raise RuntimeError(f"only {self.up} of {len(self.switches)} switches came up")
+        return time.perf_counter() - start
+
+    def ping(self, active, duration):
+        """ Echo ping-pong on active switches for duration seconds."""
+        self.pinging = True
+        for switch in self.switches[:active]:
+            switch.echo()
+        self.run_for(duration)
+        self.pinging = False
+
+    def close(self):
+        for switch in self.switches:
+            if switch.sock is not None:
+                if switch.sock in self.selector.get_map():
+                    self.selector.unregister(switch.sock)
+                switch.sock.close()
+        self.selector.close()
+
+
+def bench(args, mode, connections):
+    port = free_port()
+    argv = ([sys.executable, os.path.join(ROOT, "pox.py")] + MODES[mode] +
+            ["--address=127.0.0.1", "--port=%i" % port])
+    output = None if args.verbose else subprocess.DEVNULL
+    controller = subprocess.Popen(argv, cwd=ROOT, stdout=output, stderr=output)
+    generator = ScaleGenerator(port, connections, args.connecting)
+    result = {'mode': mode, 'connections': connections}
+    try:
+        # Give it time to start listening
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except ConnectionRefusedError:
+                if time.time() > deadline:
+                    raise RuntimeError("the controller didn't start listening")
+                time.sleep(0.1)
+        timeout = SETUP_SECONDS_PER_1000 * max(1, connections / 1000.0)
+        result['setup_seconds'] = generator.setup(timeout)
+        start = time.perf_counter()
+        generator.ping(min(args.active, connections), args.duration)
+        elapsed = time.perf_counter() - start
+    except (RuntimeError, OSError) as e:
+        result['error'] = str(e)
+        return result
+    finally:
+        generator.close()
+        controller.terminate()
+        controller.wait()
+    latencies = sorted(generator.latencies)
+    result.update({
+        'echoes_per_second': len(latencies) / elapsed,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000 if latencies else None,
+            'p90': percentile(latencies, 90) * 1000 if latencies else None,
+            'p99': percentile(latencies, 99) * 1000 if latencies else None,
+            'max': latencies[-1] * 1000 if latencies else None,
+        },
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="epoll-sh,epoll",
+                        help="comma separated, from " + ", ".join(sorted(MODES)))
+    parser.add_argument("--connections", default="1000,5000,10000",
+                        help="comma separated switch counts to try")
+    parser.add_argument("--connecting", type=int, default=16,
+                        help="connections being set up at once")
+    parser.add_argument("--active", type=int, default=32,
+                        help="switches playing echo ping-pong")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of ping-pong")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="show POX's output")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode}")
+    results = [bench(args, mode, int(n))
+               for n in args.connections.split(",") for mode in modes]
+    params = {'active': args.active, 'connecting': args.connecting,
+              'duration': args.duration}
+    text = json.dumps({'params': params, 'results': results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if any('error' in r for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Benchmark for of_01's send path under bursts of flow_mods.
+
+A Connection sends --bursts bursts of --size flow_mods (a path install is
+a burst of about one per hop) over a local socket pair, one burst per
+scheduler task run, while a thread reads the other end.  The old send
+path made a send() per message; the current one queues what a task sends
+and flushes it with one sendmsg() once the task yields.  Reported for
+both: system calls per flow_mod, and flow_mods a second until the reader
+has everything.
+
+Run from the top of the repository:
+  python benchmarks/of_send_bench.py [--bursts=N] [--size=N] [--json]
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import unittest # Makes pox.core initialize itself
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pox.core import core
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.of_01 as of_01
+from pox.lib.recoco import Task
+
+
+class CountingSocket(object):
+    """ Counts the send() calls on a socket."""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self.calls = 0
+
+    def send(self, data, *args):
+        self.calls += 1
+        return self._sock.send(data, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class LegacyConnection(of_01.Connection):
+    """ Connection with the old send(): one send() per message."""
+
+    def send(self, data):
+        if self.disconnected:
+            return
+        if type(data) is not bytes:
+            data = data.pack()
+        deferred = of_01.deferredSender
+        if deferred.pending(self):
+            deferred.send(self, data)
+            return
+        try:
+            l = self.sock.send(data)
+            if l != len(data):
+                deferred.send(self, data[l:])
+        except socket.error as e:
+            if e.errno == of_01.EAGAIN:
+                deferred.send(self, data)
+            else:
+                raise
+
+
+class Burster(Task):
+    """ Sends the bursts, one per run."""
+
+    def __init__(self, con, bursts, messages, done):
+        Task.__init__(self)
+        self.con = con
+        self.bursts = bursts
+        self.messages = messages
+        self.done = done
+
+    def run(self):
+        for i in range(self.bursts):
+            for m in self.messages:
+                self.con.send(m)
+            yield 0 # Let the flusher have a go
+        self.done.set()
+
+
+def run_one(cls, bursts, size):
+    a, b = socket.socketpair()
+    a.setblocking(0)
+    messages = [of.ofp_flow_mod(match=of.ofp_match(in_port=i + 1, nw_dst="10.0.0.%i" % (i + 1)),
+                                action=of.ofp_action_output(port=i + 2)).pack()
+                for i in range(size)]
+    expected = bursts * sum(len(m) for m in messages)
+
+    received = [0]
+    finished = [None]
+
+    def reader():
+        while received[0] < expected:
+            data = b.recv(1 << 16)
+            if not data:
+                break
+            received[0] += len(data)
+        finished[0] = time.perf_counter()
+
+    sent = threading.Event()
+    counter = CountingSocket(a)
+    con = cls(counter)
+    sendmsg_calls = [0]
+
+    def sendmsg(buffers):
+        sendmsg_calls[0] += 1
+        return a.sendmsg(buffers)
+    con._sendmsg = sendmsg
+    con._flush() # The HELLO
+    b.recv(64)
+    counter.calls = sendmsg_calls[0] = 0
+
+    t = threading.Thread(target=reader)
+    t.start()
+    start = time.perf_counter()
+    Burster(con, bursts, messages, sent).start()
+    sent.wait()
+    t.join()
+    a.close()
+    b.close()
+    calls = counter.calls + sendmsg_calls[0]
+    flow_mods = bursts * size
+    return {
+        'syscalls': calls,
+        'syscalls_per_flow_mod': calls / flow_mods,
+        'flow_mods_per_second': flow_mods / (finished[0] - start),
+    }
+
+
+def run(bursts, size):
+    of_01.deferredSender = of_01.DeferredSender()
+    of_01.sendFlusher = of_01.SendFlusher()
+    of_01.sendFlusher.start()
+    return {
+        'legacy': run_one(LegacyConnection, bursts, size),
+        'current': run_one(of_01.Connection, bursts, size),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bursts", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=10, help="flow_mods a burst")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.bursts, args.size)
+    # Stop the DeferredSender thread without the rest of going down
+    core.running = False
+    of_01.deferredSender._waker.ping()
+    core.scheduler.quit()
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    for name, r in results.items():
+        print(f"{name:8} {r['syscalls_per_flow_mod']:6.3f} syscalls/flow_mod"
+              f"  {r['flow_mods_per_second']:10.0f} flow_mods/s")
+
+
+if __name__ == '__main__':
+    main()
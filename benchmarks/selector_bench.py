@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for the backend selectors in lb.selection.
+
+For each selector this reports the cost of one selection decision and the
+fraction of flows which move to a different backend when one backend is
+removed or added.  For comparison, "md5-modulo" is what new_lb did before:
+md5 over the stringified addresses, hexdigest, int(), modulo.  Its time
+includes hashing the addresses; the selectors are timed on hashes that were
+computed up front.
+
+Run from the top of the repository:
+  python benchmarks/selector_bench.py [--backends=N] [--flows=N] [--json]
+"""
+
+import sys
+import os
+import json
+import random
+import hashlib
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lb.selection import SELECTORS, make_selector
+
+
+def md5_modulo(src, dst, backends):
+    combined = str(src) + str(dst)
+    return backends[int(hashlib.md5(combined.encode()).hexdigest(), 16) % len(backends)]
+
+
+def remap_fraction(before, after, hashes):
+    moved = sum(1 for h in hashes if before.select(h) != after.select(h))
+    return moved / len(hashes)
+
+
+def run(backends, flows, seed=1):
+    rng = random.Random(seed)
+    names = [f"10.1.{i // 256}.{i % 256}" for i in range(backends)]
+    hashes = [rng.getrandbits(32) for _ in range(flows)]
+    clients = [f"10.0.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(1000)]
+    results = {}
+
+    per_call = timeit.timeit(lambda: [md5_modulo(c, "10.0.0.9", names) for c in clients],
+                             number=20) / (20 * len(clients))
+    results['md5-modulo'] = {'ns_per_decision': per_call * 1e9}
+
+    for name in sorted(SELECTORS):
+        selector = make_selector(name, names)
+        build = timeit.timeit(lambda: make_selector(name, names), number=1)
+        sample = hashes[:1000]
+        if name == 'bounded':
+            # Keep the loads from growing without bound while timing
+            def decide():
+                for h in sample:
+                    selector.release(selector.select(h))
+        else:
+            def decide():
+                select = selector.select
+                for h in sample:
+                    select(h)
+        per_call = timeit.timeit(decide, number=20) / (20 * len(sample))
+
+        removed = make_selector(name, names[:-1])
+        added = make_selector(name, names + ["10.2.0.1"])
+        results[name] = {
+            'ns_per_decision': per_call * 1e9,
+            'build_ms': build * 1e3,
+            'remap_on_remove': remap_fraction(make_selector(name, names), removed, hashes),
+            'remap_on_add': remap_fraction(make_selector(name, names), added, hashes),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", type=int, default=10)
+    parser.add_argument("--flows", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    results = run(args.backends, args.flows)
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    ideal = 1.0 / args.backends
+    print(f"{args.backends} backends, {args.flows} flows "
+          f"(ideal remap on remove: {ideal:.3f}, on add: {1.0 / (args.backends + 1):.3f})")
+    print(f"{'selector':<12}{'ns/decision':>14}{'build ms':>10}{'remap -1':>10}{'remap +1':>10}")
+    for name, r in results.items():
+        line = f"{name:<12}{r['ns_per_decision']:>14.0f}"
+        if 'build_ms' in r:
+            line += f"{r['build_ms']:>10.1f}{r['remap_on_remove']:>10.3f}{r['remap_on_add']:>10.3f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,50 @@
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
-import hashlib
+from lb.selection import make_selector
+from lb.hashing import FlowHasher
+from lb.fairness import FairnessStats
+from lb import sharding
+from pox.lib.util import dpid_to_str
 
 log = core.getLogger()
 
+# When flows are counted out again (for --selector=bounded or
+# --fairness_interval), they're installed with this idle timeout and come
+# back as FlowRemoved, with their ports in the cookie
+FLOW_IDLE_TIMEOUT = 10
+
+def ports_key(dpid):
+    """ Where a switch's port classification is shared with other workers."""
+    return "hash_lb/ports/" + dpid_to_str(dpid)
+
 class HashLoadBalancer(object):
-    def __init__(self, connection):
+    def __init__(self, connection, selector='modulo', hasher=None, fairness=None,
+                 shared=None):
         self.connection = connection
+        self.hasher = hasher if hasher is not None else FlowHasher('src')
+        self.fairness = fairness
+        self.shared = shared
         connection.addListeners(self)
 
         # Dynamiczne mapowanie portów
         self.host_ports = set()  # Porty prowadzące do hostów
         self.switch_ports = set()  # Porty prowadzące do switchy
 
+        # With several workers, pick up what whichever had this switch
+        # before us learned about its ports
+        if shared is not None:
+            ports = shared.get(ports_key(connection.dpid))
+            if ports is not None:
+                self.host_ports.update(ports['host'])
+                self.switch_ports.update(ports['switch'])
+
+        # in_port -> selector over the other switch ports
+        self.selector_name = selector
+        self._selectors = {}
+
+        # Whether the selectors or fairness counts need to hear when flows go
+        self.track_removals = selector == 'bounded' or fairness is not None
+
     def _handle_PacketIn(self, event):
         packet = event.parsed
 
@@ -20,33 +52,44 @@ class HashLoadBalancer(object):
             log.warning("Ignoring incomplete packet")
             return
 
+        # Klasyfikacja portów dynamicznie na podstawie ruchu (before the
+        # IPv4 check, or LLDP would never mark a port as a switch port)
+        if event.port not in self.host_ports and event.port not in self.switch_ports:
+            self._classify_port(event.port, packet)
+
         ip = packet.find('ipv4')
         if not ip:
             log.info("Non-IPv4 packet received; ignoring")
             return
 
-        # Klasyfikacja portów dynamicznie na podstawie ruchu
-        if event.port not in self.host_ports and event.port not in self.switch_ports:
-            self._classify_port(event.port, packet)
-
-        # Oblicz hash na podstawie adresu źródłowego
-        src_ip = ip.srcip.toStr()
-        hash_value = int(hashlib.md5(src_ip.encode()).hexdigest(), 16)
+        # Oblicz hash na podstawie adresu źródłowego (lub pól z --hash_fields)
+        src_ip = ip.srcip
+        hash_value = self.hasher.hash(ip)
         
-        # Lista dostępnych portów prowadzących do innych switchy
-        available_ports = [p for p in self.switch_ports if p != event.port]
-
-        if not available_ports:
+        # Selektor dla dostępnych portów prowadzących do innych switchy
+        selector = self._selectors.get(event.port)
+        if selector is None:
+            available_ports = sorted(p for p in self.switch_ports if p != event.port)
+            selector = make_selector(self.selector_name, available_ports)
+            self._selectors[event.port] = selector
+
+        if not len(selector):
             log.warning(f"No available ports to forward the packet for {src_ip}")
             return
 
         # Wybierz port na podstawie hash
-        selected_port = available_ports[hash_value % len(available_ports)]
+        selected_port = selector.select(hash_value)
+        if self.fairness is not None:
+            self.fairness.assigned(f"s{self.connection.dpid}", selected_port)
 
         # Instalacja reguły przepływu
         msg = of.ofp_flow_mod()
         msg.match = of.ofp_match.from_packet(packet, event.port)
         msg.actions.append(of.ofp_action_output(port=selected_port))
+        if self.track_removals:
+            msg.idle_timeout = FLOW_IDLE_TIMEOUT
+            msg.flags = of.OFPFF_SEND_FLOW_REM
+            msg.cookie = event.port << 16 | selected_port
         self.connection.send(msg)
 
         # Wysłanie pakietu natychmiast
@@ -55,24 +98,85 @@ class HashLoadBalancer(object):
         msg.actions.append(of.ofp_action_output(port=selected_port))
         self.connection.send(msg)
 
+    def _handle_FlowRemoved(self, event):
+        cookie = event.ofp.cookie
+        if not cookie:
+            return
+        in_port, out_port = cookie >> 16, cookie & 0xffff
+        # A selector rebuilt since then starts from nothing, and release()
+        # doesn't go below that
+        selector = self._selectors.get(in_port)
+        if selector is not None:
+            selector.release(out_port)
+        if self.fairness is not None:
+            dpid = self.connection.dpid
+            self.fairness.finished(f"s{dpid}", out_port, (dpid, cookie),
+                                   event.ofp.byte_count)
+
+    def _handle_ConnectionDown(self, event):
+        if self.fairness is not None:
+            self.fairness.forget_pool(f"s{self.connection.dpid}")
+
     def _classify_port(self, port, packet):
         """Dynamicznie klasyfikuj port jako hostowy lub switchowy."""
         if packet.type == packet.LLDP_TYPE:
             # Port prowadzi do switcha, jeśli odbieramy LLDP
             self.switch_ports.add(port)
+            self._selectors.clear()
             log.info(f"Port {port} classified as SWITCH port")
         else:
             # W przeciwnym razie uznajemy port za hostowy
             self.host_ports.add(port)
             log.info(f"Port {port} classified as HOST port")
+        if self.shared is not None:
+            self.shared.set(ports_key(self.connection.dpid),
+                            {'host': sorted(self.host_ports),
+                             'switch': sorted(self.switch_ports)})
 
 class HashLoadBalancerController(object):
-    def __init__(self):
+    def __init__(self, selector='modulo', hasher=None, fairness=None, shared=None):
+        self.selector = selector
+        self.hasher = hasher
+        self.fairness = fairness
+        self.shared = shared
         core.openflow.addListeners(self)
 
     def _handle_ConnectionUp(self, event):
         log.info(f"Switch {event.connection.dpid} connected")
-        HashLoadBalancer(event.connection)
-
-def launch():
-    core.registerNew(HashLoadBalancerController)
+        HashLoadBalancer(event.connection, self.selector, self.hasher, self.fairness,
+                         self.shared)
+
+def launch(selector='modulo', hash_fields='src', hash_basis=0, fairness_interval=0,
+           workers=1, worker=None, state=None):
+    """
+    --selector picks how flows are mapped to ports: modulo (default), ring,
+      maglev or bounded; see lb.selection.  With bounded, flows expire
+      after FLOW_IDLE_TIMEOUT idle seconds and count against their port
+      until they do
+    --hash_fields picks what is hashed: src (default), src_port, 5tuple or
+      symmetric_l4, with --hash_basis as the seed; see lb.hashing
+    --fairness_interval counts the flows each switch sends out of each
+      port over the last 1, 5 and 15 minutes (and the active ones, which
+      idle out after FLOW_IDLE_TIMEOUT seconds), and logs how evenly they're
+      spread this often (in seconds, default 0 which turns it off); they're
+      at /lb/fairness when web.webcore is running.  See lb.fairness
+    --workers runs this many controller processes (default 1), sharing the
+      OpenFlow port with SO_REUSEPORT so the kernel spreads the switches
+      over them, and sharing what they learn about ports; see lb.sharding.
+      Each keeps its own fairness counts.  (--worker and --state are for
+      the processes it starts.)
+    """
+    make_selector(selector)  # Complain about bad names now
+    fairness = None
+    if float(fairness_interval) > 0:
+        fairness = FairnessStats(log_interval=float(fairness_interval))
+        fairness.serve()
+    shared = None
+    if worker is not None:
+        shared = sharding.join(int(worker), int(workers), state)
+    elif int(workers) > 1:
+        shared = sharding.start_workers(int(workers), __name__)
+    if shared is not None:
+        core.register("sharding", shared)
+    core.registerNew(HashLoadBalancerController, selector,
+                     FlowHasher(hash_fields, int(hash_basis)), fairness, shared)
@@ -0,0 +1,6 @@
+"""
+Building blocks for the load balancer in new_lb.py.
+
+The modules in this package don't register anything with core by
+themselves; new_lb.LoadBalancer wires them together.
+"""
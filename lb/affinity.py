@@ -0,0 +1,160 @@
+"""
+Connection affinity for the load balancer.
+
+AffinityTable remembers which backend each connection was sent to, so a
+flow whose rules idled out comes back to the same server even if the
+selector would now pick another one.  It's meant to hold millions of
+entries, so it stays small:
+
+ - The key is the 5-tuple packed into one int (see pack_key()).
+ - The value is one int: the tick the entry was last used, shifted left,
+   plus the index of its backend in an append-only list.
+ - Expiry uses a timing wheel with one slot per tick of the TTL.  Every key
+   sits in exactly one slot -- the one for the tick it would expire at when
+   it was put there.  Using an entry doesn't move it; when its slot comes
+   round it's either dropped or moved to the slot it's really due in.  So
+   expiry costs O(1) per entry per TTL, unlike a scan of the whole table.
+
+When the table is full, the entries in the next slot to expire make room.
+"""
+
+import struct
+import time
+
+_pack = struct.Struct('!4s4sHHB').pack
+
+# Low bits of a value: the backend index
+_INDEX_BITS = 16
+_INDEX_MASK = (1 << _INDEX_BITS) - 1
+
+# Index of an entry which was removed but is still in its wheel slot
+_DEAD = _INDEX_MASK
+
+
+def pack_key(src, dst, proto, sport, dport):
+    """ Pack IPAddrs, protocol and ports into an int."""
+    return int.from_bytes(_pack(src.raw, dst.raw, sport, dport, proto), 'big')
+
+
+class AffinityTable(object):
+    """ Bounded map of connection key -> backend, with a TTL."""
+
+    def __init__(self, ttl=300, max_entries=1000000, resolution=1.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.resolution = resolution
+
+        # key -> (last used tick << _INDEX_BITS) | backend index
+        self._entries = {}
+
+        # Entries in _entries which are _DEAD
+        self._dead = 0
+
+        # Backends are never removed from these, so indexes stay valid
+        self._backends = []
+        self._indexes = {}
+
+        self._ttl_ticks = max(1, int(round(ttl / resolution)))
+        self._wheel = [[] for _ in range(self._ttl_ticks + 1)]
+        self._tick = None
+
+    def __len__(self):
+        return len(self._entries) - self._dead
+
+    def lookup(self, key, now=None):
+        """ Get key's backend (or None), and keep it alive."""
+        tick = self._advance(now)
+        value = self._entries.get(key)
+        if value is None or value & _INDEX_MASK == _DEAD:
+            return None
+        self._entries[key] = (tick << _INDEX_BITS) | (value & _INDEX_MASK)
+        return self._backends[value & _INDEX_MASK]
+
+    def insert(self, key, backend, now=None):
+        tick = self._advance(now)
+        index = self._indexes.get(backend)
+        if index is None:
+            index = len(self._backends)
+            if index >= _DEAD:
+                raise RuntimeError("Too many backends for the affinity table")
+            self._backends.append(backend)
+            self._indexes[backend] = index
+
+        old = self._entries.get(key)
+        if old is None:
+            if len(self._entries) >= self.max_entries:
+                self._make_room()
+            self._wheel[(tick + self._ttl_ticks) % len(self._wheel)].append(key)
+        elif old & _INDEX_MASK == _DEAD:
+            self._dead -= 1
+        self._entries[key] = (tick << _INDEX_BITS) | index
+
+    def remove(self, key):
+        value = self._entries.get(key)
+        if value is None or value & _INDEX_MASK == _DEAD:
+            return False
+        # Leave it for its slot to clean up
+        self._entries[key] = value | _DEAD
+        self._dead += 1
+        return True
+
+    def remove_backend(self, backend):
+        """ Forget every entry for backend; returns how many there were."""
+        index = self._indexes.get(backend)
+        if index is None:
+            return 0
+        entries = self._entries
+        doomed = [k for k, v in entries.items() if v & _INDEX_MASK == index]
+        for key in doomed:
+            entries[key] |= _DEAD
+        self._dead += len(doomed)
+        return len(doomed)
+
+    def expire(self, now=None):
+        """ Drop whatever has timed out (lookup and insert do this too)."""
+        self._advance(now)
+
+    def _advance(self, now):
+        if now is None:
+            now = time.time()
+        tick = int(now / self.resolution)
+        last = self._tick
+        if last is None or tick <= last:
+            if last is None:
+                self._tick = tick
+            return tick
+        self._tick = tick
+        # Go round at most once; later slots would just be visited twice
+        for t in range(max(last + 1, tick - len(self._wheel) + 1), tick + 1):
+            self._expire_slot(t)
+        return tick
+
+    def _expire_slot(self, tick):
+        size = len(self._wheel)
+        slot = self._wheel[tick % size]
+        if not slot:
+            return
+        self._wheel[tick % size] = []
+        entries = self._entries
+        for key in slot:
+            value = entries[key]
+            due = (value >> _INDEX_BITS) + self._ttl_ticks
+            if due <= tick or value & _INDEX_MASK == _DEAD:
+                if value & _INDEX_MASK == _DEAD:
+                    self._dead -= 1
+                del entries[key]
+            else:
+                self._wheel[due % size].append(key)
+
+    def _make_room(self):
+        """ Drop the entries that are next in line to expire."""
+        size = len(self._wheel)
+        tick = self._tick if self._tick is not None else 0
+        for t in range(tick + 1, tick + size + 1):
+            slot = self._wheel[t % size]
+            if slot:
+                self._wheel[t % size] = []
+                for key in slot:
+                    if self._entries.pop(key) & _INDEX_MASK == _DEAD:
+                        self._dead -= 1
+                return
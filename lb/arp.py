@@ -0,0 +1,95 @@
+"""
+Answering ARP for the VIPs.
+
+Nothing owns a VIP, so the controller has to answer ARP requests for it.
+ArpResponder does that straight from the PacketIn's bytes: a request is
+recognised by a few slices of the raw frame, and the reply is a packed
+template for the VIP with the asker's addresses dropped in.  No packet
+objects are built either way, so a burst of requests costs little.
+
+punt_rule() is a flow_mod which sends only ARP requests for one VIP to the
+controller, so they neither flood the network nor wait behind other
+PacketIns.
+"""
+
+import struct
+
+import pox.openflow.libopenflow_01 as of
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.arp import arp
+
+# Priority of the punt rules; above the reactively installed ones
+PUNT_PRIORITY = of.OFP_DEFAULT_PRIORITY + 200
+
+# Ethernet type ARP, then an IPv4-over-Ethernet ARP header with the
+# opcode, as they are at offset 12 of a frame
+_ARP_REQUEST = struct.pack('!HHHBBH', ethernet.ARP_TYPE, arp.HW_TYPE_ETHERNET,
+                           arp.PROTO_TYPE_IP, 6, 4, arp.REQUEST)
+_ARP_REPLY = struct.pack('!HHHBBH', ethernet.ARP_TYPE, arp.HW_TYPE_ETHERNET,
+                         arp.PROTO_TYPE_IP, 6, 4, arp.REPLY)
+
+# packet_out header: version, type, length, xid, buffer id, in port and
+# length of the actions, then the one action: output to OFPP_IN_PORT
+_PACKET_OUT = struct.Struct('!BBHLLHH')
+_OUTPUT_IN_PORT = of.ofp_action_output(port=of.OFPP_IN_PORT).pack()
+_REPLY_LENGTH = _PACKET_OUT.size + len(_OUTPUT_IN_PORT) + 42
+
+
+class ArpResponder(object):
+    """ Answers ARP requests for a set of VIPs."""
+
+    def __init__(self):
+        # Packed VIP -> the reply's sender addresses, packed
+        self._senders = {}
+
+    def __len__(self):
+        return len(self._senders)
+
+    def __contains__(self, vip):
+        return IPAddr(vip).raw in self._senders
+
+    def add(self, vip, vmac):
+        vip = IPAddr(vip)
+        self._senders[vip.raw] = EthAddr(vmac).raw + vip.raw
+
+    def remove(self, vip):
+        self._senders.pop(IPAddr(vip).raw, None)
+
+    def reply(self, data, in_port):
+        """
+        A packed packet_out answering a PacketIn's data, or None
+
+        None means it isn't an untagged ARP request for one of our VIPs.
+        """
+        if data[12:22] != _ARP_REQUEST:
+            return None
+        sender = self._senders.get(data[38:42])
+        if sender is None:
+            return None
+        # Reply to the asker's hardware and protocol addresses
+        asker = data[22:32]
+        return b''.join((_PACKET_OUT.pack(of.OFP_VERSION, of.OFPT_PACKET_OUT,
+                                          _REPLY_LENGTH, 0, of.NO_BUFFER, in_port,
+                                          len(_OUTPUT_IN_PORT)),
+                         _OUTPUT_IN_PORT, data[22:28], sender[:6], _ARP_REPLY,
+                         sender, asker))
+
+    def handle_packet_in(self, event):
+        """ Answer a PacketIn if it's for us; returns True if it was."""
+        msg = self.reply(event.data, event.port)
+        if msg is None:
+            return False
+        event.connection.send(msg)
+        return True
+
+
+def punt_rule(vip, command=of.OFPFC_ADD):
+    """ A flow_mod sending ARP requests for vip to the controller."""
+    msg = of.ofp_flow_mod(command=command, priority=PUNT_PRIORITY)
+    msg.match.dl_type = ethernet.ARP_TYPE
+    msg.match.nw_proto = arp.REQUEST
+    msg.match.nw_dst = IPAddr(vip)
+    if command != of.OFPFC_DELETE_STRICT:
+        msg.actions.append(of.ofp_action_output(port=of.OFPP_CONTROLLER))
+    return msg
@@ -0,0 +1,205 @@
+"""
+Finding elephant flows, and somewhere less busy to put them.
+
+A few long, fast connections carry most of the bytes, and two of them
+hashed onto the same link will share it while an equally good one sits
+idle.  ElephantDetector is fed the flow statistics of the core switches:
+each flow's byte count is turned into bytes since the last reply and
+counted in a SpaceSaving sketch, which keeps the heaviest keys in a fixed
+number of counters however many flows go by.  Every round the counts are
+decayed, so they follow recent traffic, and the flows whose guaranteed
+count is over the threshold are the elephants.
+
+A flow can cross more than one core switch; it's only counted from the
+first one which reports it, so it isn't counted twice.
+
+least_loaded_path() picks, from candidate paths, the one whose busiest
+link carries the least elephant traffic.
+"""
+
+import heapq
+
+import pox.openflow.libopenflow_01 as of
+
+# Priority of the rules moving a flow; above the reactively installed ones
+# they take over from, below the proactive and ARP punt rules
+ELEPHANT_PRIORITY = of.OFP_DEFAULT_PRIORITY + 50
+
+
+class SpaceSaving(object):
+    """
+    The Space-Saving heavy hitters sketch (Metwally et al.)
+
+    capacity counters are kept.  A key which isn't counted yet takes over
+    the smallest counter, inheriting its count as its error, so a key's
+    true count is between count - error and count, and every key with a
+    true count over total / capacity is in the sketch.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+
+        # Key -> [count, error]
+        self.counters = {}
+
+        # (count, key) heap for finding the smallest counter.  Counts only
+        # grow between decays, so stale entries are fixed up as they're
+        # popped rather than whenever a count changes.
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counters)
+
+    def __contains__(self, key):
+        return key in self.counters
+
+    def add(self, key, count=1):
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [count, 0]
+            heapq.heappush(self._heap, (count, key))
+            return
+        smallest, victim = self._pop_smallest()
+        del self.counters[victim]
+        self.counters[key] = [smallest + count, smallest]
+        heapq.heappush(self._heap, (smallest + count, key))
+
+    def _pop_smallest(self):
+        heap = self._heap
+        while True:
+            count, key = heapq.heappop(heap)
+            counter = self.counters.get(key)
+            if counter is None:
+                continue
+            if counter[0] == count:
+                return count, key
+            heapq.heappush(heap, (counter[0], key))
+
+    def estimate(self, key):
+        """ (count, error) for a key; (0, 0) if it isn't counted."""
+        counter = self.counters.get(key)
+        return (0, 0) if counter is None else tuple(counter)
+
+    def top(self, n):
+        """ The n heaviest (key, count, error), heaviest first."""
+        best = heapq.nlargest(n, self.counters.items(), key=lambda item: item[1][0])
+        return [(key, count, error) for key, (count, error) in best]
+
+    def decay(self, factor):
+        """ Scale every counter by factor, dropping those which reach 0."""
+        for key, counter in list(self.counters.items()):
+            counter[0] *= factor
+            counter[1] *= factor
+            if counter[0] < 1:
+                del self.counters[key]
+        self._heap = [(counter[0], key) for key, counter in self.counters.items()]
+        heapq.heapify(self._heap)
+
+
+class ElephantDetector(object):
+    """ Heavy flows from the core switches' flow statistics."""
+
+    def __init__(self, interval=5, min_rate=1000000, top=8, capacity=64, decay=0.5):
+        """
+        Flows sending more than min_rate bytes a second over the last few
+        intervals (the time between end_round() calls) are elephants; at
+        most top of them are reported.
+        """
+        self.interval = interval
+        self.min_rate = min_rate
+        self.top = top
+        self.decay = decay
+        self.sketch = SpaceSaving(capacity)
+
+        # A steady rate r adds up to r * interval / (1 - decay) with decay
+        self.threshold = min_rate * interval / (1 - decay)
+
+        # Flow key -> dpid of the switch it's counted from
+        self._owner = {}
+
+        # Flow key -> its byte count in the last reply
+        self._last = {}
+
+        # Flow key -> what the caller said about it, for those in the sketch
+        self.info = {}
+
+    def flow_sample(self, dpid, flows):
+        """
+        Count one switch's reply
+
+        flows is an iterable of (key, byte count, info).  info is kept with
+        the key while it is in the sketch.
+        """
+        seen = set()
+        for key, byte_count, info in flows:
+            owner = self._owner.get(key)
+            if owner is not None and owner != dpid:
+                continue
+            self._owner[key] = dpid
+            seen.add(key)
+            delta = byte_count - self._last.get(key, 0)
+            self._last[key] = byte_count
+            if delta <= 0:
+                continue
+            self.sketch.add(key, delta)
+            if key in self.sketch:
+                self.info[key] = info
+        # Flows which have gone from this switch may be counted elsewhere
+        for key in [k for k, d in self._owner.items() if d == dpid and k not in seen]:
+            del self._owner[key]
+            del self._last[key]
+
+    def forget_switch(self, dpid):
+        for key in [k for k, d in self._owner.items() if d == dpid]:
+            del self._owner[key]
+            del self._last[key]
+
+    def elephants(self):
+        """ [(key, info, bytes per second)] of the elephants, heaviest first."""
+        found = []
+        for key, count, error in self.sketch.top(self.top):
+            if count - error < self.threshold:
+                continue
+            found.append((key, self.info.get(key), self.rate(count)))
+        return found
+
+    def rate(self, count):
+        """ The steady rate a decayed count stands for."""
+        return count * (1 - self.decay) / self.interval
+
+    def end_round(self):
+        self.sketch.decay(self.decay)
+        for key in [k for k in self.info if k not in self.sketch]:
+            del self.info[key]
+
+
+def path_links(nodes):
+    """ The (from, to) switch pairs along a list of dpids."""
+    return list(zip(nodes, nodes[1:]))
+
+
+def least_loaded_path(candidates, link_load):
+    """
+    The candidate whose busiest link has the least load
+
+    candidates are tuples of dpids; link_load is a dict of (dpid, dpid) ->
+    load.  Links which every candidate uses (the first one out of the
+    client's switch, say) are left out, as there's no avoiding them.  Ties
+    go to the shorter, then the earlier, path.  Returns the best candidate
+    (None if there are none) and a dict of candidate -> its busiest load.
+    """
+    links = [path_links(nodes) for nodes in candidates]
+    shared = set(links[0]).intersection(*links[1:]) if links else set()
+    best = None
+    best_cost = None
+    loads = {}
+    for nodes, path in zip(candidates, links):
+        busiest = max([link_load.get(link, 0) for link in path if link not in shared] or [0])
+        loads[nodes] = busiest
+        cost = (busiest, len(nodes))
+        if best_cost is None or cost < best_cost:
+            best, best_cost = nodes, cost
+    return best, loads
@@ -0,0 +1,217 @@
+"""
+How evenly connections are spread over the backends.
+
+FairnessStats counts, for each backend of each pool, the connections
+assigned to it, the flows it has active and the bytes they carried.
+Assignments and bytes go into SlidingCounts, a ring of time buckets, so
+they can be summed over the last few windows (a minute, five, fifteen by
+default) however long the controller has been up; active flows are a
+gauge.  For each window it works out Jain's fairness index, which is 1
+when every backend has the same and 1/n when one has everything, and
+max/mean, how much more the busiest backend has than its fair share.
+
+Bytes come from the flow statistics of a connection's first rule while
+it's in, and from its FlowRemoved when it goes, counting only what the
+statistics hadn't.  A flow the statistics haven't seen for the longest
+window (its switch went, say, so no FlowRemoved will come) is forgotten.
+report() has it all for JSON, serve() puts that on the web server, and
+every log_interval a line per pool goes to the log.
+"""
+
+import time
+
+from pox.core import core
+from pox.lib.recoco import Timer
+
+from lb.stats import serve_json
+
+log = core.getLogger()
+
+
+def jain_index(values):
+    """ Jain's fairness index of a list of amounts (1 if they're all 0)."""
+    total = sum(values)
+    if not total:
+        return 1.0
+    return total * total / (len(values) * sum(v * v for v in values))
+
+
+def max_over_mean(values):
+    """ The largest amount over the mean (1 if they're all 0)."""
+    total = sum(values)
+    if not total:
+        return 1.0
+    return max(values) / (total / len(values))
+
+
+class SlidingCounts(object):
+    """ Per-key sums over the last buckets buckets of bucket seconds."""
+
+    def __init__(self, bucket=10, buckets=90):
+        self.bucket = bucket
+        self.size = buckets
+
+        # Each bucket is {key: amount}, for the time slot in _slots
+        self._buckets = [{} for _ in range(buckets)]
+        self._slots = [None] * buckets
+
+    def add(self, key, amount=1, now=None):
+        if now is None:
+            now = time.time()
+        slot = int(now // self.bucket)
+        i = slot % self.size
+        if self._slots[i] != slot:
+            self._slots[i] = slot
+            self._buckets[i] = {}
+        bucket = self._buckets[i]
+        bucket[key] = bucket.get(key, 0) + amount
+
+    def totals(self, seconds, now=None):
+        """ {key: sum} over the last seconds (rounded up to whole buckets)."""
+        if now is None:
+            now = time.time()
+        slot = int(now // self.bucket)
+        count = min(self.size, -(-int(seconds) // int(self.bucket)) or 1)
+        result = {}
+        for back in range(count):
+            i = (slot - back) % self.size
+            if self._slots[i] != slot - back:
+                continue
+            for key, amount in self._buckets[i].items():
+                result[key] = result.get(key, 0) + amount
+        return result
+
+
+class FairnessStats(object):
+    """ Assignments, active flows and bytes per backend, by pool."""
+
+    def __init__(self, windows=(60, 300, 900), bucket=10, log_interval=60, start=True):
+        self.windows = tuple(windows)
+        buckets = -(-int(max(windows)) // int(bucket))
+        self.assignments = SlidingCounts(bucket, buckets)
+        self.bytes = SlidingCounts(bucket, buckets)
+
+        # (pool, backend) -> flows it has now
+        self.active = {}
+
+        # Pool -> the backends it should be fair over, if it's been told
+        self._backends = {}
+
+        # Flow key -> (its byte count, when) when the statistics last saw it
+        self._seen = {}
+        self._next_expiry = 0
+
+        self._timer = None
+        if start and log_interval:
+            self._timer = Timer(log_interval, self.log_summary, recurring=True)
+
+    def stop(self):
+        if self._timer:
+            self._timer.cancel()
+
+    def set_backends(self, pool, backends):
+        """ The backends a pool spreads over now (only those up, say)."""
+        self._backends[pool] = list(backends)
+
+    def assigned(self, pool, backend, now=None):
+        """ A new connection went to backend."""
+        key = (pool, backend)
+        self.assignments.add(key, 1, now)
+        self.active[key] = self.active.get(key, 0) + 1
+
+    def flow_bytes(self, pool, backend, flow, byte_count, now=None):
+        """ A flow statistics reply says flow has carried byte_count so far."""
+        if now is None:
+            now = time.time()
+        delta = byte_count - self._seen.get(flow, (0, None))[0]
+        self._seen[flow] = (byte_count, now)
+        if delta > 0:
+            self.bytes.add((pool, backend), delta, now)
+        if now >= self._next_expiry:
+            self._expire_seen(now)
+
+    def finished(self, pool, backend, flow, byte_count, now=None):
+        """ A connection to backend is gone, having carried byte_count."""
+        key = (pool, backend)
+        active = self.active.get(key, 0)
+        if active > 1:
+            self.active[key] = active - 1
+        else:
+            self.active.pop(key, None)
+        delta = byte_count - self._seen.pop(flow, (0, None))[0]
+        if delta > 0:
+            self.bytes.add(key, delta, now)
+
+    def forget_pool(self, pool):
+        """ Drop a pool's active flows (its switch went, with them)."""
+        for key in [k for k in self.active if k[0] == pool]:
+            del self.active[key]
+        self._backends.pop(pool, None)
+
+    def _expire_seen(self, now):
+        longest = max(self.windows)
+        self._seen = {flow: seen for flow, seen in self._seen.items()
+                      if now - seen[1] < longest}
+        self._next_expiry = now + self.assignments.bucket
+
+    def _pools(self, *counts):
+        """ Pool -> its backends, from set_backends() or what's been seen."""
+        pools = {pool: list(backends) for pool, backends in self._backends.items()}
+        for c in counts:
+            for pool, backend in c:
+                if pool not in self._backends:
+                    backends = pools.setdefault(pool, [])
+                    if backend not in backends:
+                        backends.append(backend)
+        return pools
+
+    def report(self, now=None):
+        """ Every pool's counts and fairness, for JSON."""
+        if now is None:
+            now = time.time()
+        assignments = {w: self.assignments.totals(w, now) for w in self.windows}
+        byte_counts = {w: self.bytes.totals(w, now) for w in self.windows}
+        pools = self._pools(self.active, *assignments.values())
+        result = {}
+        for pool, backends in sorted(pools.items(), key=lambda item: str(item[0])):
+            if not backends:
+                continue
+            active = [self.active.get((pool, b), 0) for b in backends]
+            entry = {
+                'backends': {},
+                'active': {'jain': jain_index(active), 'max_over_mean': max_over_mean(active)},
+                'windows': {},
+            }
+            for b, flows in zip(backends, active):
+                entry['backends'][str(b)] = {
+                    'active': flows,
+                    'assignments': {str(w): assignments[w].get((pool, b), 0)
+                                    for w in self.windows},
+                    'bytes': {str(w): byte_counts[w].get((pool, b), 0) for w in self.windows},
+                }
+            for w in self.windows:
+                a = [assignments[w].get((pool, b), 0) for b in backends]
+                n = [byte_counts[w].get((pool, b), 0) for b in backends]
+                entry['windows'][str(w)] = {
+                    'assignments': {'jain': jain_index(a), 'max_over_mean': max_over_mean(a)},
+                    'bytes': {'jain': jain_index(n), 'max_over_mean': max_over_mean(n)},
+                }
+            result[str(pool)] = entry
+        return {'pools': result}
+
+    def log_summary(self, now=None):
+        """ Log a line per pool, over the shortest window."""
+        window = str(min(self.windows))
+        for pool, entry in self.report(now)['pools'].items():
+            stats = entry['windows'][window]
+            log.info(f"Pool {pool} over {window}s: assignments jain "
+                     f"{stats['assignments']['jain']:.3f} max/mean "
+                     f"{stats['assignments']['max_over_mean']:.2f}, bytes jain "
+                     f"{stats['bytes']['jain']:.3f} max/mean "
+                     f"{stats['bytes']['max_over_mean']:.2f}, active jain "
+                     f"{entry['active']['jain']:.3f} max/mean "
+                     f"{entry['active']['max_over_mean']:.2f}")
+
+    def serve(self, path='/lb/fairness'):
+        """ Serve report() as JSON at path once there's a web server."""
+        serve_json(path, self.report, "Fairness stats")
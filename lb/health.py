@@ -0,0 +1,232 @@
+"""
+Backend health checking for the load balancer.
+
+Every interval, HealthChecker sends each backend an ARP request from the
+VIP and, if tcp_port is set, a TCP SYN to that port (or to the port
+tcp_port() gives for the backend), straight out of the port the backend
+is attached to.  A round in which all of a backend's
+probes were answered is a success; one in which any went unanswered (or
+the SYN got a RST) is a miss.  After fall misses in a row a backend is
+marked down, and after rise successes in a row it's up again, raising a
+BackendHealth event either way.
+
+The probes are built once per backend and kept packed, so a round is
+mostly just packet_outs.  Backends start out up, and backends we don't
+know the location of yet aren't probed.
+"""
+
+import time
+
+import pox.openflow.libopenflow_01 as of
+from pox.core import core
+from pox.lib.packet.arp import arp
+from pox.lib.packet.ethernet import ethernet, ETHER_BROADCAST
+from pox.lib.packet.ipv4 import ipv4
+from pox.lib.packet.tcp import tcp
+from pox.lib.recoco import Timer
+from pox.lib.revent import Event, EventMixin
+
+log = core.getLogger()
+
+# Our side of TCP probes uses ports from here up, one per backend
+PROBE_PORT_BASE = 61000
+
+
+class BackendHealth(Event):
+    """ A backend went up or down."""
+
+    def __init__(self, backend, up):
+        self.backend = backend
+        self.up = up
+
+
+class _Backend(object):
+    __slots__ = ('ip', 'mac', 'index', 'up', 'misses', 'successes',
+                 'outstanding', 'probes', 'location', 'since', 'tcp_port')
+
+    def __init__(self, ip, mac, index):
+        self.ip = ip
+        self.mac = mac
+        self.index = index
+        self.up = True
+        self.misses = 0
+        self.successes = 0
+        self.outstanding = set()
+        self.probes = None
+        self.location = None
+        self.since = None
+        self.tcp_port = None
+
+
+class HealthChecker(EventMixin):
+    """ Probes backends and keeps track of which of them are up."""
+
+    _eventMixin_events = set([BackendHealth])
+
+    def __init__(self, backends, locate, vip, vmac, interval=1.0, fall=3,
+                 rise=2, tcp_port=None, start=True):
+        """
+        backends is a list of (IPAddr, EthAddr) and locate(mac) returns
+        where a backend is attached as (dpid, port), or None.  tcp_port is
+        the port to send SYNs to, or a function of a backend's IP returning
+        its port (None for no SYN).
+        """
+        self.locate = locate
+        self.vip = vip
+        self.vmac = vmac
+        self.interval = interval
+        self.fall = fall
+        self.rise = rise
+        self.tcp_port = tcp_port
+        self._backends = {ip: _Backend(ip, mac, i)
+                          for i, (ip, mac) in enumerate(backends)}
+        self._timer = None
+        if start:
+            self._timer = Timer(interval, self.probe, recurring=True)
+
+    def add_backend(self, ip, mac):
+        """ Start probing another backend (which starts out up)."""
+        if ip not in self._backends:
+            self._backends[ip] = _Backend(ip, mac, len(self._backends))
+
+    def is_up(self, backend):
+        b = self._backends.get(backend)
+        return b is None or b.up
+
+    @property
+    def down(self):
+        return set(ip for ip, b in self._backends.items() if not b.up)
+
+    def stop(self):
+        if self._timer:
+            self._timer.cancel()
+
+    def probe(self, now=None):
+        """ Score the last round and send the next one."""
+        if now is None:
+            now = time.time()
+        for b in self._backends.values():
+            if b.outstanding:
+                b.outstanding.clear()
+                self._miss(b, now)
+            location = self.locate(b.mac)
+            if location is None:
+                continue
+            if location != b.location:
+                b.location = location
+                b.probes = self._build_probes(b, location[1])
+            if not self._send(location[0], b.probes):
+                continue
+            b.outstanding.add('arp')
+            if b.tcp_port:
+                b.outstanding.add('tcp')
+
+    def handle_packet_in(self, event):
+        """ Look for probe replies; returns True if it was one."""
+        packet = event.parsed
+        if packet.type == ethernet.ARP_TYPE:
+            a = packet.payload
+            if a.opcode != arp.REPLY or a.protodst != self.vip:
+                return False
+            b = self._backends.get(a.protosrc)
+            if b is None:
+                return False
+            self._answered(b, 'arp')
+            return True
+
+        if packet.type != ethernet.IP_TYPE or not self.tcp_port:
+            return False
+        ip = packet.payload
+        if ip.dstip != self.vip or ip.protocol != ipv4.TCP_PROTOCOL:
+            return False
+        b = self._backends.get(ip.srcip)
+        t = ip.payload
+        if b is None or not b.tcp_port or t.srcport != b.tcp_port:
+            return False
+        if t.dstport != PROBE_PORT_BASE + b.index:
+            return False
+        if t.RST:
+            # Nobody listening
+            if 'tcp' in b.outstanding:
+                b.outstanding.clear()
+                self._miss(b, time.time())
+        elif t.SYN and t.ACK:
+            # Don't leave it half open
+            self._send_rst(event, packet, t)
+            self._answered(b, 'tcp')
+        return True
+
+    def _send(self, dpid, data):
+        connection = core.openflow.getConnection(dpid)
+        if connection is None:
+            return False
+        connection.send(data)
+        return True
+
+    def _answered(self, b, kind):
+        if kind not in b.outstanding:
+            return
+        b.outstanding.discard(kind)
+        if not b.outstanding:
+            b.misses = 0
+            b.successes += 1
+            if not b.up and b.successes >= self.rise:
+                b.up = True
+                log.info(f"Backend {b.ip} is up")
+                self.raiseEvent(BackendHealth, b.ip, True)
+
+    def _miss(self, b, now):
+        b.successes = 0
+        b.misses += 1
+        if b.misses == 1:
+            b.since = now
+        if b.up and b.misses >= self.fall:
+            b.up = False
+            log.warning(f"Backend {b.ip} is down ({b.misses} probes missed "
+                        f"over {now - b.since:.1f}s)")
+            self.raiseEvent(BackendHealth, b.ip, False)
+
+    def _build_probes(self, b, port):
+        """ Packed packet_outs for all of a backend's probes."""
+        r = arp()
+        r.opcode = arp.REQUEST
+        r.hwdst = ETHER_BROADCAST
+        r.protodst = b.ip
+        r.hwsrc = self.vmac
+        r.protosrc = self.vip
+        e = ethernet(type=ethernet.ARP_TYPE, src=self.vmac, dst=ETHER_BROADCAST)
+        e.payload = r
+        msgs = [of.ofp_packet_out(data=e.pack(),
+                                  action=of.ofp_action_output(port=port))]
+
+        b.tcp_port = self.tcp_port(b.ip) if callable(self.tcp_port) else self.tcp_port
+        if b.tcp_port:
+            t = tcp()
+            t.srcport = PROBE_PORT_BASE + b.index
+            t.dstport = b.tcp_port
+            t.seq = 1
+            t.off = 5
+            t.SYN = True
+            t.win = 1024
+            i = ipv4(protocol=ipv4.TCP_PROTOCOL, srcip=self.vip, dstip=b.ip)
+            i.payload = t
+            e = ethernet(type=ethernet.IP_TYPE, src=self.vmac, dst=b.mac)
+            e.payload = i
+            msgs.append(of.ofp_packet_out(data=e.pack(),
+                                          action=of.ofp_action_output(port=port)))
+        return b''.join(m.pack() for m in msgs)
+
+    def _send_rst(self, event, packet, syn_ack):
+        t = tcp()
+        t.srcport = syn_ack.dstport
+        t.dstport = syn_ack.srcport
+        t.seq = syn_ack.ack
+        t.off = 5
+        t.RST = True
+        ip = packet.payload
+        i = ipv4(protocol=ipv4.TCP_PROTOCOL, srcip=ip.dstip, dstip=ip.srcip)
+        i.payload = t
+        e = ethernet(type=ethernet.IP_TYPE, src=packet.dst, dst=packet.src)
+        e.payload = i
+        event.connection.send(of.ofp_packet_out(
+            data=e.pack(), action=of.ofp_action_output(port=event.port)))
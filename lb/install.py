@@ -0,0 +1,118 @@
+"""
+Installing a path's rules before letting its first packet go.
+
+PathInstaller takes the messages for every switch on a path, sends each
+switch's messages in one write ending with a barrier request, and sends
+the packet which started it all only once every switch has answered its
+barrier, like l2_multi's WaitingPath.  That way the packet never races
+ahead of its rules and ends up back at the controller (or dropped).
+
+Paths whose barriers don't all come back within timeout are given up on,
+and their packet is dropped.  So are the oldest ones if more than
+max_waiting barriers are outstanding.
+"""
+
+import time
+from collections import deque
+
+import pox.openflow.libopenflow_01 as of
+from pox.core import core
+
+log = core.getLogger()
+
+PATH_SETUP_TIME = 4
+
+
+class _Pending(object):
+    __slots__ = ('xids', 'release', 'expires_at')
+
+    def __init__(self, release, expires_at):
+        self.xids = set()
+        self.release = release
+        self.expires_at = expires_at
+
+
+class PathInstaller(object):
+    """ Sends a path's rules, and its packet once they're all in."""
+
+    def __init__(self, timeout=PATH_SETUP_TIME, max_waiting=1000):
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+
+        # (dpid, barrier xid) -> _Pending
+        self._waiting = {}
+
+        # (expires_at, key) in the order they were sent, which is also the
+        # order they expire in
+        self._order = deque()
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def install(self, messages, release=None, now=None):
+        """
+        Send messages, a dict of dpid -> list of OpenFlow messages.
+
+        release is (dpid, message) to send once every switch has confirmed
+        its messages, e.g. a packet_out of the buffered packet.  Returns
+        how many switches the messages couldn't be sent to.
+        """
+        if now is None:
+            now = time.time()
+        self.expire(now)
+
+        pending = _Pending(release, now + self.timeout)
+        missing = 0
+        for dpid, msgs in messages.items():
+            barrier = of.ofp_barrier_request()
+            data = b''.join(m.pack() for m in msgs) + barrier.pack()
+            if not self._send(dpid, data):
+                missing += 1
+                continue
+            key = (dpid, barrier.xid)
+            pending.xids.add(key)
+            self._waiting[key] = pending
+            self._order.append((pending.expires_at, key))
+
+        if not pending.xids:
+            self._release(pending)
+        return missing
+
+    def barrier_in(self, dpid, xid):
+        """ A barrier reply came in; returns True if it was one of ours."""
+        pending = self._waiting.pop((dpid, xid), None)
+        if pending is None:
+            return False
+        pending.xids.discard((dpid, xid))
+        if not pending.xids:
+            self._release(pending)
+        return True
+
+    def forget_switch(self, dpid):
+        """ A switch went away; stop waiting for it."""
+        for key in [k for k in self._waiting if k[0] == dpid]:
+            self.barrier_in(*key)
+
+    def expire(self, now=None):
+        if now is None:
+            now = time.time()
+        order = self._order
+        waiting = self._waiting
+        killed = 0
+        while order and (order[0][0] <= now or len(waiting) > self.max_waiting):
+            if waiting.pop(order.popleft()[1], None) is not None:
+                killed += 1
+        if killed:
+            log.error(f"{killed} rule installs weren't confirmed in time")
+
+    def _release(self, pending):
+        if pending.release is not None:
+            dpid, msg = pending.release
+            self._send(dpid, msg.pack())
+
+    def _send(self, dpid, data):
+        connection = core.openflow.getConnection(dpid)
+        if connection is None:
+            return False
+        connection.send(data)
+        return True
@@ -0,0 +1,367 @@
+"""
+Switch-level path computation for the load balancer.
+
+PathTable keeps a graph of the switches built from openflow.discovery link
+events and caches the shortest (or k shortest) paths between pairs of
+switches.  When a link changes, only cached entries which could be affected
+by it are dropped, so lookups on the PacketIn path stay a dict hit.
+
+A path is a tuple of (dpid, in_port, out_port) hops.  The in_port of the
+first hop and the out_port of the last hop are None, since they depend on
+where the traffic enters and leaves the network; cook() fills them in.
+
+LeastUtilizedPaths picks, of a PathTable's k paths between two switches,
+the one whose busiest link is least utilized.  Its choices are cached too,
+and dropped when the utilization of a link one of the candidates uses has
+moved by more than a threshold since, or when the PathTable's paths change.
+"""
+
+from collections import defaultdict, deque
+
+from pox.core import core
+
+log = core.getLogger()
+
+
+def cook(path, first_port, final_port):
+    """ Fill in the ingress port of the first hop and the egress port of the last one."""
+    if len(path) == 1:
+        return [(path[0][0], first_port, final_port)]
+    first = (path[0][0], first_port, path[0][2])
+    last = (path[-1][0], path[-1][1], final_port)
+    return [first] + list(path[1:-1]) + [last]
+
+
+class PathTable(object):
+    """ Shortest (or k-shortest) paths between switches, cached per (src, dst)."""
+
+    def __init__(self, k=1):
+        self.k = k
+
+        # dpid -> {neighbor dpid: (out_port, neighbor's in_port)}
+        self.adjacency = defaultdict(dict)
+
+        # (dpid1, dpid2) -> set of (port1, port2), so parallel links can
+        # take over when the one in use goes away
+        self._links = defaultdict(set)
+
+        # (dpid, port) -> how many of the links in _links have an end on
+        # it, so is_edge_port() doesn't have to look through them
+        self._link_ports = {}
+
+        # (src, dst) -> tuple of paths, shortest first
+        self._paths = {}
+
+        # (dpid1, dpid2) -> set of (src, dst) whose cached paths use that link
+        self._users = defaultdict(set)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def add_link(self, link):
+        """ Add a unidirectional link (an openflow.discovery Link)."""
+        d1, d2 = link.dpid1, link.dpid2
+        ports = self._links[(d1, d2)]
+        if (link.port1, link.port2) not in ports:
+            ports.add((link.port1, link.port2))
+            self._count_ports(d1, d2, link.port1, link.port2, 1)
+        if d2 in self.adjacency[d1]:
+            # Parallel link; the one we're using is still fine
+            return
+        self.adjacency[d1][d2] = (link.port1, link.port2)
+        self._invalidate_improved(d1, d2)
+
+    def remove_link(self, link):
+        """ Remove a unidirectional link (an openflow.discovery Link)."""
+        d1, d2 = link.dpid1, link.dpid2
+        ports = self._links.get((d1, d2))
+        if not ports or (link.port1, link.port2) not in ports:
+            return
+        ports.discard((link.port1, link.port2))
+        self._count_ports(d1, d2, link.port1, link.port2, -1)
+        if self.adjacency[d1].get(d2) != (link.port1, link.port2):
+            # It wasn't the link we were using
+            return
+        if ports:
+            self.adjacency[d1][d2] = next(iter(ports))
+        else:
+            del self._links[(d1, d2)]
+            del self.adjacency[d1][d2]
+        self._invalidate_users(d1, d2)
+
+    def remove_switch(self, dpid):
+        """ Forget every link to or from a switch."""
+        for d1, d2 in [k for k in self._links if dpid in k]:
+            for port1, port2 in self._links.pop((d1, d2)):
+                self._count_ports(d1, d2, port1, port2, -1)
+            self.adjacency[d1].pop(d2, None)
+            self._invalidate_users(d1, d2)
+        self.adjacency.pop(dpid, None)
+        for key in [k for k in self._paths if dpid in k]:
+            self._drop(key)
+
+    def is_edge_port(self, dpid, port):
+        """ True if no known link has an end on this port."""
+        return (dpid, port) not in self._link_ports
+
+    def _count_ports(self, d1, d2, port1, port2, delta):
+        for end in ((d1, port1), (d2, port2)):
+            n = self._link_ports.get(end, 0) + delta
+            if n > 0:
+                self._link_ports[end] = n
+            else:
+                self._link_ports.pop(end, None)
+
+    def get_paths(self, src, dst):
+        """ Get the cached paths from src to dst (an empty tuple if there are none)."""
+        paths = self._paths.get((src, dst))
+        if paths is None:
+            paths = self._compute(src, dst)
+            self._store((src, dst), paths)
+        return paths
+
+    def get_path(self, src, dst):
+        """ Get the shortest path from src to dst, or None."""
+        paths = self.get_paths(src, dst)
+        if not paths:
+            return None
+        return paths[0]
+
+    def alternatives(self, src, dst, slack=0, limit=4):
+        """
+        Up to limit paths from src to dst, shortest first, none of them more
+        than slack hops longer than the shortest one.  Not cached.
+        """
+        found = self._k_shortest(src, dst, limit)
+        if not found:
+            return ()
+        longest = len(found[0]) + slack
+        return tuple(self._hops(nodes) for nodes in found if len(nodes) <= longest)
+
+    def tree_to(self, dst):
+        """
+        Get a shortest-path tree towards dst as {dpid: (next_dpid, out_port)}
+
+        Unlike separate per-pair paths, the tree never sends two flows for
+        dst out of different ports of the same switch, so it can be
+        installed as one destination-based rule per switch.  dst itself is
+        not in the result.
+        """
+        tree = {}
+        for node, (_, parent) in self._bfs(dst, reverse=True).items():
+            if parent is not None:
+                tree[node] = (parent, self.adjacency[node][parent][0])
+        return tree
+
+    def precompute(self, sources, destinations):
+        """ Fill the cache for every (source, destination) pair."""
+        destinations = set(destinations)
+        for src in sources:
+            missing = [dst for dst in destinations if (src, dst) not in self._paths]
+            if not missing:
+                continue
+            if self.k == 1:
+                # One BFS gets us all of them
+                parents = self._bfs(src)
+                for dst in missing:
+                    nodes = self._walk(parents, src, dst)
+                    self._store((src, dst), (self._hops(nodes),) if nodes else ())
+            else:
+                for dst in missing:
+                    self.get_paths(src, dst)
+
+    def _compute(self, src, dst):
+        if self.k == 1:
+            nodes = self._shortest(src, dst)
+            if nodes is None:
+                return ()
+            return (self._hops(nodes),)
+        return tuple(self._hops(nodes) for nodes in self._k_shortest(src, dst))
+
+    def _hops(self, nodes):
+        """ Turn a list of dpids into a tuple of (dpid, in_port, out_port)."""
+        hops = []
+        in_port = None
+        for a, b in zip(nodes[:-1], nodes[1:]):
+            out_port, next_in = self.adjacency[a][b]
+            hops.append((a, in_port, out_port))
+            in_port = next_in
+        hops.append((nodes[-1], in_port, None))
+        return tuple(hops)
+
+    def _store(self, key, paths):
+        self._paths[key] = paths
+        for path in paths:
+            for (a, _, _), (b, _, _) in zip(path[:-1], path[1:]):
+                self._users[(a, b)].add(key)
+
+    def _drop(self, key):
+        paths = self._paths.pop(key, None)
+        if not paths:
+            return
+        for path in paths:
+            for (a, _, _), (b, _, _) in zip(path[:-1], path[1:]):
+                users = self._users.get((a, b))
+                if users is not None:
+                    users.discard(key)
+                    if not users:
+                        del self._users[(a, b)]
+
+    def _invalidate_users(self, d1, d2):
+        keys = self._users.pop((d1, d2), ())
+        for key in list(keys):
+            self._drop(key)
+        if keys:
+            log.debug(f"Link {d1}->{d2} changed; dropped {len(keys)} cached paths")
+
+    def _invalidate_improved(self, d1, d2):
+        """ Drop cached entries which a new link d1->d2 could make shorter."""
+        if not self._paths:
+            return
+        to_d1 = self._bfs(d1, reverse=True)
+        from_d2 = self._bfs(d2)
+        dropped = 0
+        for (src, dst), paths in list(self._paths.items()):
+            if src not in to_d1 or dst not in from_d2:
+                continue
+            length = to_d1[src][0] + 1 + from_d2[dst][0]
+            if len(paths) < self.k or length < len(paths[-1]) - 1:
+                self._drop((src, dst))
+                dropped += 1
+        if dropped:
+            log.debug(f"Link {d1}->{d2} added; dropped {dropped} cached paths")
+
+    def _bfs(self, src, reverse=False, banned_edges=(), banned_nodes=()):
+        """ Breadth-first search; returns {dpid: (distance, parent)}."""
+        if reverse:
+            graph = defaultdict(list)
+            for a, neighbors in self.adjacency.items():
+                for b in neighbors:
+                    graph[b].append(a)
+        else:
+            graph = self.adjacency
+        seen = {src: (0, None)}
+        queue = deque([src])
+        while queue:
+            node = queue.popleft()
+            distance = seen[node][0] + 1
+            for neighbor in sorted(graph.get(node, ())):
+                if neighbor in seen or neighbor in banned_nodes:
+                    continue
+                if (node, neighbor) in banned_edges:
+                    continue
+                seen[neighbor] = (distance, node)
+                queue.append(neighbor)
+        return seen
+
+    @staticmethod
+    def _walk(parents, src, dst):
+        if dst not in parents:
+            return None
+        nodes = [dst]
+        while nodes[-1] != src:
+            nodes.append(parents[nodes[-1]][1])
+        nodes.reverse()
+        return nodes
+
+    def _shortest(self, src, dst, banned_edges=(), banned_nodes=()):
+        return self._walk(self._bfs(src, banned_edges=banned_edges,
+                                    banned_nodes=banned_nodes), src, dst)
+
+    def _k_shortest(self, src, dst, k=None):
+        """ Yen's algorithm over the (unweighted) switch graph."""
+        if k is None:
+            k = self.k
+        first = self._shortest(src, dst)
+        if first is None:
+            return []
+        found = [first]
+        candidates = []
+        seen = {tuple(first)}
+        while len(found) < k:
+            last = found[-1]
+            for i in range(len(last) - 1):
+                root = last[:i + 1]
+                banned_edges = set((p[i], p[i + 1]) for p in found
+                                   if p[:i + 1] == root)
+                spur = self._shortest(last[i], dst, banned_edges, set(root[:-1]))
+                if spur is None:
+                    continue
+                candidate = root[:-1] + spur
+                if tuple(candidate) not in seen:
+                    seen.add(tuple(candidate))
+                    candidates.append(candidate)
+            if not candidates:
+                break
+            candidates.sort(key=len)
+            found.append(candidates.pop(0))
+        return found
+
+
+def hop_links(path):
+    """ The (dpid, next dpid) links a path of hops goes over."""
+    return [(a[0], b[0]) for a, b in zip(path, path[1:])]
+
+
+class LeastUtilizedPaths(object):
+    """ The least utilized of a PathTable's paths, cached per (src, dst)."""
+
+    def __init__(self, paths, utilization, threshold=0.1):
+        """
+        utilization is a dict of (dpid, next dpid) -> utilization which is
+        kept up to date elsewhere (LinkMonitor.link_utilization(), say);
+        update() must be told when it changes.
+        """
+        self.paths = paths
+        self.utilization = utilization
+        self.threshold = threshold
+
+        # (src, dst) -> (the PathTable's paths, the one we picked)
+        self._choices = {}
+
+        # (dpid, next dpid) -> set of (src, dst) whose candidates use it
+        self._users = defaultdict(set)
+
+        # (dpid, next dpid) -> its utilization when choices using it were made
+        self._baseline = {}
+
+    def __len__(self):
+        return len(self._choices)
+
+    def get_path(self, src, dst):
+        """ The least utilized path from src to dst, or None."""
+        candidates = self.paths.get_paths(src, dst)
+        choice = self._choices.get((src, dst))
+        if choice is not None and choice[0] is candidates:
+            return choice[1]
+        if not candidates:
+            return None
+        utilization = self.utilization
+        best = None
+        best_cost = None
+        for path in candidates:
+            links = hop_links(path)
+            cost = (max([utilization.get(link, 0.0) for link in links] or [0.0]), len(path))
+            if best_cost is None or cost < best_cost:
+                best, best_cost = path, cost
+            for link in links:
+                self._users[link].add((src, dst))
+                self._baseline.setdefault(link, utilization.get(link, 0.0))
+        self._choices[(src, dst)] = (candidates, best)
+        return best
+
+    def update(self, links):
+        """
+        Some links' utilization changed; links is {(dpid, next dpid): new
+        utilization}.  Returns how many cached choices were dropped.
+        """
+        dropped = 0
+        for link, value in links.items():
+            baseline = self._baseline.get(link)
+            if baseline is None or abs(value - baseline) < self.threshold:
+                continue
+            del self._baseline[link]
+            for key in self._users.pop(link, ()):
+                if self._choices.pop(key, None) is not None:
+                    dropped += 1
+        return dropped
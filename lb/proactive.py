@@ -0,0 +1,202 @@
+"""
+Proactive rule installation for the load balancer.
+
+Rather than taking a PacketIn for every new connection, the client address
+space is split into nw_src prefix buckets, each bucket is given to a server
+(in proportion to the servers' weights), and every edge switch gets one
+rewrite-and-forward rule per bucket.  Towards each server we install one
+destination-based rule per switch along a shortest-path tree.
+
+Rules are kept in a table of what is installed, and sync() only sends the
+difference, so rebalancing or a topology change touches as few rules as
+possible.
+
+OpenFlow 1.0 can only wildcard nw_src by prefix, so the buckets are
+consecutive sub-prefixes of the client network.  With the default 8 bits
+on a /24 each bucket is a single host.
+"""
+
+import pox.openflow.libopenflow_01 as of
+from pox.core import core
+from pox.lib.addresses import IPAddr
+from pox.lib.packet.ethernet import ethernet
+
+log = core.getLogger()
+
+PROACTIVE_PRIORITY = of.OFP_DEFAULT_PRIORITY + 100
+
+
+def split_prefix(network, bits):
+    """ Split network, an (IPAddr, prefix length) pair, into 2**bits prefixes."""
+    base, length = network
+    bits = min(bits, 32 - length)
+    step = 1 << (32 - length - bits)
+    start = base.toUnsigned() & (0xffffffff << (32 - length)) & 0xffffffff
+    return [(IPAddr(start + i * step), length + bits) for i in range(1 << bits)]
+
+
+def apportion(count, weights):
+    """ Split count items among weights by largest remainder."""
+    total = sum(weights)
+    if total <= 0:
+        return [0] * len(weights)
+    exact = [count * w / total for w in weights]
+    quotas = [int(e) for e in exact]
+    order = sorted(range(len(weights)), key=lambda i: (quotas[i] - exact[i], i))
+    for i in order[:count - sum(quotas)]:
+        quotas[i] += 1
+    return quotas
+
+
+def assign_buckets(assignment, weights):
+    """
+    Give buckets to servers in proportion to weights
+
+    assignment holds the server index of every bucket (or None).  Buckets
+    stay where they are unless their server is over its quota, so changing
+    one weight only moves that server's share.  Returns a new list.
+    """
+    quotas = apportion(len(assignment), weights)
+    counts = [0] * len(weights)
+    result = list(assignment)
+    homeless = []
+    for bucket, server in enumerate(result):
+        if server is not None and server < len(weights) and counts[server] < quotas[server]:
+            counts[server] += 1
+        else:
+            homeless.append(bucket)
+
+    # Deal out the rest round-robin so neighbouring buckets are spread out
+    server = 0
+    for bucket in homeless:
+        if sum(quotas) == sum(counts):
+            result[bucket] = None
+            continue
+        while counts[server] >= quotas[server]:
+            server = (server + 1) % len(weights)
+        result[bucket] = server
+        counts[server] += 1
+        server = (server + 1) % len(weights)
+    return result
+
+
+class ProactiveRules(object):
+    """ Keeps the proactive rules for one VIP in sync with the topology."""
+
+    def __init__(self, vip, port, protocols, servers, client_net, bucket_bits,
+                 weights=None):
+        self.vip = vip
+        self.port = port
+        self.protocols = protocols
+
+        # List of (IPAddr, EthAddr)
+        self.servers = servers
+        self.weights = list(weights) if weights else [1] * len(servers)
+
+        self.buckets = self._make_buckets(client_net, bucket_bits)
+        self.assignment = [None] * len(self.buckets)
+
+        # (dpid, key) -> value, for the rules we've sent
+        self.installed = {}
+
+    def _make_buckets(self, client_net, bucket_bits):
+        return split_prefix(client_net, bucket_bits)
+
+    def set_weights(self, weights):
+        self.weights = list(weights)
+
+    def forget_switch(self, dpid):
+        """ The switch went away (and will come back with an empty table)."""
+        for key in [k for k in self.installed if k[0] == dpid]:
+            del self.installed[key]
+
+    def sync(self, paths, edge_switches, locations):
+        """
+        Bring the switches in line with the current topology and weights
+
+        paths is a PathTable and locations maps server MACs to (dpid, port).
+        """
+        # Servers we can't reach don't get buckets
+        weights = [w if mac in locations else 0
+                   for w, (_, mac) in zip(self.weights, self.servers)]
+        assignment = assign_buckets(self.assignment, weights)
+        moved = sum(1 for a, b in zip(self.assignment, assignment) if a != b)
+        if moved:
+            log.info(f"VIP {self.vip}: {moved} of {len(assignment)} buckets moved")
+        self.assignment = assignment
+
+        wanted = {}
+
+        # Towards each server, along a tree rooted at its switch
+        first_hops = {}
+        for index, (ip, mac) in enumerate(self.servers):
+            if weights[index] == 0:
+                continue
+            dpid, port = locations[mac]
+            tree = paths.tree_to(dpid)
+            first_hops[index] = {dpid: port}
+            for edge in edge_switches:
+                if edge != dpid and edge not in tree:
+                    continue
+                node = edge
+                while node != dpid:
+                    next_node, out_port = tree[node]
+                    first_hops[index][node] = out_port
+                    node = next_node
+            for node, out_port in first_hops[index].items():
+                wanted[(node, ('server', index))] = out_port
+
+        self._edge_rules(wanted, edge_switches, first_hops)
+        self._apply(wanted)
+
+    def _edge_rules(self, wanted, edge_switches, first_hops):
+        """ At the edge, rewrite the VIP to the bucket's server."""
+        for edge in edge_switches:
+            for bucket, index in enumerate(self.assignment):
+                if index is None or edge not in first_hops[index]:
+                    continue
+                for proto in self.protocols:
+                    wanted[(edge, ('vip', bucket, proto))] = (index, first_hops[index][edge])
+
+    def _apply(self, wanted):
+        changed = removed = 0
+        for key, value in wanted.items():
+            if self.installed.get(key) == value:
+                continue
+            command = of.OFPFC_MODIFY_STRICT if key in self.installed else of.OFPFC_ADD
+            if self._send(key, value, command):
+                self.installed[key] = value
+                changed += 1
+        for key in [k for k in self.installed if k not in wanted]:
+            self._send(key, None, of.OFPFC_DELETE_STRICT)
+            del self.installed[key]
+            removed += 1
+        if changed or removed:
+            log.debug(f"VIP {self.vip}: {changed} rules added or changed, {removed} removed")
+
+    def _send(self, key, value, command):
+        dpid, rule = key
+        connection = core.openflow.getConnection(dpid)
+        if connection is None:
+            return False
+
+        msg = of.ofp_flow_mod(command=command, priority=PROACTIVE_PRIORITY)
+        msg.match.dl_type = ethernet.IP_TYPE
+        if rule[0] == 'server':
+            ip, mac = self.servers[rule[1]]
+            msg.match.nw_dst = ip
+            if value is not None:
+                msg.actions.append(of.ofp_action_output(port=value))
+        else:
+            _, bucket, proto = rule
+            msg.match.nw_proto = proto
+            msg.match.nw_src = self.buckets[bucket]
+            msg.match.nw_dst = self.vip
+            msg.match.tp_dst = self.port
+            if value is not None:
+                ip, mac = self.servers[value[0]]
+                msg.actions.append(of.ofp_action_nw_addr.set_dst(ip))
+                msg.actions.append(of.ofp_action_dl_addr.set_dst(mac))
+                msg.actions.append(of.ofp_action_output(port=value[1]))
+        connection.send(msg)
+        return True
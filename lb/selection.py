@@ -0,0 +1,365 @@
+"""
+Backend selection for the load balancers.
+
+A selector maps a flow hash (a non-negative int) to one of its backends.
+The backends can be anything hashable with a stable str() -- server IPs for
+new_lb, switch ports for hash_lb.  Everything expensive happens in
+set_backends(), which builds a lookup table, so select() is a single index
+operation for all of them except "bounded", which may have to step past
+backends that are full.
+
+  modulo   backends[h % n]; what the balancers always did.  Changing the
+           backend list remaps almost every flow.
+  ring     Consistent hash ring with virtual nodes, flattened into a table
+           of 2**table_bits slots.
+  maglev   Maglev lookup table (Eisenbud et al., NSDI 2016).
+  bounded  Consistent hashing with bounded loads (Mirrokni et al., 2016):
+           the ring, but a backend with more than c times the average load
+           is skipped.  Needs release() to be called when flows end.
+  least_conn   Power of two choices: two ring lookups with different bits
+  least_bytes  of the hash, and whichever candidate has fewer active flows
+               (or less traffic) wins.  The loads come from switch
+               statistics through set_load(); see lb.stats.
+
+Backends can be given relative weights with set_weights() (1 by default,
+0 takes a backend out of the table).  Weights are folded into the lookup
+tables when they're built -- modulo repeats backends in a longer table,
+the rings give each backend vnodes in proportion, maglev lets heavier
+backends fill more of its table, bounded scales each backend's bound and
+least_* compare load per unit of weight -- so select() costs the same.
+"""
+
+import hashlib
+import math
+from bisect import bisect_left
+
+
+def _hash32(s):
+    """ Hash a string to 32 bits; only used while building tables."""
+    return int.from_bytes(hashlib.md5(s.encode()).digest()[:4], 'big')
+
+
+class Selector(object):
+    """ Base class for selectors."""
+
+    # Whether the selector needs set_load() to be fed from switch statistics
+    wants_stats = False
+
+    def __init__(self, backends=()):
+        self.backends = []
+        self.weights = {}
+        self.set_backends(backends)
+
+    def __len__(self):
+        return len(self.backends)
+
+    def __contains__(self, backend):
+        return backend in self._members
+
+    def set_backends(self, backends):
+        self.backends = list(backends)
+        self._members = set(self.backends)
+        self._build()
+
+    def add_backend(self, backend):
+        if backend not in self.backends:
+            self.set_backends(self.backends + [backend])
+
+    def remove_backend(self, backend):
+        if backend in self.backends:
+            self.set_backends([b for b in self.backends if b != backend])
+
+    def set_weights(self, weights):
+        """
+        Set backends' relative weights from a dict (missing ones are 1)
+
+        The tables are only rebuilt if something changed.
+        """
+        weights = {b: float(w) for b, w in weights.items() if w != 1}
+        if weights == self.weights:
+            return False
+        self.weights = weights
+        self._build()
+        return True
+
+    def weight(self, backend):
+        return self.weights.get(backend, 1.0)
+
+    def select(self, h):
+        """ Pick a backend for flow hash h (None if there are no backends)."""
+        raise NotImplementedError()
+
+    def assign(self, backend):
+        """ A flow was sent to backend without asking select()."""
+        pass
+
+    def release(self, backend):
+        """ A flow which was sent to backend has ended."""
+        pass
+
+    def _build(self):
+        pass
+
+
+def weighted_table(backends, weight, size=1024):
+    """
+    A list in which each backend appears in proportion to its weight
+
+    With equal weights it's just the backends.  Otherwise it has about
+    size entries, spread out by smooth weighted round robin.
+    """
+    weights = [(b, weight(b)) for b in backends]
+    weights = [(b, w) for b, w in weights if w > 0]
+    if len(set(w for b, w in weights)) <= 1:
+        return [b for b, w in weights]
+    total = sum(w for b, w in weights)
+    current = [0.0] * len(weights)
+    table = []
+    for _ in range(max(size, len(weights))):
+        best = 0
+        for i, (b, w) in enumerate(weights):
+            current[i] += w
+            if current[i] > current[best]:
+                best = i
+        current[best] -= total
+        table.append(weights[best][0])
+    return table
+
+
+class ModuloSelector(Selector):
+    def _build(self):
+        self.table = weighted_table(self.backends, self.weight)
+
+    def select(self, h):
+        if not self.table:
+            return None
+        return self.table[h % len(self.table)]
+
+
+class RingSelector(Selector):
+    def __init__(self, backends=(), vnodes=100, table_bits=16):
+        self.vnodes = vnodes
+        self.table_bits = table_bits
+        super(RingSelector, self).__init__(backends)
+
+    def _build(self):
+        # The ring: sorted vnode points and who owns each of them
+        points = sorted((_hash32(f"{b}#{i}"), str(b), b)
+                        for b in self.backends for i in range(self._vnodes(b)))
+        self._points = [p[0] for p in points]
+        self._owners = [p[2] for p in points]
+
+        # Flatten it: slot i belongs to whoever owns the first point at or
+        # after i's position on the ring
+        size = 1 << self.table_bits
+        self._mask = size - 1
+        if not points:
+            self.table = [None] * size
+            self._start = [0] * size
+            return
+        shift = 32 - self.table_bits
+        count = len(points)
+        self._start = [bisect_left(self._points, i << shift) % count
+                       for i in range(size)]
+        self.table = [self._owners[s] for s in self._start]
+
+    def _vnodes(self, backend):
+        # Relative to a weight of 1, so changing one backend's weight
+        # doesn't move the others' points
+        w = self.weight(backend)
+        if w <= 0:
+            return 0
+        return max(1, int(round(self.vnodes * w)))
+
+    def select(self, h):
+        return self.table[h & self._mask]
+
+
+class MaglevSelector(Selector):
+    def __init__(self, backends=(), table_size=65537):
+        # Should be prime, and much bigger than the number of backends
+        self.table_size = table_size
+        super(MaglevSelector, self).__init__(backends)
+
+    def _build(self):
+        size = self.table_size
+        self.table = [None] * size
+        if not self.backends:
+            return
+
+        # Fill in a stable order so the table doesn't depend on list order
+        backends = sorted((b for b in self.backends if self.weight(b) > 0), key=str)
+        if not backends:
+            return
+        # Each round, a backend gets its weight relative to the heaviest in
+        # turns, and takes one whenever it has a whole one saved up
+        top = max(self.weight(b) for b in backends)
+        shares = [self.weight(b) / top for b in backends]
+        credits = [0.0] * len(backends)
+        offsets = [_hash32(f"{b}/offset") % size for b in backends]
+        skips = [_hash32(f"{b}/skip") % (size - 1) + 1 for b in backends]
+        nexts = [0] * len(backends)
+        table = self.table
+        filled = 0
+        while True:
+            for i, backend in enumerate(backends):
+                credits[i] += shares[i]
+                if credits[i] < 1:
+                    continue
+                credits[i] -= 1
+                c = (offsets[i] + nexts[i] * skips[i]) % size
+                while table[c] is not None:
+                    nexts[i] += 1
+                    c = (offsets[i] + nexts[i] * skips[i]) % size
+                table[c] = backend
+                nexts[i] += 1
+                filled += 1
+                if filled == size:
+                    return
+
+    def select(self, h):
+        return self.table[h % self.table_size]
+
+
+class BoundedLoadSelector(RingSelector):
+    def __init__(self, backends=(), c=1.25, vnodes=100, table_bits=16):
+        self.c = c
+        self.loads = {}
+        self.total = 0
+        super(BoundedLoadSelector, self).__init__(backends, vnodes, table_bits)
+
+    def _build(self):
+        super(BoundedLoadSelector, self)._build()
+        self.loads = {b: self.loads.get(b, 0) for b in self.backends}
+        self.total = sum(self.loads.values())
+        # Each backend's share of the total load
+        weights = {b: max(self.weight(b), 0.0) for b in self.backends}
+        total = sum(weights.values())
+        self._shares = {b: w / total if total else 0.0 for b, w in weights.items()}
+
+    def select(self, h):
+        owners = self._owners
+        count = len(owners)
+        if not count:
+            return None
+        bound = self.c * (self.total + 1)
+        shares = self._shares
+        index = self._start[h & self._mask]
+        for step in range(count):
+            backend = owners[(index + step) % count]
+            if self.loads[backend] < math.ceil(bound * shares[backend]):
+                self.loads[backend] += 1
+                self.total += 1
+                return backend
+        return None
+
+    def assign(self, backend):
+        if backend in self.loads:
+            self.loads[backend] += 1
+            self.total += 1
+
+    def release(self, backend):
+        if self.loads.get(backend, 0) > 0:
+            self.loads[backend] -= 1
+            self.total -= 1
+
+
+class LeastLoadSelector(RingSelector):
+    """
+    Picks the less loaded of two ring candidates
+
+    Each candidate's load is what the switches last reported plus the flows
+    we've sent it since, so a burst of new flows between two polls doesn't
+    all land on the same backend.
+    """
+
+    wants_stats = True
+
+    # 'flows' or 'bytes'
+    metric = 'flows'
+
+    def __init__(self, backends=(), vnodes=100, table_bits=16):
+        self.flows = {}
+        self.rates = {}
+        self.pending = {}
+        super(LeastLoadSelector, self).__init__(backends, vnodes, table_bits)
+
+    def _build(self):
+        super(LeastLoadSelector, self)._build()
+        self.flows = {b: self.flows.get(b, 0) for b in self.backends}
+        self.rates = {b: self.rates.get(b, 0.0) for b in self.backends}
+        self.pending = {b: self.pending.get(b, 0) for b in self.backends}
+        # Loads are compared per unit of weight
+        self._scale = {b: 1 / self.weight(b) for b in self.backends
+                       if self.weight(b) > 0}
+
+    def set_load(self, backend, flows=None, rate=None):
+        """ Record a backend's reported active flows and/or byte rate."""
+        if backend not in self.pending:
+            return
+        if flows is not None:
+            self.flows[backend] = flows
+            self.pending[backend] = 0
+        if rate is not None:
+            self.rates[backend] = rate
+
+    def load(self, backend):
+        flows = self.flows[backend]
+        pending = self.pending[backend]
+        if self.metric == 'flows':
+            return flows + pending
+        # Guess that new flows will be as heavy as this backend's current ones
+        rate = self.rates[backend]
+        if flows:
+            return rate + pending * rate / flows
+        return rate + pending
+
+    def select(self, h):
+        first = self.table[h & self._mask]
+        if first is None:
+            return None
+        second = self.table[(h >> self.table_bits) & self._mask]
+        chosen = first
+        if second != first:
+            if self.weights:
+                scale = self._scale
+                if self.load(second) * scale[second] < self.load(first) * scale[first]:
+                    chosen = second
+            elif self.load(second) < self.load(first):
+                chosen = second
+        self.pending[chosen] += 1
+        return chosen
+
+    def assign(self, backend):
+        if backend in self.pending:
+            self.pending[backend] += 1
+
+    def release(self, backend):
+        if self.pending.get(backend, 0) > 0:
+            self.pending[backend] -= 1
+        elif self.flows.get(backend, 0) > 0:
+            self.flows[backend] -= 1
+
+
+class LeastBytesSelector(LeastLoadSelector):
+    metric = 'bytes'
+
+
+SELECTORS = {
+    'modulo': ModuloSelector,
+    'ring': RingSelector,
+    'maglev': MaglevSelector,
+    'bounded': BoundedLoadSelector,
+    'least_conn': LeastLoadSelector,
+    'least_bytes': LeastBytesSelector,
+}
+
+
+def make_selector(name, backends=(), **kw):
+    """ Create a selector by name (one of SELECTORS)."""
+    try:
+        cls = SELECTORS[name]
+    except KeyError:
+        raise RuntimeError(f"Unknown selector '{name}' (try one of: "
+                           + ", ".join(sorted(SELECTORS)) + ")")
+    return cls(backends, **kw)
@@ -0,0 +1,202 @@
+"""
+Virtual services: which VIPs the load balancer answers for, and where
+their connections go.
+
+A Service is a VIP (with its MAC) and the protocols and ports it listens
+on, in front of a Pool of backends.  A Pool has its own selector and
+hasher, and several services may share one.  ServiceTable finds the
+service for a packet with one dict lookup on (VIP, protocol, port), and
+for a backend's replies on (backend, protocol, port), so it costs the
+same with hundreds of VIPs as with one.
+
+Backends don't translate ports, so a backend can't be behind two VIPs on
+the same protocol and port: its replies would be ambiguous.
+
+A service with dsr set uses direct server return: only the destination MAC
+of packets to the VIP is rewritten, and the backends, which must have the
+VIP on a loopback interface (and not answer ARP for it), reply to clients
+from the VIP themselves.
+"""
+
+import json
+
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ipv4 import ipv4
+
+from lb.selection import make_selector
+from lb.hashing import FlowHasher
+
+PROTOCOLS = {
+    'tcp': ipv4.TCP_PROTOCOL,
+    'udp': ipv4.UDP_PROTOCOL,
+}
+
+
+class Pool(object):
+    """ Backends, and how connections are spread over them."""
+
+    __slots__ = ('name', 'servers', 'macs', 'selector', 'hasher', 'weights')
+
+    def __init__(self, name, servers, selector='modulo', hasher=None, weights=None):
+        """
+        servers is a list of (IPAddr, EthAddr); selector is a Selector or
+        the name of one.  weights are the servers' relative weights, in the
+        same order (all 1 by default).
+        """
+        self.name = name
+        self.servers = list(servers)
+        self.macs = dict(self.servers)
+        self.weights = {}
+        if weights is not None:
+            self.weights = {ip: float(w) for (ip, mac), w in zip(self.servers, weights)}
+        if isinstance(selector, str):
+            selector = make_selector(selector, [ip for ip, mac in self.servers])
+        self.selector = selector
+        selector.set_weights(self.weights)
+        if hasher is None:
+            hasher = FlowHasher('src')
+        self.hasher = hasher
+
+    def __repr__(self):
+        return f"<Pool {self.name} of {len(self.servers)}>"
+
+
+class Service(object):
+    """ A VIP, what it listens on, and the pool behind it."""
+
+    __slots__ = ('vip', 'vmac', 'protocols', 'ports', 'pool', 'dsr')
+
+    def __init__(self, vip, vmac, ports, pool, protocols=None, dsr=False):
+        if protocols is None:
+            protocols = (ipv4.TCP_PROTOCOL, ipv4.UDP_PROTOCOL)
+        self.vip = IPAddr(vip)
+        self.vmac = EthAddr(vmac)
+        self.protocols = tuple(protocols)
+        self.ports = tuple(ports)
+        self.pool = pool
+        self.dsr = dsr
+
+    def __repr__(self):
+        return f"<Service {self.vip} {','.join(str(p) for p in self.ports)}>"
+
+
+class ServiceTable(object):
+    """ The services, indexed for lookups by packet."""
+
+    def __init__(self):
+        # (VIP, protocol, port) -> Service
+        self._front = {}
+
+        # (backend IP, protocol, port) -> Service
+        self._back = {}
+
+        # VIP -> Service
+        self.vips = {}
+
+        # Backend IP -> {Pool: count of services using it}
+        self._pools = {}
+
+        # Backend IP -> MAC, for every backend of every service
+        self.backends = {}
+
+    def __len__(self):
+        return len(self.vips)
+
+    def __iter__(self):
+        return iter(self.vips.values())
+
+    def add(self, service):
+        """ Add a service; its VIP mustn't be in use already."""
+        if service.vip in self.vips:
+            raise RuntimeError(f"VIP {service.vip} is already in use")
+        front = [(service.vip, proto, port)
+                 for proto in service.protocols for port in service.ports]
+        back = [(ip, proto, port) for ip, mac in service.pool.servers
+                for proto in service.protocols for port in service.ports]
+        for key in back:
+            other = self._back.get(key)
+            if other is not None:
+                raise RuntimeError(f"Backend {key[0]} port {key[2]} is already "
+                                   f"behind VIP {other.vip}")
+        self.vips[service.vip] = service
+        for key in front:
+            self._front[key] = service
+        for key in back:
+            self._back[key] = service
+        for ip, mac in service.pool.servers:
+            pools = self._pools.setdefault(ip, {})
+            pools[service.pool] = pools.get(service.pool, 0) + 1
+            self.backends[ip] = mac
+
+    def remove(self, vip):
+        """ Remove the service on a VIP; returns it, or None."""
+        service = self.vips.pop(IPAddr(vip), None)
+        if service is None:
+            return None
+        for proto in service.protocols:
+            for port in service.ports:
+                del self._front[(service.vip, proto, port)]
+                for ip, mac in service.pool.servers:
+                    del self._back[(ip, proto, port)]
+        for ip, mac in service.pool.servers:
+            pools = self._pools[ip]
+            pools[service.pool] -= 1
+            if not pools[service.pool]:
+                del pools[service.pool]
+            if not pools:
+                del self._pools[ip]
+                del self.backends[ip]
+        return service
+
+    def lookup(self, vip, protocol, port):
+        """ The service a packet to vip is for, or None."""
+        return self._front.get((vip, protocol, port))
+
+    def from_backend(self, server, protocol, port):
+        """ The service a packet from a backend is a reply for, or None."""
+        return self._back.get((server, protocol, port))
+
+    def pools_of(self, server):
+        """ The pools a backend is in."""
+        return self._pools.get(server, {}).keys()
+
+    def probe_port(self, server):
+        """ A TCP port a backend serves on (the first service's), or None."""
+        for service in self.vips.values():
+            if (ipv4.TCP_PROTOCOL in service.protocols
+                    and server in service.pool.macs):
+                return service.ports[0]
+        return None
+
+
+def load_services(filename):
+    """
+    Read services from a JSON file
+
+    It looks like:
+      {"pools": {"web": {"servers": [["10.0.0.1", "00:00:00:00:00:01"]],
+                         "selector": "ring", "hash_fields": "src",
+                         "weights": [1]}},
+       "services": [{"vip": "10.0.1.1", "vmac": "00:00:00:00:01:01",
+                     "ports": [80, 443], "protocols": ["tcp"],
+                     "pool": "web", "dsr": false}]}
+
+    selector, hash_fields, weights, protocols and dsr are optional.
+    """
+    with open(filename) as f:
+        config = json.load(f)
+    pools = {}
+    for name, p in config.get('pools', {}).items():
+        servers = [(IPAddr(ip), EthAddr(mac)) for ip, mac in p['servers']]
+        pools[name] = Pool(name, servers, p.get('selector', 'modulo'),
+                           FlowHasher(p.get('hash_fields', 'src')), p.get('weights'))
+    services = []
+    for s in config.get('services', []):
+        if s['pool'] not in pools:
+            raise RuntimeError(f"VIP {s['vip']} uses unknown pool '{s['pool']}'")
+        protocols = None
+        if 'protocols' in s:
+            protocols = [PROTOCOLS[p] for p in s['protocols']]
+        services.append(Service(s['vip'], s['vmac'], s['ports'], pools[s['pool']],
+                                protocols, bool(s.get('dsr', False))))
+    return services
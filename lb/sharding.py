@@ -0,0 +1,291 @@
+"""
+Several controller processes sharing the OpenFlow port, and some state.
+
+start_workers(n) starts n - 1 more copies of POX with the same command
+line, and has every copy's OpenFlow listener set SO_REUSEPORT, so they
+all listen on the same port and the kernel spreads the switches'
+connections over them.  Each copy handles the switches it was given; a
+balancer which needs nothing from the others for a PacketIn, like
+hash_lb, then handles them on as many cores as there are copies.
+
+What does need sharing goes in their SharedState, a table every copy
+has: set() a key in any of them and each has the value in .state and
+raises StateChanged.  The first copy keeps the table; the others connect
+to it over a Unix socket, and it sends them what's in it and passes on
+what each of them sets, as a JSON object a line; when two set a key at
+once, all end up with whichever the first copy got last.  Which copy each switch
+is connected to is kept there too (see owner()).  Setting a key to None
+removes it.
+
+When the first copy goes down, the others quit.  When one of the others
+goes, its switches reconnect and the kernel gives them to the rest.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+from pox.core import core
+from pox.lib.recoco import Task, Select
+from pox.lib.revent import Event, EventMixin
+from pox.lib.util import dpid_to_str
+from pox.openflow.of_01 import OpenFlow_01_Task
+
+log = core.getLogger()
+
+# Where which copy a switch is connected to is kept
+SWITCH_PREFIX = "switch/"
+
+
+def switch_key(dpid):
+    return SWITCH_PREFIX + dpid_to_str(dpid)
+
+
+class StateChanged(Event):
+    """ A key was set (value is None if it was removed)."""
+
+    def __init__(self, key, value, worker):
+        self.key = key
+        self.value = value
+        self.worker = worker
+
+
+class _Channel(object):
+    """ A connection between two copies, carrying JSON lines."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.worker = None
+        self._partial = b''
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, msg):
+        try:
+            self.sock.sendall(json.dumps(msg).encode() + b"\n")
+        except OSError:
+            # Reading will find it closed
+            pass
+
+    def receive(self):
+        """ The messages that have come in, or None if the other end is gone."""
+        try:
+            data = self.sock.recv(1 << 16)
+        except OSError:
+            data = b''
+        if not data:
+            return None
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return [json.loads(line) for line in lines if line]
+
+    def close(self):
+        self.sock.close()
+
+
+class _ChannelTask(Task):
+    """ Serves a SharedState's channels."""
+
+    def __init__(self, shared):
+        Task.__init__(self)
+        self.shared = shared
+
+    def run(self):
+        shared = self.shared
+        while core.running and not shared.closed:
+            rlist, _, _ = yield Select(shared._sockets(), [], [], 5)
+            for s in rlist:
+                if s is shared._listener:
+                    shared._accept()
+                else:
+                    shared._read(s)
+
+
+class SharedState(EventMixin):
+    """ A table of JSON values every copy of the controller has."""
+
+    _eventMixin_events = set([StateChanged])
+
+    def __init__(self, worker=0, workers=1, listener=None, hub=None,
+                 start=True):
+        """
+        The first copy (worker 0) gives the Unix socket the others connect
+        to as listener, and the others their connection to it as hub.
+        """
+        self.worker = worker
+        self.workers = workers
+        self.state = {}
+        self.closed = False
+        self._listener = listener
+        self._hub = None if hub is None else _Channel(hub)
+        self._peers = []
+        if self._hub is not None:
+            self._hub.send({'worker': worker})
+        if start:
+            core.listen_to_dependencies(self, ['openflow'])
+            _ChannelTask(self).start()
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def set(self, key, value):
+        """ Set key to value in every copy (None removes it)."""
+        self._apply(key, value, self.worker)
+        self._forward({'key': key, 'value': value, 'from': self.worker})
+
+    def delete(self, key):
+        self.set(key, None)
+
+    def owner(self, dpid):
+        """ The copy the switch is connected to, or None."""
+        return self.state.get(switch_key(dpid))
+
+    def close(self):
+        self.closed = True
+        for channel in self._peers + [self._hub]:
+            if channel is not None:
+                channel.close()
+        if self._listener is not None:
+            _remove_socket(self._listener)
+            self._listener = None
+
+    def _handle_openflow_ConnectionUp(self, event):
+        self.set(switch_key(event.dpid), self.worker)
+
+    def _handle_openflow_ConnectionDown(self, event):
+        key = switch_key(event.dpid)
+        # It may have reconnected to another copy already
+        if self.state.get(key) == self.worker:
+            self.delete(key)
+
+    def _apply(self, key, value, worker):
+        if value is None:
+            if key not in self.state:
+                return
+            del self.state[key]
+        else:
+            if key in self.state and self.state[key] == value:
+                return
+            self.state[key] = value
+        self.raiseEventNoErrors(StateChanged, key, value, worker)
+
+    def _forward(self, msg):
+        """ Send a change on: to the hub if we have one, or to every peer."""
+        if self._hub is not None:
+            self._hub.send(msg)
+            return
+        # Including the one it came from, so that if two copies set a key
+        # at once, they both end up with the value the hub got last
+        for peer in self._peers:
+            peer.send(msg)
+
+    def _sockets(self):
+        sockets = list(self._peers)
+        if self._listener is not None:
+            sockets.append(self._listener)
+        if self._hub is not None:
+            sockets.append(self._hub)
+        return sockets
+
+    def _accept(self):
+        sock = self._listener.accept()[0]
+        self._peers.append(_Channel(sock))
+        if len(self._peers) == self.workers - 1:
+            # Everyone's here, so the socket can go (rather than be left
+            # behind if we're killed)
+            _remove_socket(self._listener)
+            self._listener = None
+
+    def _read(self, channel):
+        msgs = channel.receive()
+        if msgs is None:
+            self._closed(channel)
+            return
+        for msg in msgs:
+            self._received(channel, msg)
+
+    def _received(self, channel, msg):
+        if 'worker' in msg:
+            # A new copy; tell it what it's missed
+            channel.worker = msg['worker']
+            for key, value in list(self.state.items()):
+                channel.send({'key': key, 'value': value, 'from': self.worker})
+            return
+        self._apply(msg['key'], msg['value'], msg['from'])
+        if self._hub is None:
+            self._forward(msg)
+
+    def _closed(self, channel):
+        channel.close()
+        if channel is self._hub:
+            log.error("Lost the first controller process; quitting")
+            self.closed = True
+            core.quit()
+            return
+        self._peers.remove(channel)
+        log.warning("Controller process %s has gone", channel.worker)
+        # Its switches will connect to the rest of us
+        for key, value in list(self.state.items()):
+            if key.startswith(SWITCH_PREFIX) and value == channel.worker:
+                self.delete(key)
+
+
+def _remove_socket(listener):
+    """ Close a Unix socket listener made by start_workers, and remove it."""
+    path = listener.getsockname()
+    listener.close()
+    try:
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def start_workers(workers, component):
+    """
+    Start workers - 1 more copies of POX and share the OpenFlow port
+
+    component is the name of the component calling this, as it is on the
+    command line; the copies get --worker and --state options after it,
+    and call join() with them.  Returns this copy's SharedState.
+    """
+    OpenFlow_01_Task.REUSE_PORT = True
+
+    path = os.path.join(tempfile.mkdtemp(prefix="pox-"), "state")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(workers)
+
+    argv = list(sys.argv)
+    at = [i for i, arg in enumerate(argv)
+          if i > 0 and arg.split(':')[0] == component][0]
+    children = []
+    for worker in range(1, workers):
+        options = ["--worker=%i" % worker, "--state=%s" % path]
+        children.append(subprocess.Popen([sys.executable] + argv[:at + 1] +
+                                         options + argv[at + 1:]))
+    log.info("Started %i more controller processes", workers - 1)
+
+    shared = SharedState(0, workers, listener=listener)
+
+    def stop(event):
+        shared.close()
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.wait()
+    core.addListenerByName("GoingDownEvent", stop)
+    return shared
+
+
+def join(worker, workers, path):
+    """ Join the first copy's SharedState, at path (in a copy it started)."""
+    OpenFlow_01_Task.REUSE_PORT = True
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    return SharedState(worker, workers, hub=sock)
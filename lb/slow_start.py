@@ -0,0 +1,69 @@
+"""
+Slow start for backends coming back into service.
+
+A backend that has just come up (or back up) has cold caches and maybe a
+backlog, so SlowStart ramps its weight from a small fraction up to its
+full weight over duration seconds.  The ramp goes in steps, and apply()
+is only called when the factor moves to the next one, so the selectors'
+tables are rebuilt steps times per ramp rather than on every tick.
+"""
+
+import time
+
+from pox.lib.recoco import Timer
+
+
+class SlowStart(object):
+    """ Ramps backends' weight factors from 1/steps up to 1."""
+
+    def __init__(self, apply, duration=30, steps=10, start=True):
+        """
+        apply(backend, factor) is called whenever a backend's factor changes.
+        """
+        self.apply = apply
+        self.duration = duration
+        self.steps = steps
+
+        # Backend -> (when it started, current factor)
+        self._ramping = {}
+
+        self._timer = None
+        if start:
+            self._timer = Timer(duration / steps, self.tick, recurring=True)
+
+    def __contains__(self, backend):
+        return backend in self._ramping
+
+    def factor(self, backend):
+        entry = self._ramping.get(backend)
+        return 1.0 if entry is None else entry[1]
+
+    def begin(self, backend, now=None):
+        """ Start ramping a backend up."""
+        if now is None:
+            now = time.time()
+        factor = 1.0 / self.steps
+        self._ramping[backend] = (now, factor)
+        self.apply(backend, factor)
+
+    def cancel(self, backend):
+        """ Stop ramping a backend (say it went down again)."""
+        self._ramping.pop(backend, None)
+
+    def stop(self):
+        if self._timer:
+            self._timer.cancel()
+
+    def tick(self, now=None):
+        if now is None:
+            now = time.time()
+        for backend, (started, factor) in list(self._ramping.items()):
+            step = int((now - started) / self.duration * self.steps) + 1
+            new = min(step, self.steps) / self.steps
+            if new == factor:
+                continue
+            if new >= 1:
+                del self._ramping[backend]
+            else:
+                self._ramping[backend] = (started, new)
+            self.apply(backend, new)
@@ -0,0 +1,180 @@
+"""
+Switch statistics for the load balancer.
+
+StatsPoller asks switches for statistics on a fixed interval.  It keeps the
+switches in a heap ordered by when they're next due and, on every tick,
+sends at most max_rate * tick requests, so a few hundred switches don't all
+get polled (and all answer) at once.  A switch's first poll is at a random
+point in its interval, which spreads them out from the start, and all the
+requests for one switch go out in a single write.  With jitter, every
+interval is also stretched or shrunk by up to that fraction of itself, so
+switches which happen to line up don't stay lined up.
+
+RateWindow keeps the last few samples of a byte counter in two fixed-size
+arrays and turns them into a rate.  BackendLoad holds one of those and an
+active flow count for every backend.  serve_json() puts a report on the web
+server.
+"""
+
+import heapq
+import json
+import random
+import time
+from array import array
+
+from pox.core import core
+from pox.lib.recoco import Timer
+
+log = core.getLogger()
+
+
+def serve_json(path, report, name):
+    """ Serve report() as JSON at path once there's a web server."""
+    def handle(request):
+        return ('application/json', json.dumps(report()).encode())
+
+    def start():
+        from pox.web.webcore import InternalContentHandler
+        core.WebServer.set_handler(path, InternalContentHandler, {None: handle})
+        log.info(f"{name} at {path}")
+    core.call_when_ready(start, 'WebServer')
+
+
+class StatsPoller(object):
+    """ Sends make_requests(dpid) to every added switch once per interval."""
+
+    def __init__(self, make_requests, interval=5, max_rate=100, tick=0.5, jitter=0):
+        self.make_requests = make_requests
+        self.interval = interval
+        self.tick = tick
+        self.max_rate = max_rate
+        self.jitter = jitter
+
+        # Heap of (due time, dpid), and dpid -> when it's due; heap entries
+        # which don't match that (the switch was removed, and maybe added
+        # again since) are skipped
+        self._due = []
+        self._switches = {}
+
+        # Unspent requests carry over to the next tick, up to one tick's worth
+        self._budget = 0.0
+        self._timer = Timer(tick, self._poll, recurring=True)
+
+    def add_switch(self, dpid):
+        if dpid in self._switches:
+            return
+        due = time.time() + random.uniform(0, self.interval)
+        self._switches[dpid] = due
+        heapq.heappush(self._due, (due, dpid))
+
+    def remove_switch(self, dpid):
+        self._switches.pop(dpid, None)
+
+    def stop(self):
+        self._timer.cancel()
+
+    def _poll(self, now=None):
+        if now is None:
+            now = time.time()
+        per_tick = self.max_rate * self.tick
+        self._budget = min(self._budget + per_tick, max(per_tick, 1))
+        due = self._due
+        sent = 0
+        while due and due[0][0] <= now and self._budget >= 1:
+            when, dpid = heapq.heappop(due)
+            if self._switches.get(dpid) != when:
+                continue
+            when = now + self._next_interval()
+            self._switches[dpid] = when
+            heapq.heappush(due, (when, dpid))
+            connection = core.openflow.getConnection(dpid)
+            if connection is None:
+                continue
+            requests = self.make_requests(dpid)
+            if not requests:
+                continue
+            connection.send(b''.join(r.pack() for r in requests))
+            self._budget -= len(requests)
+            sent += len(requests)
+        if due and due[0][0] <= now:
+            log.debug(f"Stats polling is behind; {sent} requests this tick")
+        return sent
+
+    def _next_interval(self):
+        if not self.jitter:
+            return self.interval
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class RateWindow(object):
+    """ The last size samples of a counter, and its rate over them."""
+
+    __slots__ = ('times', 'values', 'size', 'count', 'next')
+
+    def __init__(self, size=8):
+        self.times = array('d', [0.0]) * size
+        self.values = array('d', [0.0]) * size
+        self.size = size
+        self.count = 0
+        self.next = 0
+
+    def add(self, when, value):
+        if self.count:
+            last = (self.next - 1) % self.size
+            if when <= self.times[last]:
+                return
+            if value < self.values[last]:
+                # The counter was reset (the switch reconnected, say)
+                self.count = 0
+        self.times[self.next] = when
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def rate(self):
+        """ Average increase per second over the window (0 if unknown)."""
+        if self.count < 2:
+            return 0.0
+        newest = (self.next - 1) % self.size
+        oldest = (self.next - self.count) % self.size
+        elapsed = self.times[newest] - self.times[oldest]
+        return (self.values[newest] - self.values[oldest]) / elapsed
+
+
+class BackendLoad(object):
+    """ Byte rate and active flow count for each backend."""
+
+    def __init__(self, window=8):
+        self.window = window
+
+        # backend -> RateWindow of its port's byte counter
+        self.bytes = {}
+
+        # dpid -> {backend: flows}, as last reported by each switch
+        self._flows_by_switch = {}
+
+        # backend -> flows, summed over the switches
+        self.flows = {}
+
+    def port_sample(self, backend, when, byte_count):
+        window = self.bytes.get(backend)
+        if window is None:
+            window = self.bytes[backend] = RateWindow(self.window)
+        window.add(when, byte_count)
+
+    def flow_sample(self, dpid, counts):
+        """ A switch reported its flow counts ({backend: flows})."""
+        old = self._flows_by_switch.get(dpid, {})
+        self._flows_by_switch[dpid] = counts
+        for backend in set(old) | set(counts):
+            total = self.flows.get(backend, 0) - old.get(backend, 0) + counts.get(backend, 0)
+            self.flows[backend] = total
+
+    def forget_switch(self, dpid):
+        self.flow_sample(dpid, {})
+        del self._flows_by_switch[dpid]
+
+    def rate(self, backend):
+        window = self.bytes.get(backend)
+        return window.rate() if window is not None else 0.0
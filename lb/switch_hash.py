@@ -0,0 +1,108 @@
+"""
+Balancing in the switches themselves, with Nicira extensions.
+
+Every edge switch gets one rule per protocol for the VIP, which hashes the
+connection with the multipath action into one of 2**slot_bits slots (kept
+in NXM_NX_REG0) and resubmits to HASH_TABLE.  There, one rule per slot
+rewrites the packet to that slot's server and sends it on its way.  The
+controller never sees new connections; it only rewrites the slot rules of
+servers which come or go, so the other servers' connections stay put.
+
+Slots are shared out like ProactiveRules' buckets, and the rules towards
+the servers are the same destination-based tree, so this is ProactiveRules
+with different edge rules.  It needs Open vSwitch (or something else which
+speaks the Nicira multipath, resubmit and flow_mod table id extensions).
+
+bundle_load would seem a natural fit, but Open vSwitch only lets it pick
+among ports which are up on the switch itself, and servers behind a shared
+uplink aren't distinguishable that way.
+"""
+
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.nicira as nx
+from pox.core import core
+from pox.lib.packet.ethernet import ethernet
+
+from lb.proactive import ProactiveRules, PROACTIVE_PRIORITY
+
+log = core.getLogger()
+
+HASH_TABLE = 1
+
+HASH_FIELDS = {
+    'eth_src': nx.nx_hash_fields.NX_HASH_FIELDS_ETH_SRC,
+    'symmetric_l4': nx.nx_hash_fields.NX_HASH_FIELDS_SYMMETRIC_L4,
+}
+
+
+class SwitchHashRules(ProactiveRules):
+    """ Keeps the switch-side hashing rules for one VIP in sync."""
+
+    def __init__(self, vip, port, protocols, servers, slot_bits=6, weights=None,
+                 fields='symmetric_l4', basis=0):
+        if fields not in HASH_FIELDS:
+            raise RuntimeError(f"Unknown switch hash fields '{fields}' (try one of: "
+                               + ", ".join(sorted(HASH_FIELDS)) + ")")
+        self.fields = HASH_FIELDS[fields]
+        self.basis = basis
+        super(SwitchHashRules, self).__init__(vip, port, protocols, servers,
+                                              None, slot_bits, weights)
+
+        # Switches we've turned the flow_mod table id extension on for
+        self._table_ids = set()
+
+    def _make_buckets(self, client_net, slot_bits):
+        # Slots, rather than address prefixes
+        return list(range(1 << slot_bits))
+
+    def forget_switch(self, dpid):
+        super(SwitchHashRules, self).forget_switch(dpid)
+        self._table_ids.discard(dpid)
+
+    def _edge_rules(self, wanted, edge_switches, first_hops):
+        for edge in edge_switches:
+            slots = 0
+            for slot, index in enumerate(self.assignment):
+                if index is None or edge not in first_hops[index]:
+                    continue
+                wanted[(edge, ('slot', slot))] = (index, first_hops[index][edge])
+                slots += 1
+            # Only hash once the slots are there to catch it
+            if slots:
+                for proto in self.protocols:
+                    wanted[(edge, ('hash', proto))] = len(self.buckets)
+
+    def _send(self, key, value, command):
+        dpid, rule = key
+        if rule[0] == 'server':
+            return super(SwitchHashRules, self)._send(key, value, command)
+
+        connection = core.openflow.getConnection(dpid)
+        if connection is None:
+            return False
+        if dpid not in self._table_ids:
+            connection.send(nx.nx_flow_mod_table_id())
+            self._table_ids.add(dpid)
+
+        if rule[0] == 'slot':
+            msg = nx.nx_flow_mod(command=command, priority=PROACTIVE_PRIORITY,
+                                 table_id=HASH_TABLE)
+            msg.match.nx_reg0 = rule[1]
+            if value is not None:
+                ip, mac = self.servers[value[0]]
+                msg.actions.append(of.ofp_action_nw_addr.set_dst(ip))
+                msg.actions.append(of.ofp_action_dl_addr.set_dst(mac))
+                msg.actions.append(of.ofp_action_output(port=value[1]))
+        else:
+            msg = of.ofp_flow_mod(command=command, priority=PROACTIVE_PRIORITY)
+            msg.match.dl_type = ethernet.IP_TYPE
+            msg.match.nw_proto = rule[1]
+            msg.match.nw_dst = self.vip
+            msg.match.tp_dst = self.port
+            if value is not None:
+                msg.actions.append(nx.nx_action_multipath(
+                    fields=self.fields, basis=self.basis, max_link=value - 1,
+                    dst=nx.NXM_NX_REG0))
+                msg.actions.append(nx.nx_action_resubmit.resubmit_table(table=HASH_TABLE))
+        connection.send(msg)
+        return True
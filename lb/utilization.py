@@ -0,0 +1,247 @@
+"""
+Link utilization, from the switches' port statistics.
+
+openflow.discovery knows which links there are but not how busy they are.
+LinkMonitor polls every switch for OFPST_PORT statistics (through a
+StatsPoller, with jitter) and turns each port's counters into tx and rx
+byte and packet rates.  Each port keeps its last few rates in a
+PortSeries, a ring of fixed-size arrays, so keeping an hour of history for
+a big fabric costs a few arrays per port rather than a dict per sample.
+
+A link's utilization is the tx byte rate of the port it leaves by over the
+port's speed, from the switch's features (or default_speed if it doesn't
+say).  After each reply LinkMonitor raises LinkUtilization with the new
+figures for the links out of that switch, and link_utilization() has the
+latest for all of them, so path selection can read them with a dict
+lookup.  serve() puts them on the web server as JSON, with percentiles.
+"""
+
+import time
+from array import array
+
+import pox.openflow.libopenflow_01 as of
+from pox.core import core
+from pox.lib.revent import Event, EventMixin
+
+from lb.stats import StatsPoller, serve_json
+
+log = core.getLogger()
+
+# Port feature bits -> speed in bits a second, fastest first
+_SPEEDS = [
+    (of.OFPPF_10GB_FD, 10 ** 10),
+    (of.OFPPF_1GB_FD | of.OFPPF_1GB_HD, 10 ** 9),
+    (of.OFPPF_100MB_FD | of.OFPPF_100MB_HD, 10 ** 8),
+    (of.OFPPF_10MB_FD | of.OFPPF_10MB_HD, 10 ** 7),
+]
+
+
+def port_speed(features):
+    """ The speed a port's current features bits say, or None."""
+    for bits, speed in _SPEEDS:
+        if features & bits:
+            return speed
+    return None
+
+
+class PortSeries(object):
+    """ A port's last size tx/rx byte and packet rates, per second."""
+
+    __slots__ = ('size', 'count', 'next', 'times', 'tx_bytes', 'rx_bytes',
+                 'tx_packets', 'rx_packets', '_last')
+
+    FIELDS = ('tx_bytes', 'rx_bytes', 'tx_packets', 'rx_packets')
+
+    def __init__(self, size=60):
+        self.size = size
+        self.count = 0
+        self.next = 0
+        self.times = array('d', [0.0]) * size
+        self.tx_bytes = array('d', [0.0]) * size
+        self.rx_bytes = array('d', [0.0]) * size
+        self.tx_packets = array('d', [0.0]) * size
+        self.rx_packets = array('d', [0.0]) * size
+
+        # (time, tx bytes, rx bytes, tx packets, rx packets) of the last sample
+        self._last = None
+
+    def add(self, when, tx_bytes, rx_bytes, tx_packets, rx_packets):
+        """ Add a sample of the counters; returns True if it gave a rate."""
+        last = self._last
+        counters = (when, tx_bytes, rx_bytes, tx_packets, rx_packets)
+        if last is not None and when <= last[0]:
+            return False
+        self._last = counters
+        if last is None:
+            return False
+        if any(new < old for new, old in zip(counters[1:], last[1:])):
+            # The counters were reset (the switch reconnected, say)
+            return False
+        elapsed = when - last[0]
+        i = self.next
+        self.times[i] = when
+        self.tx_bytes[i] = (tx_bytes - last[1]) / elapsed
+        self.rx_bytes[i] = (rx_bytes - last[2]) / elapsed
+        self.tx_packets[i] = (tx_packets - last[3]) / elapsed
+        self.rx_packets[i] = (rx_packets - last[4]) / elapsed
+        self.next = (i + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        return True
+
+    def current(self, field='tx_bytes'):
+        """ The latest rate of a field (0 if there isn't one yet)."""
+        if not self.count:
+            return 0.0
+        return getattr(self, field)[(self.next - 1) % self.size]
+
+    def percentile(self, field='tx_bytes', p=95):
+        """ The nearest-rank p-th percentile of a field's rates."""
+        if not self.count:
+            return 0.0
+        values = sorted(getattr(self, field)[:self.count])
+        rank = max(0, -(-len(values) * p // 100) - 1)
+        return values[int(rank)]
+
+
+class LinkUtilization(Event):
+    """
+    New rates for the ports of a switch
+
+    ports is {port: PortSeries} of the ports which got a rate, and links is
+    {(dpid, neighbour dpid): utilization} for the links out of them.
+    """
+
+    def __init__(self, dpid, ports, links):
+        self.dpid = dpid
+        self.ports = ports
+        self.links = links
+
+
+class LinkMonitor(EventMixin):
+    """ Polls every switch's port statistics and tracks link utilization."""
+
+    _eventMixin_events = set([LinkUtilization])
+
+    def __init__(self, interval=5, max_rate=100, size=60, jitter=0.1,
+                 default_speed=10 ** 9, start=True):
+        """
+        Every switch is polled about every interval seconds, and the last
+        size rates of each port are kept.
+        """
+        self.default_speed = default_speed
+        self.size = size
+
+        # (dpid, port) -> PortSeries
+        self.series = {}
+
+        # (dpid, port) -> speed in bits a second, from the switch's features
+        self.speeds = {}
+
+        # (dpid, port) -> neighbour dpid, and (dpid, neighbour dpid) ->
+        # port, for the links discovery knows of
+        self._neighbours = {}
+        self._ports = {}
+
+        # (dpid, neighbour dpid) -> its latest utilization
+        self._utilization = {}
+
+        self.poller = None
+        if start:
+            self.poller = StatsPoller(self._requests, interval, max_rate, jitter=jitter)
+            core.listen_to_dependencies(self, ['openflow', 'openflow_discovery'])
+
+    @staticmethod
+    def _requests(dpid):
+        return [of.ofp_stats_request(body=of.ofp_port_stats_request())]
+
+    def stop(self):
+        if self.poller:
+            self.poller.stop()
+
+    def _handle_openflow_ConnectionUp(self, event):
+        for port in event.ofp.ports:
+            speed = port_speed(port.curr)
+            if speed is not None:
+                self.speeds[(event.dpid, port.port_no)] = speed
+        if self.poller:
+            self.poller.add_switch(event.dpid)
+
+    def _handle_openflow_ConnectionDown(self, event):
+        dpid = event.dpid
+        if self.poller:
+            self.poller.remove_switch(dpid)
+        for key in [k for k in self.series if k[0] == dpid]:
+            del self.series[key]
+        for key in [k for k in self.speeds if k[0] == dpid]:
+            del self.speeds[key]
+
+    def _handle_openflow_discovery_LinkEvent(self, event):
+        link = event.link
+        pair = (link.dpid1, link.dpid2)
+        if event.added:
+            self._neighbours[(link.dpid1, link.port1)] = link.dpid2
+            self._ports[pair] = link.port1
+        elif self._ports.get(pair) == link.port1:
+            del self._neighbours[(link.dpid1, link.port1)]
+            del self._ports[pair]
+            self._utilization.pop(pair, None)
+
+    def _handle_openflow_PortStatsReceived(self, event):
+        self.port_sample(event.dpid, event.stats)
+
+    def port_sample(self, dpid, stats, now=None):
+        """ Take in one switch's ofp_port_stats, and raise LinkUtilization."""
+        if now is None:
+            now = time.time()
+        ports = {}
+        links = {}
+        for s in stats:
+            key = (dpid, s.port_no)
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = PortSeries(self.size)
+            if not series.add(now, s.tx_bytes, s.rx_bytes, s.tx_packets, s.rx_packets):
+                continue
+            ports[s.port_no] = series
+            neighbour = self._neighbours.get(key)
+            if neighbour is not None:
+                links[(dpid, neighbour)] = self._utilization[(dpid, neighbour)] = \
+                    series.current() * 8 / self.speed(dpid, s.port_no)
+        if ports:
+            self.raiseEvent(LinkUtilization, dpid, ports, links)
+
+    def speed(self, dpid, port):
+        return self.speeds.get((dpid, port), self.default_speed)
+
+    def utilization(self, dpid1, dpid2):
+        """ The latest utilization of the link from dpid1 to dpid2 (0 if unknown)."""
+        return self._utilization.get((dpid1, dpid2), 0.0)
+
+    def link_utilization(self):
+        """ {(dpid, neighbour dpid): latest utilization}; don't change it."""
+        return self._utilization
+
+    def report(self, percentiles=(50, 95, 99)):
+        """ Every link's current and percentile utilization, for JSON."""
+        links = []
+        for (dpid1, dpid2), port in sorted(self._ports.items()):
+            series = self.series.get((dpid1, port))
+            if series is None:
+                continue
+            scale = 8.0 / self.speed(dpid1, port)
+            entry = {
+                'src': dpid1, 'dst': dpid2, 'port': port,
+                'speed': self.speed(dpid1, port),
+                'utilization': series.current() * scale,
+            }
+            for field in PortSeries.FIELDS:
+                entry[field] = series.current(field)
+            for p in percentiles:
+                entry['p%i' % p] = series.percentile('tx_bytes', p) * scale
+            links.append(entry)
+        return {'links': links}
+
+    def serve(self, path='/lb/links'):
+        """ Serve report() as JSON at path once there's a web server."""
+        serve_json(path, self.report, "Link utilization")
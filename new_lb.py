@@ -1,23 +1,37 @@
+import time
+
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 from pox.lib.packet.ipv4 import ipv4
 from pox.lib.packet.ethernet import ethernet
-from pox.lib.packet.arp import arp
-from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.addresses import IPAddr, EthAddr, parse_cidr
 from pox.lib.packet import tcp, udp
+from pox.lib.revent import EventHalt
+from pox.lib.recoco import Timer
+from pox.lib.util import str_to_bool
 
-import hashlib
+from lb.paths import PathTable, LeastUtilizedPaths, cook
+from lb.proactive import ProactiveRules, PROACTIVE_PRIORITY
+from lb.switch_hash import SwitchHashRules
+from lb.selection import make_selector
+from lb.hashing import FlowHasher
+from lb.stats import StatsPoller, BackendLoad
+from lb.affinity import AffinityTable, pack_key
+from lb.health import HealthChecker
+from lb.install import PathInstaller
+from lb.service import Pool, Service, ServiceTable, load_services
+from lb.arp import ArpResponder, punt_rule
+from lb.slow_start import SlowStart
+from lb.utilization import LinkMonitor
+from lb.elephants import (ElephantDetector, ELEPHANT_PRIORITY, least_loaded_path,
+                          path_links)
+from lb.fairness import FairnessStats
 
 log = core.getLogger()
 
 VMAC = EthAddr("00:00:00:00:00:09")
 VIP = IPAddr('10.0.0.9')
 
-H5 = IPAddr('10.0.0.5')
-H6 = IPAddr('10.0.0.6')
-H7 = IPAddr('10.0.0.7')
-H8 = IPAddr('10.0.0.8')
-
 S1 = IPAddr('10.0.0.1')
 S2 = IPAddr('10.0.0.2')
 S3 = IPAddr('10.0.0.3')
@@ -30,22 +44,647 @@ S3MAC = EthAddr("00:00:00:00:00:03")
 S4MAC = EthAddr("00:00:00:00:00:04")
 SERVER_MACS = [S1MAC, S2MAC, S3MAC, S4MAC]
 
+# iperf's default port
+SERVICE_PORT = 5001
+
+# Reactively installed flows go away after this long without traffic
+FLOW_IDLE_TIMEOUT = 10
+
+# The shared server-to-client rewrite rules last longer
+RETURN_IDLE_TIMEOUT = 60
+
+# Health probes come from here in DSR mode, as the servers have the VIP
+PROBE_IP = IPAddr('10.0.0.254')
+PROBE_MAC = EthAddr("00:00:00:00:00:fe")
+
 class LoadBalancer(object):
-    def __init__(self):
-        core.openflow.addListeners(self)
+    def __init__(self, k_paths=1, proactive=None, selector=None, hasher=None,
+                 stats_interval=5, stats_rate=100, affinity=None, services=None,
+                 arp_rules=False, dsr=False, weights=None):
+        """
+        services is a list of Services; by default there's one, for VIP
+        and SERVICE_PORT in front of the SERVER_IPS, whose selector and
+        hasher are selector and hasher, whose weights (in SERVER_IPS order)
+        are weights, and which uses direct server return if dsr is set.
+
+        With arp_rules, every switch is told to send ARP requests for the
+        VIPs to us.
+        """
         self.mac_to_port = {}
 
-    def _hash(self, src_ip, dst_ip):
-        """ Hash function to determine server based on source and destination IPs."""
-        combined = str(src_ip) + str(dst_ip)
-        return int(hashlib.md5(combined.encode()).hexdigest(), 16) % len(SERVER_IPS)
+        if services is None:
+            if selector is None:
+                selector = make_selector('modulo', SERVER_IPS)
+            pool = Pool('default', zip(SERVER_IPS, SERVER_MACS), selector, hasher,
+                        weights)
+            services = [Service(VIP, VMAC, [SERVICE_PORT], pool, dsr=dsr)]
+
+        # The VIPs we balance, and the pools behind them
+        self.services = ServiceTable()
+
+        # We answer ARP for the VIPs
+        self.arp = ArpResponder()
+        self.arp_rules = arp_rules
+
+        for service in services:
+            self.services.add(service)
+            self.arp.add(service.vip, service.vmac)
+
+        # Backend IP -> MAC, for all of the services
+        self.server_macs = self.services.backends
+
+        # AffinityTable of connections we've already placed, if any
+        self.affinity = affinity
+
+        # ProactiveRules, if we're pre-installing the (default) VIP's rules
+        self.proactive = proactive
+
+        # Switch-level paths, built from openflow.discovery links
+        self.paths = PathTable(k_paths)
+
+        # LeastUtilizedPaths over paths, if a LinkMonitor says how busy
+        # the links are
+        self.path_choice = None
+
+        # MAC -> (dpid, port), from host_tracker
+        self.hosts = {}
+
+        # Client IP -> (dpid, port) where we saw it talk to the VIP
+        self.clients = {}
+
+        # Switches with hosts attached
+        self.edge_switches = set()
+
+        # Server IP -> {connection key: [(dpid, match, priority)]}, the rules
+        # we've installed for each server, so they can go when it does
+        self.server_rules = {}
+
+        # (server IP, client IP, protocol, port) -> (dpid, port) of the
+        # return rewrite rules we've installed
+        self.return_rules = {}
+
+        # Holds first packets back until their paths are in
+        self.installer = PathInstaller()
+
+        # HealthChecker, if we're checking on the servers
+        self.health = None
+
+        # SlowStart, if servers coming back up are eased in
+        self.slow_start = None
+
+        # ElephantDetector, if heavy flows are moved off busy links, with
+        # its own poller for the core switches
+        self.elephants = None
+        self.elephant_poller = None
+
+        # Connection key -> the dpids of the path an elephant was moved to
+        self.elephant_routes = {}
+
+        # FairnessStats, if we're keeping track of how evenly connections
+        # are spread
+        self.fairness = None
+
+        # Server load from the edge switches' statistics, for the selectors
+        # which want it
+        self.load = BackendLoad()
+        self.poller = None
+        self._stats_interval = stats_interval
+        self._stats_rate = stats_rate
+        self._start_poller()
+
+        # Ahead of forwarding components, so VIP ARP requests aren't flooded
+        core.listen_to_dependencies(self, ['openflow', 'openflow_discovery',
+                                           'host_tracker'],
+                                    listen_args={'openflow': {'priority': 1}})
+
+    def _start_poller(self):
+        if self.poller is not None:
+            return
+        if (self.fairness is not None
+                or any(s.pool.selector.wants_stats for s in self.services)):
+            self.poller = StatsPoller(self._stats_requests, self._stats_interval,
+                                      self._stats_rate)
+            for dpid in self.edge_switches:
+                self.poller.add_switch(dpid)
+
+    def add_service(self, service):
+        """ Start balancing a Service's VIP."""
+        self.services.add(service)
+        self.arp.add(service.vip, service.vmac)
+        self._send_punt_rules([service.vip])
+        if self.health is not None:
+            for ip, mac in service.pool.servers:
+                self.health.add_backend(ip, mac)
+            self._update_pools(ip for ip, mac in service.pool.servers)
+        self._start_poller()
+        self._precompute()
+        log.info(f"Balancing {service.vip} over pool {service.pool.name}")
+
+    def remove_service(self, vip):
+        """
+        Stop balancing a VIP
+
+        Connections already set up carry on until their rules idle out.
+        """
+        service = self.services.remove(vip)
+        if service is not None:
+            self.arp.remove(service.vip)
+            self._send_punt_rules([service.vip], of.OFPFC_DELETE_STRICT)
+            log.info(f"No longer balancing {service.vip}")
+        return service
+
+    def _send_punt_rules(self, vips, command=of.OFPFC_ADD, connections=None):
+        """ Have switches send ARP requests for vips to us."""
+        if not self.arp_rules or not vips:
+            return
+        if connections is None:
+            connections = core.openflow.connections
+        data = b''.join(punt_rule(vip, command).pack() for vip in vips)
+        for connection in connections:
+            connection.send(data)
+
+    def _handle_openflow_discovery_LinkEvent(self, event):
+        if event.added:
+            self.paths.add_link(event.link)
+            if self.elephant_poller:
+                for dpid in (event.link.dpid1, event.link.dpid2):
+                    if dpid not in self.edge_switches:
+                        self.elephant_poller.add_switch(dpid)
+        else:
+            self.paths.remove_link(event.link)
+        self._sync_proactive()
+
+    def _handle_openflow_ConnectionUp(self, event):
+        self._send_punt_rules(list(self.services.vips), connections=[event.connection])
+        self._sync_proactive()
+
+    def _handle_openflow_ConnectionDown(self, event):
+        self.paths.remove_switch(event.dpid)
+        self.edge_switches.discard(event.dpid)
+        self.installer.forget_switch(event.dpid)
+        if self.poller:
+            self.poller.remove_switch(event.dpid)
+            self.load.forget_switch(event.dpid)
+        if self.elephant_poller:
+            self.elephant_poller.remove_switch(event.dpid)
+            self.elephants.forget_switch(event.dpid)
+        if self.proactive:
+            self.proactive.forget_switch(event.dpid)
+        self._forget_switch_rules(event.dpid)
+        self._sync_proactive()
+
+    def _handle_host_tracker_HostEvent(self, event):
+        mac = event.entry.macaddr
+        if event.leave:
+            self.hosts.pop(mac, None)
+            self._sync_proactive()
+            return
+        if event.move:
+            self.hosts[mac] = (event.new_dpid, event.new_port)
+        else:
+            self.hosts[mac] = (event.entry.dpid, event.entry.port)
+        self.edge_switches.add(self.hosts[mac][0])
+        if self.poller:
+            self.poller.add_switch(self.hosts[mac][0])
+        if self.elephant_poller:
+            # Only the core switches are watched for elephants
+            self.elephant_poller.remove_switch(self.hosts[mac][0])
+            self.elephants.forget_switch(self.hosts[mac][0])
+
+        self._precompute()
+        self._sync_proactive()
+
+    def _precompute(self):
+        # Warm the cache so the PacketIn path only does lookups
+        backends = set(self.hosts[m][0] for m in self.server_macs.values()
+                       if m in self.hosts)
+        self.paths.precompute(self.edge_switches, backends)
+
+    def _sync_proactive(self):
+        if self.proactive:
+            locations = {mac: self.hosts[mac] for ip, mac in self.server_macs.items()
+                         if mac in self.hosts and self._is_up(ip)}
+            self.proactive.sync(self.paths, self.edge_switches, locations)
+
+    def _is_up(self, server):
+        return self.health is None or self.health.is_up(server)
+
+    def set_health(self, health):
+        """ Start taking servers in and out of service as health says."""
+        self.health = health
+        health.addListeners(self)
+
+    def set_slow_start(self, duration, steps=10):
+        """ Ramp servers coming back up to full weight over duration."""
+        self.slow_start = SlowStart(lambda server, factor: self._apply_weights([server]),
+                                    duration, steps)
+
+    def set_fairness(self, stats):
+        """
+        Count assignments, active flows and bytes per server in stats
+
+        The edge switches are polled for the bytes of connections still in.
+        """
+        self.fairness = stats
+        for service in self.services:
+            pool = service.pool
+            stats.set_backends(pool.name, [ip for ip, mac in pool.servers
+                                           if self._is_up(ip)])
+        self._start_poller()
+
+    def set_link_monitor(self, monitor, threshold=0.1):
+        """
+        Send new connections down the least utilized of the k paths
+
+        The choice for each pair of switches is kept until a link on one of
+        its paths moves by more than threshold.
+        """
+        self.path_choice = LeastUtilizedPaths(self.paths, monitor.link_utilization(),
+                                              threshold)
+        monitor.addListeners(self)
+
+    def _handle_LinkUtilization(self, event):
+        self.path_choice.update(event.links)
+
+    def set_elephants(self, detector, slack=1, limit=4, margin=0.1):
+        """
+        Move the elephant flows detector finds onto less busy paths
+
+        Every detector.interval, each elephant is moved to the path, of the
+        limit shortest ones no more than slack hops longer than the
+        shortest, whose busiest link carries the least elephant traffic, if
+        that is less than its own path's busiest link by more than margin
+        of its rate.
+        """
+        self.elephants = detector
+        self._elephant_slack = slack
+        self._elephant_limit = limit
+        self._elephant_margin = margin
+        self.elephant_poller = StatsPoller(self._elephant_requests, detector.interval,
+                                           self._stats_rate)
+        for dpid in self.paths.adjacency:
+            if dpid not in self.edge_switches:
+                self.elephant_poller.add_switch(dpid)
+        self._elephant_timer = Timer(detector.interval, self._move_elephants,
+                                     recurring=True)
+
+    def _update_pools(self, servers):
+        """ Tell the selectors of the servers' pools who is up."""
+        pools = set()
+        for server in servers:
+            pools.update(self.services.pools_of(server))
+        for pool in pools:
+            up = [ip for ip, mac in pool.servers if self._is_up(ip)]
+            pool.selector.set_backends(up)
+            if self.fairness is not None:
+                self.fairness.set_backends(pool.name, up)
+
+    def _handle_BackendHealth(self, event):
+        server = event.backend
+        if self.slow_start is not None:
+            if event.up:
+                self.slow_start.begin(server)
+            else:
+                self.slow_start.cancel(server)
+        self._update_pools([server])
+        if not event.up:
+            if self.affinity is not None:
+                self.affinity.remove_backend(server)
+            self._flush_server(server)
+        self._sync_proactive()
+
+    def _flush_server(self, server):
+        """ Delete every rule we installed for a server's connections."""
+        for rule in [r for r in self.return_rules if r[0] == server]:
+            del self.return_rules[rule]
+        by_switch = {}
+        for key, rules in self.server_rules.pop(server, {}).items():
+            self.elephant_routes.pop(key, None)
+            for dpid, match, priority in rules:
+                msg = of.ofp_flow_mod(command=of.OFPFC_DELETE_STRICT,
+                                      match=match, priority=priority)
+                by_switch.setdefault(dpid, []).append(msg.pack())
+        for dpid, msgs in by_switch.items():
+            connection = core.openflow.getConnection(dpid)
+            if connection is not None:
+                connection.send(b''.join(msgs))
+        count = sum(len(msgs) for msgs in by_switch.values())
+        if count:
+            log.info(f"Deleted {count} rules towards server {server}")
+        return count
+
+    def _forget_switch_rules(self, dpid):
+        """
+        Forget the rules on a switch that's gone, which went with it
+
+        The connections whose first hop was there won't send FlowRemoved
+        now, so they're counted out of their selectors and the fairness
+        stats here.
+        """
+        for rule, where in list(self.return_rules.items()):
+            if where[0] != dpid:
+                continue
+            del self.return_rules[rule]
+            server, client, protocol, port = rule
+            service = self.services.from_backend(server, protocol, port)
+            rules = self.server_rules.get(server)
+            if service is not None and rules:
+                rules.pop(('return', pack_key(client, service.vip, protocol, 0, port)),
+                          None)
+        for server, keyed in self.server_rules.items():
+            for key, rules in list(keyed.items()):
+                if isinstance(key, tuple) or not rules or rules[0][0] != dpid:
+                    continue
+                del keyed[key]
+                self.elephant_routes.pop(key, None)
+                match = rules[0][1]
+                service = self.services.lookup(match.nw_dst, match.nw_proto,
+                                               match.tp_dst)
+                if service is None:
+                    continue
+                service.pool.selector.release(server)
+                if self.fairness is not None:
+                    # What it carried since the statistics last saw it is lost
+                    self.fairness.finished(service.pool.name, server, key, 0)
 
-    def install_flow(self, event, ip_packet, in_port, selected_server, selected_mac, out_port, dpid):
-        # Install flow for this path
+    def set_weights(self, weights):
+        """
+        Set servers' weights, in every pool they're in
+
+        weights is a dict of server IP -> weight, or a list in SERVER_IPS
+        order.
+        """
+        if not isinstance(weights, dict):
+            weights = dict(zip(SERVER_IPS, weights))
+        for server, weight in weights.items():
+            for pool in self.services.pools_of(server):
+                pool.weights[server] = float(weight)
+        self._apply_weights(weights)
+
+    def _pool_weights(self, pool):
+        """ A pool's weights, scaled down for servers in slow start."""
+        weights = {}
+        for ip, mac in pool.servers:
+            weight = pool.weights.get(ip, 1.0)
+            if self.slow_start is not None:
+                weight *= self.slow_start.factor(ip)
+            weights[ip] = weight
+        return weights
+
+    def _apply_weights(self, servers):
+        """ Rebuild the tables of the servers' pools if their weights changed."""
+        pools = set()
+        for server in servers:
+            pools.update(self.services.pools_of(server))
+        for pool in pools:
+            pool.selector.set_weights(self._pool_weights(pool))
+        if self.proactive:
+            default = self.services.lookup(VIP, ipv4.TCP_PROTOCOL, SERVICE_PORT)
+            if default is not None and default.pool in pools:
+                weights = self._pool_weights(default.pool)
+                self.proactive.set_weights([weights.get(ip, 1.0)
+                                            for ip, mac in self.proactive.servers])
+                self._sync_proactive()
+
+    def _server_ports(self, dpid):
+        """ {port: server IP} for the servers attached to a switch."""
+        ports = {}
+        for ip, mac in self.server_macs.items():
+            location = self.hosts.get(mac)
+            if location is not None and location[0] == dpid:
+                ports[location[1]] = ip
+        return ports
+
+    def _stats_requests(self, dpid):
+        """ What the poller asks an edge switch for."""
+        # The first-hop VIP flows, which carry their server in the cookie
+        match = of.ofp_match(dl_type=ethernet.IP_TYPE)
+        requests = [of.ofp_stats_request(body=of.ofp_flow_stats_request(match=match))]
+
+        ports = self._server_ports(dpid)
+        if len(ports) == 1:
+            port_no = next(iter(ports))
+            requests.append(of.ofp_stats_request(body=of.ofp_port_stats_request(port_no=port_no)))
+        elif ports:
+            requests.append(of.ofp_stats_request(body=of.ofp_port_stats_request()))
+        return requests
+
+    def _elephant_requests(self, dpid):
+        """ What the elephant poller asks a core switch for."""
+        match = of.ofp_match(dl_type=ethernet.IP_TYPE)
+        return [of.ofp_stats_request(body=of.ofp_flow_stats_request(match=match))]
+
+    def _handle_openflow_FlowStatsReceived(self, event):
+        if self.elephant_poller and event.dpid not in self.edge_switches:
+            self._elephant_sample(event)
+            return
+        if not self.poller:
+            return
+        counts = {}
+        vips = self.services.vips
+        for stats in event.stats:
+            if stats.cookie and stats.match.nw_dst in vips:
+                server = IPAddr(stats.cookie)
+                if server in self.server_macs:
+                    counts[server] = counts.get(server, 0) + 1
+                    if self.fairness is not None:
+                        self._fairness_bytes(server, stats)
+        self.load.flow_sample(event.dpid, counts)
+        # A server's load is what it carries for all of its VIPs
+        for server in self.server_macs:
+            for pool in self.services.pools_of(server):
+                pool.selector.set_load(server, flows=self.load.flows.get(server, 0))
+
+    def _fairness_bytes(self, server, stats):
+        """ Count what a connection's first rule has carried so far."""
+        match = stats.match
+        service = self.services.lookup(match.nw_dst, match.nw_proto, match.tp_dst)
+        if service is None:
+            return
+        key = pack_key(match.nw_src, match.nw_dst, match.nw_proto,
+                       match.tp_src, match.tp_dst)
+        self.fairness.flow_bytes(service.pool.name, server, key, stats.byte_count)
+
+    def _elephant_sample(self, event):
+        """ Feed a core switch's flows to the elephant detector."""
+        flows = []
+        vips = self.services.vips
+        servers = None
+        for stats in event.stats:
+            match = stats.match
+            if match.tp_src is None or match.tp_dst is None:
+                continue
+            if match.nw_dst in vips:
+                # Direct server return; the server is only in the MAC
+                service = self.services.lookup(match.nw_dst, match.nw_proto, match.tp_dst)
+                if service is None:
+                    continue
+                if servers is None:
+                    servers = {mac: ip for ip, mac in self.server_macs.items()}
+                server = servers.get(match.dl_dst)
+                if server is None:
+                    continue
+            else:
+                server = match.nw_dst
+                service = self.services.from_backend(server, match.nw_proto, match.tp_dst)
+                if service is None:
+                    continue
+            # Keyed like server_rules, by the connection to the VIP
+            key = pack_key(match.nw_src, service.vip, match.nw_proto,
+                           match.tp_src, match.tp_dst)
+            flows.append((key, stats.byte_count, server))
+        self.elephants.flow_sample(event.dpid, flows)
+
+    def _move_elephants(self):
+        """ Move elephants off links they share with other elephants."""
+        found = self.elephants.elephants()
+        self.elephants.end_round()
+
+        # Where each elephant goes now, and what they put on each link
+        routes = []
+        link_load = {}
+        for key, server, rate in found:
+            rules = self.server_rules.get(server, {}).get(key)
+            if not rules:
+                continue
+            nodes = self.elephant_routes.get(key)
+            if nodes is None:
+                nodes = tuple(dpid for dpid, match, priority in rules)
+            routes.append((key, server, rate, rules, nodes))
+            for link in path_links(nodes):
+                link_load[link] = link_load.get(link, 0) + rate
+
+        moved = 0
+        for key, server, rate, rules, nodes in routes:
+            location = self.hosts.get(self.server_macs.get(server))
+            if location is None:
+                continue
+            for link in path_links(nodes):
+                link_load[link] -= rate
+            candidates = {tuple(hop[0] for hop in hops): hops
+                          for hops in self.paths.alternatives(nodes[0], location[0],
+                                                              self._elephant_slack,
+                                                              self._elephant_limit)}
+            best, loads = least_loaded_path(list(candidates) + [nodes], link_load)
+            if (best != nodes and best in candidates
+                    and loads[best] + self._elephant_margin * rate < loads[nodes]
+                    and self._move_flow(key, server, rules, nodes,
+                                        candidates[best], location[1])):
+                nodes = best
+                moved += 1
+            for link in path_links(nodes):
+                link_load[link] = link_load.get(link, 0) + rate
+        if moved:
+            log.info(f"Moved {moved} of {len(routes)} elephant flows")
+        return moved
+
+    def _move_flow(self, key, server, rules, old, hops, final_port):
+        """
+        Send a connection along hops, from the switch where it leaves old
+
+        The new path's switches get rules above the ones already there, and
+        once they have confirmed them the switch where the paths part is
+        pointed down the new one.  If that's the first switch its rule is
+        modified in place, so it keeps its cookie and still tells us when
+        the connection ends.
+        """
+        first_dpid, first_match, first_priority = rules[0]
+        service = self.services.lookup(first_match.nw_dst, first_match.nw_proto,
+                                       first_match.tp_dst)
+        if service is None:
+            return False
+        mac = self.server_macs[server]
+        hops = cook(hops, first_match.in_port, final_port)
+        new = [dpid for dpid, hop_in, hop_out in hops]
+        part = 0
+        while part + 1 < len(old) and old[part + 1] == new[part + 1]:
+            part += 1
+
+        messages = {}
+        release = None
+        for i in range(part, len(hops)):
+            dpid, hop_in, hop_out = hops[i]
+            if i == 0:
+                msg = of.ofp_flow_mod(command=of.OFPFC_MODIFY_STRICT, match=first_match,
+                                      priority=first_priority)
+            else:
+                match = first_match.clone()
+                match.in_port = hop_in
+                match.dl_dst = mac
+                if not service.dsr:
+                    match.nw_dst = server
+                msg = of.ofp_flow_mod(match=match, priority=ELEPHANT_PRIORITY,
+                                      idle_timeout=FLOW_IDLE_TIMEOUT)
+                rules.append((dpid, match, msg.priority))
+            msg.actions = self._hop_actions(server, mac, hop_out, not service.dsr)
+            if i == part:
+                release = (dpid, msg)
+            else:
+                messages.setdefault(dpid, []).append(msg)
+        self.installer.install(messages, release=release)
+        self.elephant_routes[key] = tuple(new)
+        return True
+
+    def _handle_openflow_PortStatsReceived(self, event):
+        if not self.poller:
+            return
+        now = time.time()
+        ports = self._server_ports(event.dpid)
+        for stats in event.stats:
+            server = ports.get(stats.port_no)
+            if server is None:
+                continue
+            self.load.port_sample(server, now, stats.rx_bytes + stats.tx_bytes)
+            for pool in self.services.pools_of(server):
+                pool.selector.set_load(server, rate=self.load.rate(server))
+
+    def install_path(self, event, ip_packet, hops, selected_server, selected_mac,
+                     rules=None, extra=None, dsr=False):
+        """
+        Install the rules for a connection along hops, from cook()
+
+        Each switch gets its rules in one write, and the packet which came
+        in is sent on once every switch has confirmed them.  extra is a
+        dict of dpid -> more messages to send along with them.  With dsr
+        only the destination MAC is rewritten.
+        """
+        messages = {}
+        for dpid, msgs in (extra or {}).items():
+            messages[dpid] = list(msgs)
+        dst_ip = ip_packet.dstip
+        dst_mac = event.parsed.dst
+        first = True
+        for dpid, hop_in, hop_out in hops:
+            msg = self._flow_mod(event.parsed.src, dst_mac, ip_packet, dst_ip, hop_in,
+                                 selected_server, selected_mac, hop_out, notify=first,
+                                 rewrite_ip=not dsr)
+            messages.setdefault(dpid, []).append(msg)
+            if rules is not None:
+                rules.append((dpid, msg.match, msg.priority))
+            # Past the first switch the packet is addressed to the server
+            if not dsr:
+                dst_ip = selected_server
+            dst_mac = selected_mac
+            first = False
+
+        release = of.ofp_packet_out(data=event.ofp,
+                                    action=of.ofp_action_output(port=of.OFPP_TABLE))
+        missing = self.installer.install(messages, release=(event.dpid, release))
+        if missing:
+            log.warning(f"{missing} switches on the path to {selected_server} are gone")
+
+    def _flow_mod(self, src_mac, dst_mac, ip_packet, dst_ip, in_port, selected_server,
+                  selected_mac, out_port, notify=False, rewrite_ip=True):
+        """ A flow_mod for one hop of a connection towards a server."""
         msg = of.ofp_flow_mod()
-        match = of.ofp_match()
+        msg.idle_timeout = FLOW_IDLE_TIMEOUT
+        if notify:
+            # Tell us when it expires, so the selector can forget the flow
+            msg.flags = of.OFPFF_SEND_FLOW_REM
+            msg.cookie = selected_server.toUnsigned()
+        match = msg.match
 
-        match.in_port = in_port 
+        match.in_port = in_port
 
         match.dl_type = 0x0800
         match.nw_proto = ip_packet.protocol
@@ -53,230 +692,339 @@ class LoadBalancer(object):
         transport_packet = ip_packet.payload
         match.tp_src = transport_packet.srcport  # Source port
         match.tp_dst = transport_packet.dstport  # Destination port
-        
+
         match.nw_src = ip_packet.srcip  # Source IP address
-        match.nw_dst = ip_packet.dstip  # Destination IP address
-        
-        match.dl_src = event.parsed.src  # Source MAC address
-        match.dl_dst = event.parsed.dst  # Destination MAC address
-    
-        msg.match = match
-        
-        msg.actions.append(of.ofp_action_nw_addr.set_dst(selected_server))
-        msg.actions.append(of.ofp_action_dl_addr.set_dst(selected_mac))
-        msg.actions.append(of.ofp_action_output(port=out_port))
+        match.nw_dst = dst_ip  # Destination IP address
+
+        match.dl_src = src_mac  # Source MAC address
+        match.dl_dst = dst_mac  # Destination MAC address
+
+        msg.actions = self._hop_actions(selected_server, selected_mac, out_port,
+                                        rewrite_ip)
+        return msg
 
-        connection = None
-        for conn in core.openflow.connections.values():
-            if conn.dpid == dpid:
-                connection = conn
-                break
+    @staticmethod
+    def _hop_actions(server, mac, out_port, rewrite_ip=True):
+        """ Address a packet to server and send it out of out_port."""
+        actions = []
+        if rewrite_ip:
+            actions.append(of.ofp_action_nw_addr.set_dst(server))
+        actions.append(of.ofp_action_dl_addr.set_dst(mac))
+        actions.append(of.ofp_action_output(port=out_port))
+        return actions
 
-        if connection:
-            connection.send(msg)
+    def _handle_openflow_BarrierIn(self, event):
+        self.installer.barrier_in(event.dpid, event.xid)
+
+    def _handle_openflow_FlowRemoved(self, event):
+        match = event.ofp.match
+        if event.ofp.cookie:
+            service = self.services.lookup(match.nw_dst, match.nw_proto, match.tp_dst)
+            if service is None:
+                return
+            server = IPAddr(event.ofp.cookie)
+            service.pool.selector.release(server)
+            key = pack_key(match.nw_src, match.nw_dst, match.nw_proto,
+                           match.tp_src, match.tp_dst)
+            rules = self.server_rules.get(server)
+            if rules:
+                rules.pop(key, None)
+            self.elephant_routes.pop(key, None)
+            if self.fairness is not None:
+                self.fairness.finished(service.pool.name, server, key,
+                                       event.ofp.byte_count)
+        else:
+            service = self.services.from_backend(match.nw_src, match.nw_proto,
+                                                 match.tp_src)
+            if service is None:
+                return
+            # A return rewrite rule
+            self.return_rules.pop((match.nw_src, match.nw_dst, match.nw_proto,
+                                   match.tp_src), None)
+            rules = self.server_rules.get(match.nw_src)
+            if rules:
+                rules.pop(('return', pack_key(match.nw_dst, service.vip, match.nw_proto,
+                                              0, match.tp_src)), None)
+
+    def _handle_openflow_PacketIn(self, event):
+        # Before anything parses the packet
+        if self.arp.handle_packet_in(event):
+            return EventHalt
 
-    def _handle_PacketIn(self, event):
         packet = event.parsed
         in_port = event.port
         dpid = event.dpid
 
-        # ARP handling
-        #if packet.type == ethernet.ARP_TYPE:
-        #    self._handle_arp(packet, event, in_port)
-        #    return
-
-        #if packet.type != ethernet.IP_TYPE:
-        #    return
+        if self.health is not None and self.health.handle_packet_in(event):
+            return
 
         ip_packet = packet.find("ipv4")
         if ip_packet is None:
             return  # Jeśli pakiet nie jest IPv4, kończymy
 
         transport_packet = ip_packet.payload
-        if isinstance(transport_packet, tcp) or isinstance(transport_packet, udp):
-            # Sprawdzamy, czy porty odpowiadają domyślnym portom iperf (np. port 5001)
-            if transport_packet.dstport == 5001 or transport_packet.srcport == 5001:
-                # Pakiet jest związany z iperf, przechodzi dalej
-                pass
-            else:
-                return  # Jeśli port nie odpowiada, ignorujemy pakiet
-        else:
+        if not isinstance(transport_packet, (tcp, udp)):
             return  # Jeśli nie ma danych transportowych (TCP/UDP), ignorujemy pakiet
 
-        ip_packet = packet.payload
+        # Handle packets destined for a VIP
+        service = self.services.lookup(ip_packet.dstip, ip_packet.protocol,
+                                       transport_packet.dstport)
+        if service is not None:
+            if packet.dst == service.vmac and self.paths.is_edge_port(dpid, in_port):
+                self._to_vip(event, ip_packet, in_port, service)
+            return
 
-        # Handle packets destined for VIP
-        if ip_packet.dstip == VIP and event.parsed.dst == VMAC:
-            if dpid in (5, 6):  # Switch S5 or S6
-                self._handle_to_vip(event, ip_packet, in_port)
-                
-        elif ip_packet.srcip in SERVER_IPS:
-            if dpid in (5, 6):  # Switch S5 or S6
-                self._handle_from_server(event, ip_packet, in_port, dpid)
+        service = self.services.from_backend(ip_packet.srcip, ip_packet.protocol,
+                                             transport_packet.srcport)
+        if service is not None:
+            client = self._locate_client(ip_packet.dstip, event.parsed.dst)
+            if client is not None and client[0] == dpid:
+                self._from_server(event, ip_packet, in_port, client[1], service)
 
-    def _handle_to_vip(self, event, ip_packet, in_port):
-        """ Handle packets destined for the VIP."""
+    def _locate_client(self, ip, mac):
+        """ Where is a client attached, as (dpid, port)?"""
+        client = self.clients.get(ip)
+        if client is None:
+            # With proactive rules we may never have seen it ourselves
+            client = self.hosts.get(mac)
+        return client
+
+    def _to_vip(self, event, ip_packet, in_port, service):
+        """ Handle packets destined for a VIP."""
+        pool = service.pool
+        selector = pool.selector
         src_ip = ip_packet.srcip
         dst_ip = ip_packet.dstip
 
+        transport_packet = ip_packet.payload
+        key = pack_key(src_ip, dst_ip, ip_packet.protocol,
+                       transport_packet.srcport, transport_packet.dstport)
+
+        # Connections we've placed before go back to the same server
+        selected_server = None
+        if self.affinity is not None:
+            selected_server = self.affinity.lookup(key)
+            if selected_server is not None:
+                if selected_server in selector:
+                    selector.assign(selected_server)
+                else:
+                    self.affinity.remove(key)
+                    selected_server = None
+
         # Determine which server to forward to
-        server_index = self._hash(src_ip, dst_ip)
-        selected_server = SERVER_IPS[server_index]
-        selected_mac = SERVER_MACS[server_index]
+        if selected_server is None:
+            selected_server = selector.select(pool.hasher.hash(ip_packet))
+            if selected_server is None:
+                log.warning(f"No server available for {src_ip}")
+                return
+            if self.affinity is not None:
+                self.affinity.insert(key, selected_server)
+        selected_mac = pool.macs[selected_server]
 
         log.info(f"Switch S{event.dpid}: Forwarding traffic from {src_ip} to {selected_server}")
 
-        if src_ip in (H5, H6):
-            if selected_server == S1:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 5)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 1, 2)
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 1, 1)
-                
-            elif selected_server == S2:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 5)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 1, 2)
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 2, 1)
-
-            elif selected_server == S3:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 5)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 4, 2)
-                self.install_flow(event, ip_packet, 5, selected_server, selected_mac, 1, 3)
-
-            elif selected_server == S4:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 5)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 4, 2)
-                self.install_flow(event, ip_packet, 5, selected_server, selected_mac, 2, 3)
-
-        elif src_ip in (H7, H8):
-            if selected_server == S1:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 6)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 4, 4)
-                self.install_flow(event, ip_packet, 5, selected_server, selected_mac, 1, 1)
-
-            elif selected_server == S2:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 6)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 4, 4)
-                self.install_flow(event, ip_packet, 5, selected_server, selected_mac, 2, 1)
-
-            elif selected_server == S3:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 6)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 2, 4)
-                self.install_flow(event, ip_packet, 4, selected_server, selected_mac, 1, 3)
-
-            elif selected_server == S4:
-                self.install_flow(event, ip_packet, in_port, selected_server, selected_mac, 3, 6)
-
-                ip_packet.dstip = selected_server
-                event.parsed.dst = selected_mac
-                
-                self.install_flow(event, ip_packet, 3, selected_server, selected_mac, 2, 4)
-                self.install_flow(event, ip_packet, 4, selected_server, selected_mac, 2, 3)
-
-        
-
-    def _handle_from_server(self, event, ip_packet, in_port, dpid):
+        self.clients[src_ip] = (event.dpid, in_port)
+
+        location = self.hosts.get(selected_mac)
+        if location is None:
+            log.warning(f"Don't know where server {selected_server} is yet")
+            selector.release(selected_server)
+            return
+
+        if self.path_choice is not None:
+            path = self.path_choice.get_path(event.dpid, location[0])
+        else:
+            path = self.paths.get_path(event.dpid, location[0])
+        if path is None:
+            log.warning(f"No path from S{event.dpid} to server {selected_server}")
+            selector.release(selected_server)
+            return
+
+        # Have the switch rewrite the replies without asking us, unless the
+        # server sends them from the VIP itself
+        extra = {}
+        if not service.dsr:
+            msg = self._return_rule(service, selected_server, src_ip, ip_packet.protocol,
+                                    transport_packet.dstport, event.dpid, in_port)
+            if msg is not None:
+                extra[event.dpid] = [msg]
+
+        rules = self.server_rules.setdefault(selected_server, {})[key] = []
+        self.install_path(event, ip_packet, cook(path, in_port, location[1]),
+                          selected_server, selected_mac, rules=rules, extra=extra,
+                          dsr=service.dsr)
+        if self.fairness is not None:
+            self.fairness.assigned(pool.name, selected_server)
+
+    def _from_server(self, event, ip_packet, in_port, out_port, service):
         """ Handle packets returning from servers to clients."""
-        src_ip = ip_packet.srcip
-        dst_ip = ip_packet.dstip
+        log.info(f"Switch S{event.dpid}: Modifying source IP from {ip_packet.srcip} "
+                 f"to VIP {service.vip}")
+        msg = self._return_rule(service, ip_packet.srcip, ip_packet.dstip, ip_packet.protocol,
+                                ip_packet.payload.srcport, event.dpid, out_port)
+        release = of.ofp_packet_out(data=event.ofp,
+                                    action=of.ofp_action_output(port=of.OFPP_TABLE))
+        self.installer.install({event.dpid: [msg]} if msg else {},
+                               release=(event.dpid, release))
+
+    def _return_rule(self, service, server, client, protocol, port, dpid, out_port):
+        """
+        The rule rewriting everything from server to client back to the VIP
 
-        log.info(f"Switch S{event.dpid}: Modifying source IP from {src_ip} to VIP {VIP}")
+        One rule per (server, client) pair and service port on the client's
+        switch, matching only the addresses and the port, covers all of the
+        pair's connections.  Returns None if it's already there.
+        """
+        rule = (server, client, protocol, port)
+        if self.return_rules.get(rule) == (dpid, out_port):
+            return None
 
-        # Install flow for this path
         msg = of.ofp_flow_mod()
-        match = of.ofp_match()
+        msg.priority = PROACTIVE_PRIORITY
+        msg.idle_timeout = RETURN_IDLE_TIMEOUT
+        msg.flags = of.OFPFF_SEND_FLOW_REM
+        match = msg.match
+        match.dl_type = 0x0800
+        match.nw_proto = protocol
+        match.nw_src = server
+        match.nw_dst = client
+        match.tp_src = port
 
-        match.in_port = in_port 
+        msg.actions.append(of.ofp_action_nw_addr.set_src(service.vip))
+        msg.actions.append(of.ofp_action_dl_addr.set_src(service.vmac))
+        msg.actions.append(of.ofp_action_output(port=out_port))
 
-        match.dl_type = 0x0800
-        match.nw_proto = ip_packet.protocol
+        self.return_rules[rule] = (dpid, out_port)
+        key = ('return', pack_key(client, service.vip, protocol, 0, port))
+        self.server_rules.setdefault(server, {})[key] = [(dpid, match, msg.priority)]
+        return msg
 
-        transport_packet = ip_packet.payload
-        match.tp_src = transport_packet.srcport  # Source port
-        match.tp_dst = transport_packet.dstport  # Destination port
 
-        match.nw_src = ip_packet.srcip  # Source IP address
-        match.nw_dst = ip_packet.dstip  # Destination IP address
-        
-        match.dl_src = event.parsed.src  # Source MAC address
-        match.dl_dst = event.parsed.dst  # Destination MAC address
-
-        msg.match = match
-        
-        msg.actions.append(of.ofp_action_nw_addr.set_src(VIP))
-        msg.actions.append(of.ofp_action_dl_addr.set_src(VMAC))
-
-        if dpid == 5:
-            if dst_ip == H5:
-                msg.actions.append(of.ofp_action_output(port=1))
-            elif dst_ip == H6:
-                msg.actions.append(of.ofp_action_output(port=2))
-                
-        elif dpid == 6:
-            if dst_ip == H7:
-                msg.actions.append(of.ofp_action_output(port=1))
-            elif dst_ip == H8:
-                msg.actions.append(of.ofp_action_output(port=2))
-
-        event.connection.send(msg)
-
-    def _handle_arp(self, packet, event, in_port):
-        """ Handle ARP packets."""
-        arp_packet = packet.payload
-        if arp_packet.opcode == arp.REQUEST and arp_packet.protodst == VIP:
-            log.info(f"Responding to ARP for VIP {VIP}")
-
-            # Create an ARP reply
-            arp_reply = arp()
-            arp_reply.hwtype = arp_packet.hwtype
-            arp_reply.prototype = arp_packet.prototype
-            arp_reply.hwlen = arp_packet.hwlen
-            arp_reply.protolen = arp_packet.protolen
-            arp_reply.opcode = arp.REPLY
-            arp_reply.hwdst = arp_packet.hwsrc
-            arp_reply.protosrc = VIP
-            arp_reply.protodst = arp_packet.protosrc
-            arp_reply.hwsrc = EthAddr("00:00:00:00:00:01")  # Example MAC for VIP
-
-            ethernet_reply = ethernet()
-            ethernet_reply.type = ethernet.ARP_TYPE
-            ethernet_reply.src = EthAddr("00:00:00:00:00:01")
-            ethernet_reply.dst = packet.src
-            ethernet_reply.payload = arp_reply
-
-            msg = of.ofp_packet_out()
-            msg.data = ethernet_reply.pack()
-            msg.actions.append(of.ofp_action_output(port=of.OFPP_IN_PORT))
-            msg.in_port = in_port
-            event.connection.send(msg)
-
-
-def launch():
-    core.registerNew(LoadBalancer)
+def launch(k_paths=1, selector="modulo", hash_fields="src", hash_basis=0,
+           proactive=False, client_net="10.0.0.0/24", bucket_bits=8,
+           weights=None, switch_hash=False, slot_bits=6, stats_interval=5,
+           stats_rate=100, affinity_ttl=300, affinity_size=1000000,
+           health_interval=1, health_fall=3, health_rise=2, health_tcp=False,
+           services=None, arp_rules=False, dsr=False, slow_start=30,
+           elephant_rate=0, elephant_top=8, elephant_slack=1, link_interval=0,
+           link_speed=1000000000, link_threshold=0.1, fairness_interval=0):
+    """
+    Depends on openflow.discovery and host_tracker
+
+    --services=FILE balances the VIPs and pools in a JSON file instead of
+      VIP in front of SERVER_IPS; see lb.service.load_services.  --selector
+      and --hash_fields are then set per pool, and --proactive and
+      --switch_hash aren't available.
+    --dsr uses direct server return for the default VIP: only the
+      destination MAC is rewritten and the servers, which need the VIP on
+      their loopback (see topology.py --dsr), answer clients directly.
+      Health probes then come from PROBE_IP.  Services from --services
+      have a "dsr" setting of their own.
+    --arp_rules has every switch send ARP requests for the VIPs straight
+      to the controller, which answers them; see lb.arp
+
+    --k_paths=N keeps the N shortest paths to every server (default 1)
+    --selector picks how flows are mapped to servers: modulo (default),
+      ring, maglev, bounded, least_conn or least_bytes; see lb.selection
+    --hash_fields picks what is hashed: src (default), src_port, 5tuple or
+      symmetric_l4, with --hash_basis as the seed; see lb.hashing
+    --stats_interval and --stats_rate set how often (in seconds) each edge
+      switch is polled for the least_* selectors, and how many requests a
+      second may go out in total (default 5 and 100); see lb.stats
+    --affinity_ttl keeps connections on the server they were first sent to
+      for this many seconds after their last PacketIn (default 300, 0 turns
+      it off), remembering at most --affinity_size of them; see lb.affinity
+    --weights sets the servers' relative weights, as a comma separated list
+      in SERVER_IPS order (all equal by default)
+    --proactive pre-installs the VIP rules instead of waiting for PacketIns.
+      Clients in --client_net are split into 2**--bucket_bits nw_src
+      buckets which are shared among the servers by --weights.
+    --switch_hash has Open vSwitch hash new connections over the servers by
+      itself, using 2**--slot_bits slots shared out by --weights; see
+      lb.switch_hash
+    --health_interval sets how often (in seconds) the servers are probed
+      (default 1, 0 turns it off).  A server is out after --health_fall
+      missed probes in a row and back in after --health_rise answered ones.
+      --health_tcp adds a TCP SYN to the ARP probe, to the first port of
+      the first TCP service the server is behind; see lb.health
+    --slow_start ramps a server that comes back up from a tenth of its
+      weight to all of it over this many seconds (default 30, 0 turns it
+      off); see lb.slow_start
+    --elephant_rate watches the core switches' flows and moves those
+      sending more than this many bytes a second (at most --elephant_top of
+      them) onto paths whose links carry fewer such flows, among those at
+      most --elephant_slack hops longer than the shortest (default 0, which
+      turns it off; 8; 1).  Polled every --stats_interval; see lb.elephants
+    --link_interval polls every switch's port statistics about this often
+      (in seconds, default 0 which turns it off) and keeps track of how
+      busy each link is, as core.LinkMonitor and at /lb/links when
+      web.webcore is running.  Ports which don't report a speed are taken
+      to run at --link_speed bits a second; see lb.utilization.  New
+      connections then take the least utilized of the --k_paths paths to
+      their server; the choice for a pair of switches is kept until a link
+      on one of its paths changes by more than --link_threshold (0.1)
+    --fairness_interval counts the connections, active flows and bytes of
+      each server over the last 1, 5 and 15 minutes, and logs how evenly
+      they're spread (Jain's index and max/mean) this often (in seconds,
+      default 0 which turns it off).  The edge switches are polled every
+      --stats_interval for the bytes, and the figures are at /lb/fairness
+      when web.webcore is running; see lb.fairness
+    """
+    if weights is not None:
+        weights = [float(w) for w in weights.split(",")]
+    dsr = str_to_bool(dsr)
+    arp_rules = str_to_bool(arp_rules)
+    servers = list(zip(SERVER_IPS, SERVER_MACS))
+    if (proactive or switch_hash) and (services is not None or dsr):
+        raise RuntimeError("--proactive and --switch_hash only work for the default "
+                           "VIP without --dsr")
+    if services is not None:
+        services = load_services(services)
+        backends = {}
+        for service in services:
+            backends.update(service.pool.macs)
+        servers = list(backends.items())
+    protocols = (ipv4.TCP_PROTOCOL, ipv4.UDP_PROTOCOL)
+    rules = None
+    if switch_hash:
+        rules = SwitchHashRules(VIP, SERVICE_PORT, protocols, servers,
+                                int(slot_bits), weights)
+    elif proactive:
+        rules = ProactiveRules(VIP, SERVICE_PORT, protocols, servers,
+                               parse_cidr(client_net), int(bucket_bits),
+                               weights)
+    affinity = None
+    if float(affinity_ttl) > 0:
+        affinity = AffinityTable(float(affinity_ttl), int(affinity_size))
+    lb = core.registerNew(LoadBalancer, k_paths=int(k_paths), proactive=rules,
+                     selector=make_selector(selector, SERVER_IPS),
+                     hasher=FlowHasher(hash_fields, int(hash_basis)),
+                     stats_interval=float(stats_interval),
+                     stats_rate=float(stats_rate), affinity=affinity,
+                     services=services, arp_rules=arp_rules, dsr=dsr,
+                     weights=weights)
+    if float(slow_start) > 0:
+        lb.set_slow_start(float(slow_start))
+    if float(link_interval) > 0:
+        monitor = core.registerNew(LinkMonitor, float(link_interval), float(stats_rate),
+                                   default_speed=float(link_speed))
+        monitor.serve()
+        lb.set_link_monitor(monitor, float(link_threshold))
+    if float(fairness_interval) > 0:
+        fairness = FairnessStats(log_interval=float(fairness_interval))
+        fairness.serve()
+        lb.set_fairness(fairness)
+    if float(elephant_rate) > 0:
+        lb.set_elephants(ElephantDetector(float(stats_interval), float(elephant_rate),
+                                          int(elephant_top)),
+                         int(elephant_slack))
+    if float(health_interval) > 0:
+        probe_ip, probe_mac = VIP, VMAC
+        if any(s.dsr for s in lb.services):
+            # Probes from an address the servers have would be ignored
+            probe_ip, probe_mac = PROBE_IP, PROBE_MAC
+            lb.arp.add(probe_ip, probe_mac)
+        lb.set_health(HealthChecker(servers, lb.hosts.get, probe_ip, probe_mac,
+                                    float(health_interval), int(health_fall),
+                                    int(health_rise),
+                                    lb.services.probe_port if health_tcp else None))
@@ -83,7 +83,11 @@ class EpollSelect(object):
     for (fd, mask) in modify.items():
       if fd in self.registered:
         if mask == 0:
-          self.epoll.unregister(fd)
+          try:
+            self.epoll.unregister(fd)
+          except OSError:
+            # Already closed, which took it out of the epoll set
+            pass
           del self.registered[fd]
         else:
           self.epoll.modify(fd, mask)
@@ -245,6 +245,21 @@ class BarrierIn (Event):
     self.dpid = connection.dpid
     self.xid = ofp.xid
 
+class Backpressure (Event):
+  """
+  Fired when a connection's unsent data piles up, and when it drains
+
+  congested (bool) - True once more than Connection.SEND_HIGH_WATER bytes
+                     are waiting to go out, False once they're back under
+                     Connection.SEND_LOW_WATER
+  queued (int) - bytes waiting to go out
+  """
+  def __init__ (self, connection, congested, queued):
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.congested = congested
+    self.queued = queued
+
 class ConnectionIn (Event):
   def __init__ (self, connection):
     super(ConnectionIn,self).__init__()
@@ -351,6 +366,7 @@ class OpenFlowNexus (EventMixin):
     QueueStatsReceived,
     FlowRemoved,
     ConfigurationReceived,
+    Backpressure,
   ])
 
   # Bytes to send to controller when a packet misses all flows
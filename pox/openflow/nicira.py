@@ -219,6 +219,13 @@ class nx_bd_algorithm (object):
   NX_BD_ALG_HRW = 1
 
 
+class nx_mp_algorithm (object):
+  NX_MP_ALG_MODULO_N = 0
+  NX_MP_ALG_HASH_THRESHOLD = 1
+  NX_MP_ALG_HRW = 2
+  NX_MP_ALG_ITER_HASH = 3
+
+
 class nx_flow_mod_table_id (nicira_base):
   """
   Used to enable the flow mod table ID extension
@@ -681,6 +688,86 @@ class nx_action_bundle (of.ofp_action_vendor_base):
     return s
 
 
+class nx_action_multipath (of.ofp_action_vendor_base):
+  """
+  Hashes a flow's fields and loads a link number into a field
+
+  The link number is between 0 and max_link.  Unlike bundle_load, the
+  links needn't be ports, so this is usually followed by a resubmit to a
+  table which matches on dst.
+  """
+  def _init (self, kw):
+    self.vendor = NX_VENDOR_ID
+    self.subtype = NXAST_MULTIPATH
+
+    self.fields = nx_hash_fields.NX_HASH_FIELDS_SYMMETRIC_L4
+    self.basis = 0
+
+    self.algorithm = nx_mp_algorithm.NX_MP_ALG_MODULO_N
+    self.max_link = 0 # Number of links minus one
+    self.arg = 0 # Algorithm-specific
+
+    self.offset = 0
+    self.nbits = None
+    self.dst = NXM_NX_REG0 # An NXM type
+
+  def _eq (self, other):
+    if self.subtype != other.subtype: return False
+    if self.fields != other.fields: return False
+    if self.basis != other.basis: return False
+    if self.algorithm != other.algorithm: return False
+    if self.max_link != other.max_link: return False
+    if self.arg != other.arg: return False
+    if self.offset != other.offset: return False
+    if self.nbits != other.nbits: return False
+    if self.dst != other.dst: return False
+    return True
+
+  def _pack_body (self):
+    dst = self.dst
+    if isinstance(dst, nxm_entry):
+      assert dst.mask is None
+      dst = type(dst)
+
+    if self.nbits is None:
+      self.nbits = dst._get_size_hint() - self.offset
+    nbits = self.nbits - 1
+    assert nbits >= 0 and nbits <= 63
+    assert self.offset >= 0 and self.offset < (1 << 10)
+    ofs_nbits = self.offset << 6 | nbits
+
+    o = dst()
+    o._force_mask = False
+    dst = o.pack(omittable=False, header_only=True)
+
+    p = struct.pack('!HHHHHHLHH4s', self.subtype, self.fields, self.basis, 0,
+                    self.algorithm, self.max_link, self.arg, 0, ofs_nbits,
+                    dst)
+    return p
+
+  def _unpack_body (self, raw, offset, avail):
+    offset,(self.subtype, self.fields, self.basis, _, self.algorithm,
+            self.max_link, self.arg, _, ofs_nbits, dst) = \
+        of._unpack('!HHHHHHLHH4s', raw, offset)
+
+    self.offset = ofs_nbits >> 6
+    self.nbits = (ofs_nbits & 0x3f) + 1
+
+    self.dst = _class_for_nxm_header(dst)
+
+    return offset
+
+  def _body_length (self):
+    return 24
+
+  def _show (self, prefix):
+    s = ''
+    for f in ("subtype fields basis algorithm max_link arg nbits offset "
+              "dst").split():
+      s += prefix + ('%s: %s\n' % (f, getattr(self, f, None)))
+    return s
+
+
 class nx_output_reg (of.ofp_action_vendor_base):
   def _init (self, kw):
     self.vendor = NX_VENDOR_ID
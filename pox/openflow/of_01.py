@@ -25,6 +25,7 @@ import pox
 import pox.lib.util
 from pox.lib.addresses import EthAddr
 from pox.lib.revent.revent import EventMixin
+from pox.lib.recoco import Task
 import datetime
 import time
 from pox.lib.socketcapture import CaptureSocket
@@ -58,6 +59,12 @@ import pox.openflow.libopenflow_01 as of
 import threading
 import os
 import sys
+
+# Most buffers sendmsg() takes at once
+try:
+  _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except:
+  _IOV_MAX = 1024
 from errno import EAGAIN, ECONNRESET, EADDRINUSE, EADDRNOTAVAIL, EMFILE
 
 
@@ -404,11 +411,12 @@ statsHandlerMap = {
 }
 
 
-# Deferred sending should be unusual, so don't worry too much about
-# efficiency
 class DeferredSender (threading.Thread):
   """
   Class that handles sending when a socket write didn't complete
+
+  Each connection's unsent data is kept in one bytearray, which is sent
+  from as the socket takes it.
   """
   def __init__ (self):
     threading.Thread.__init__(self)
@@ -423,32 +431,25 @@ class DeferredSender (threading.Thread):
   def _handle_GoingDownEvent (self, event):
     self._waker.ping()
 
-  def _sliceup (self, data):
-    """
-    Takes an array of data bytes, and slices into elements of
-    PIPE_BUF bytes each
-    """
-    out = []
-    while len(data) > PIPE_BUF:
-      out.append(data[0:PIPE_BUF])
-      data = data[PIPE_BUF:]
-    if len(data) > 0:
-      out.append(data)
-    return out
-
   def send (self, con, data):
     with self._lock:
       self.sending = True
 
-      data = self._sliceup(data)
-
       if con not in self._dataForConnection:
-        self._dataForConnection[con] = data
+        self._dataForConnection[con] = bytearray(data)
       else:
-        self._dataForConnection[con].extend(data)
+        self._dataForConnection[con] += data
 
       self._waker.ping()
 
+  def pending (self, con):
+    """
+    How many bytes are waiting to go out to con
+    """
+    with self._lock:
+      data = self._dataForConnection.get(con)
+      return 0 if data is None else len(data)
+
   def kill (self, con):
     with self._lock:
       try:
@@ -478,38 +479,67 @@ class DeferredSender (threading.Thread):
             pass
 
         for con in wlist:
+          alldata = self._dataForConnection.get(con)
+          if alldata is None: continue
           try:
-            alldata = self._dataForConnection[con]
-            while len(alldata):
-              data = alldata[0]
-              try:
-                l = con.sock.send(data)
-                if l != len(data):
-                  alldata[0] = data[l:]
-                  break
-                del alldata[0]
-              except socket.error as e:
-                if e.errno != EAGAIN:
-                  con.msg("DeferredSender/Socket error: " + e.strerror)
-                  con.disconnect()
-                  del self._dataForConnection[con]
-                break
-              except:
-                con.msg("Unknown error doing deferred sending")
-                break
-            if len(alldata) == 0:
-              try:
-                del self._dataForConnection[con]
-                if len(self._dataForConnection) == 0:
-                  self.sending = False
-                  break
-              except:
-                pass
-          except:
-            try:
+            l = con.sock.send(alldata)
+            del alldata[:l]
+          except socket.error as e:
+            if e.errno != EAGAIN:
+              con.msg("DeferredSender/Socket error: " + e.strerror)
+              con.disconnect()
               del self._dataForConnection[con]
-            except:
-              pass
+              continue
+          except:
+            con.msg("Unknown error doing deferred sending")
+            del self._dataForConnection[con]
+            continue
+          if len(alldata) == 0:
+            del self._dataForConnection[con]
+          if con.congested and len(alldata) <= con.SEND_LOW_WATER:
+            core.callLater(con._check_backpressure)
+
+        if len(self._dataForConnection) == 0:
+          self.sending = False
+
+
+class SendFlusher (Task):
+  """
+  Sends what connections queued up while the last task ran
+
+  Connection.send() queues the data and wakes this task, which runs once
+  the task doing the sending yields, so everything a handler sends to a
+  switch goes out in one sendmsg() rather than a send() per message.
+  """
+  def __init__ (self):
+    Task.__init__(self)
+    self._lock = threading.Lock()
+    self._connections = []
+    self._scheduled = False
+
+  def add (self, con):
+    """
+    Have con's queued data sent soon
+    """
+    with self._lock:
+      self._connections.append(con)
+      if self._scheduled: return
+      self._scheduled = True
+    core.scheduler.schedule(self)
+
+  def run (self):
+    while True:
+      with self._lock:
+        cons = self._connections
+        self._connections = []
+        self._scheduled = False
+      for con in cons:
+        try:
+          con._flush()
+        except:
+          log.exception("Exception sending to %s", con)
+      yield False # Until add() wakes us
+
 
 class DummyOFNexus (object):
   def raiseEventNoErrors (self, event, *args, **kw):
@@ -734,11 +764,23 @@ class Connection (EventMixin):
     FlowRemoved,
     FeaturesReceived,
     ConfigurationReceived,
+    Backpressure,
   ])
 
   # Globally unique identifier for the Connection instance
   ID = 0
 
+  # Unsent bytes above which Backpressure is raised, and below which it's
+  # raised again once it has drained
+  SEND_HIGH_WATER = 1 << 20
+  SEND_LOW_WATER = 1 << 18
+
+  # Bounds on how much each read() asks the socket for.  The size adapts
+  # to how much is arriving: it doubles while reads fill it and halves
+  # when they use less than a quarter of it.
+  RECV_MIN = 4096
+  RECV_MAX = 1 << 18
+
   _aborted_connections = 0
 
   def msg (self, m):
@@ -757,7 +799,15 @@ class Connection (EventMixin):
 
     self.ofnexus = _dummyOFNexus
     self.sock = sock
-    self.buf = b''
+
+    # Receive buffer.  Unprocessed data is buf[_buf_start:_buf_end]; it's
+    # received straight into the space after it, and moved to the front
+    # (or the buffer grown) only when that runs out.
+    self.buf = bytearray(self.RECV_MIN)
+    self._buf_start = 0
+    self._buf_end = 0
+    self._recv_size = self.RECV_MIN
+
     Connection.ID += 1
     self.ID = Connection.ID
 
@@ -780,6 +830,21 @@ class Connection (EventMixin):
     self.connect_time = None
     self.idle_time = time.time()
 
+    # Data sent since the last flush, which will go out together, and how
+    # many bytes of it there are
+    self._send_queue = []
+    self._send_queued = 0
+    self._send_lock = threading.Lock()
+
+    # Whether we've raised Backpressure for too much unsent data
+    self.congested = False
+
+    # Plain sockets can take the queue as it is; others (SSL, captures)
+    # get it joined up
+    self._sendmsg = None
+    if type(sock) is socket.socket and hasattr(sock, 'sendmsg'):
+      self._sendmsg = sock.sendmsg
+
     self.send(of.ofp_hello())
 
     self.original_ports = PortCollection()
@@ -824,6 +889,9 @@ class Connection (EventMixin):
     """
     disconnect this Connection (usually not invoked manually).
     """
+    if not self.disconnected:
+      # Send anything still queued (an error message, say) first
+      self._flush()
     if self.disconnected:
       self.msg("already disconnected")
     if self.dpid is None:
@@ -865,6 +933,9 @@ class Connection (EventMixin):
 
     Data should probably either be raw bytes in OpenFlow wire format, or
     an OpenFlow controller-to-switch message object from libopenflow.
+
+    The data is queued, and everything sent to the switch before the
+    current task yields goes out together; see SendFlusher.
     """
     if self.disconnected: return
     if type(data) is not bytes:
@@ -874,64 +945,180 @@ class Connection (EventMixin):
       assert isinstance(data, of.ofp_header)
       data = data.pack()
 
-    if deferredSender.sending:
-      log.debug("deferred sender is sending!")
-      deferredSender.send(self, data)
+    with self._send_lock:
+      self._send_queue.append(data)
+      self._send_queued += len(data)
+      first = len(self._send_queue) == 1
+      queued = self._send_queued
+    if queued > self.SEND_HIGH_WATER and not self.congested:
+      self._check_backpressure()
+    if first:
+      if sendFlusher is None:
+        self._flush()
+      else:
+        sendFlusher.add(self)
+
+  def _flush (self):
+    """
+    Send everything queued, with one system call if the socket takes it
+    """
+    with self._send_lock:
+      queue = self._send_queue
+      total = self._send_queued
+      if not queue: return
+      self._send_queue = []
+      self._send_queued = 0
+    if self.disconnected: return
+
+    if deferredSender is not None and deferredSender.pending(self):
+      # Keep it in order behind what's already waiting
+      deferredSender.send(self, b''.join(queue))
+      self._check_backpressure()
       return
     try:
-      l = self.sock.send(data)
-      if l != len(data):
+      if len(queue) == 1:
+        l = self.sock.send(queue[0])
+      elif self._sendmsg is not None and len(queue) <= _IOV_MAX:
+        l = self._sendmsg(queue)
+      else:
+        queue = [b''.join(queue)]
+        l = self.sock.send(queue[0])
+      if l != total:
         self.msg("Didn't send complete buffer.")
-        data = data[l:]
-        deferredSender.send(self, data)
+        deferredSender.send(self, b''.join(queue)[l:])
     except socket.error as e:
       if e.errno == EAGAIN:
         self.msg("Out of send buffer space.  " +
                  "Consider increasing SO_SNDBUF.")
-        deferredSender.send(self, data)
+        deferredSender.send(self, b''.join(queue))
       else:
         self.msg("Socket error: " + e.strerror)
         self.disconnect(defer_event=True)
+        return
+    if self.congested or (deferredSender is not None and deferredSender.sending):
+      self._check_backpressure()
+
+  @property
+  def send_queue_bytes (self):
+    """
+    How many bytes sent to this connection haven't gone out yet
+    """
+    queued = self._send_queued
+    if deferredSender is not None:
+      queued += deferredSender.pending(self)
+    return queued
+
+  def _check_backpressure (self):
+    """
+    Raise Backpressure if the unsent data went over or back under the marks
+    """
+    queued = self.send_queue_bytes
+    if self.congested:
+      if queued > self.SEND_LOW_WATER: return
+      self.congested = False
+    else:
+      if queued <= self.SEND_HIGH_WATER: return
+      self.congested = True
+      self.msg("%i bytes waiting to be sent" % (queued,))
+    if self.dpid is not None:
+      self.ofnexus.raiseEventNoErrors(Backpressure, self, self.congested, queued)
+      self.raiseEventNoErrors(Backpressure, self, self.congested, queued)
+
+  def _make_room (self, size):
+    """
+    Make sure there's room to receive size more bytes into buf
+    """
+    start = self._buf_start
+    end = self._buf_end
+    if start:
+      # Move what's left of a partial message to the front
+      self.buf[:end - start] = self.buf[start:end]
+      self._buf_start = 0
+      self._buf_end = end = end - start
+    if len(self.buf) - end < size:
+      self.buf.extend(bytes(max(len(self.buf), end + size - len(self.buf))))
 
   def read (self):
     """
     Read data from this connection.  Generally this is just called by the
     main OpenFlow loop below.
 
+    Data is received into a reused buffer.  Once per read, what's in it is
+    copied out as one bytes object and the messages are unpacked from
+    that, so they (and the packets in them) don't hold on to the buffer.
+    Only a partial message at the end is left behind for the next read.
+
     Note: This function will block if data is not available.
     """
+    size = self._recv_size
+    if len(self.buf) - self._buf_end < size:
+      self._make_room(size)
+    start = self._buf_start
+    end = self._buf_end
     try:
-      d = self.sock.recv(2048)
+      with memoryview(self.buf) as view:
+        l = self.sock.recv_into(view[end:end + size], size)
+        # Everything received so far is copied out once, and the complete
+        # messages are unpacked from that; a partial one is left in buf
+        data = view[start:end + l].tobytes()
     except:
       return False
-    if len(d) == 0:
+    if l == 0:
       return False
-    self.buf += d
-    buf_len = len(self.buf)
+    end += l
+    self._buf_end = end
+
+    if l == size:
+      self._recv_size = min(size * 2, self.RECV_MAX)
+    elif l < size // 4:
+      self._recv_size = max(size // 2, self.RECV_MIN)
+
+    data_len = end - start
+    offset, ok = self._handle_data(data)
+
+    if offset == data_len:
+      self._buf_start = self._buf_end = 0
+      if len(self.buf) > 4 * self._recv_size:
+        # Give back what a burst needed
+        self.buf = bytearray(self._recv_size)
+    else:
+      self._buf_start = start + offset
 
+    return ok
+
+  def _handle_data (self, data):
+    """
+    Unpack and handle the complete messages at the start of data
+
+    Returns how many bytes they took up, and False if the connection
+    should be thrown away.
+    """
+    data_len = len(data)
+    ok = True
 
     offset = 0
-    while buf_len - offset >= 8: # 8 bytes is minimum OF message size
+    while data_len - offset >= 8: # 8 bytes is minimum OF message size
       # We pull the first four bytes of the OpenFlow header off by hand
       # to find the version/length/type so that we can correctly call
       # libopenflow to unpack it.
 
-      ofp_type = self.buf[offset+1]
+      ofp_type = data[offset+1]
 
-      if self.buf[offset] != of.OFP_VERSION:
+      if data[offset] != of.OFP_VERSION:
         if ofp_type == of.OFPT_HELLO:
           # We let this through and hope the other side switches down.
           pass
         else:
           log.warning("Bad OpenFlow version (0x%02x) on connection %s"
-                      % (self.buf[offset], self))
-          return False # Throw connection away
+                      % (data[offset], self))
+          ok = False # Throw connection away
+          break
 
-      msg_length = self.buf[offset+2] << 8 | self.buf[offset+3]
+      msg_length = data[offset+2] << 8 | data[offset+3]
 
-      if buf_len - offset < msg_length: break
+      if data_len - offset < msg_length: break
 
-      new_offset,msg = self.unpackers[ofp_type](self.buf, offset)
+      new_offset,msg = self.unpackers[ofp_type](data, offset)
       assert new_offset - offset == msg_length
       offset = new_offset
 
@@ -944,10 +1131,7 @@ class Connection (EventMixin):
                       ("\n" + str(self) + " ").join(str(msg).split('\n')))
         continue
 
-    if offset != 0:
-      self.buf = self.buf[offset:]
-
-    return True
+    return offset, ok
 
   def _incoming_stats_reply (self, ofp):
     # This assumes that you don't receive multiple stats replies
@@ -1014,12 +1198,26 @@ class OpenFlow_01_Task (Task):
   """
   The main recoco thread for listening to openflow messages
   """
+  # How many connections the epoll loop accepts each time the listener
+  # is ready
+  ACCEPT_BATCH = 64
+
+  # Whether listeners set SO_REUSEPORT, so that several processes can
+  # listen on the same port, when they're not told (lb.sharding sets it)
+  REUSE_PORT = False
+
   def __init__ (self, port = 6633, address = '0.0.0.0',
-                ssl_key = None, ssl_cert = None, ssl_ca_cert = None):
+                ssl_key = None, ssl_cert = None, ssl_ca_cert = None,
+                epoll = False, reuse_port = None):
     """
     Initialize
 
-    This listener will be for SSL connections if the SSL params are specified
+    This listener will be for SSL connections if the SSL params are specified.
+    With epoll, connections are served from an epoll object of its own
+    rather than with a Select over all of them.  With reuse_port, other
+    processes can listen on the same port, and the kernel spreads the
+    connections over them (None means REUSE_PORT as it is when listening
+    starts).
     """
     Task.__init__(self)
     self.port = int(port)
@@ -1028,6 +1226,11 @@ class OpenFlow_01_Task (Task):
     self.ssl_key = ssl_key
     self.ssl_cert = ssl_cert
     self.ssl_ca_cert = ssl_ca_cert
+    self.epoll = epoll
+    if epoll and not hasattr(select, 'epoll'):
+      log.warn("epoll is not available; using select")
+      self.epoll = False
+    self.reuse_port = reuse_port
 
     if self.ssl_key or self.ssl_cert or ssl_ca_cert:
       global ssl
@@ -1049,12 +1252,20 @@ class OpenFlow_01_Task (Task):
     self.started = True
     return super(OpenFlow_01_Task,self).start()
 
-  def run (self):
-    # List of open sockets/connections to select on
-    sockets = []
-
+  def _listen (self):
+    """
+    Returns a listening socket, or None if it couldn't be bound
+    """
     listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    reuse_port = self.reuse_port
+    if reuse_port is None:
+      reuse_port = self.REUSE_PORT
+    if reuse_port:
+      if not hasattr(socket, 'SO_REUSEPORT'):
+        log.error("SO_REUSEPORT is not available")
+        return None
+      listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     try:
       listener.bind((self.address, self.port))
     except socket.error as e:
@@ -1067,14 +1278,109 @@ class OpenFlow_01_Task (Task):
         log.error(" You may have another controller running.")
         log.error(" Use openflow.of_01 --port=<port> to run POX on "
                   "another port.")
-      return
+      return None
 
-    listener.listen(16)
+    # A small backlog makes a crowd of switches connecting at once wait
+    # on SYN retries
+    listener.listen(socket.SOMAXCONN)
     listener.setblocking(0)
-    sockets.append(listener)
 
     log.debug("Listening on %s:%s" %
               (self.address, self.port))
+    return listener
+
+  def _accept (self, listener):
+    """
+    Accepts a connection on the listener
+
+    Returns its Connection, or None if SSL negotiation failed.
+    """
+    new_sock = listener.accept()[0]
+
+    if self.ssl_key or self.ssl_cert or self.ssl_ca_cert:
+      cert_reqs = ssl.CERT_REQUIRED
+      if self.ssl_ca_cert is None:
+        cert_reqs = ssl.CERT_NONE
+      new_sock = ssl.wrap_socket(new_sock, server_side=True,
+          keyfile = self.ssl_key, certfile = self.ssl_cert,
+          ca_certs = self.ssl_ca_cert, cert_reqs = cert_reqs,
+          do_handshake_on_connect = False,
+          suppress_ragged_eofs = True)
+      #FIXME: We currently do a blocking handshake so that SSL errors
+      #       can't occur out of the blue later.  This isn't a good
+      #       thing, but getting around it will take some effort.
+      try:
+        new_sock.setblocking(1)
+        new_sock.do_handshake()
+      except ssl.SSLError as exc:
+        if exc.errno == 8 and "EOF occurred" in exc.strerror:
+          # Annoying, but just ignore
+          pass
+        else:
+          #log.exception("SSL negotiation failed")
+          log.warn("SSL negotiation failed: " + str(exc))
+        return None
+
+    if pox.openflow.debug.pcap_traces:
+      new_sock = wrap_socket(new_sock)
+    new_sock.setblocking(0)
+    # Note that instantiating a Connection object fires a
+    # ConnectionUp event (after negotation has completed)
+    return Connection(new_sock)
+
+  def _handle_exception (self, con, listener):
+    """
+    Logs an exception raised while servicing con (or the listener)
+
+    Returns True if it was the listener and it can't go on, in which case
+    it's been closed.  A connection is left for the caller to close.
+    """
+    def log_tb ():
+      log.exception("Exception reading connection " + str(con))
+
+    sock_error = None
+    exc = sys.exc_info()[1]
+    if isinstance(exc, socket.error):
+      sock_error = exc.errno
+
+    if con is listener:
+      if sock_error == ECONNRESET:
+        log.info("Connection reset")
+      elif sock_error == EMFILE:
+        log.error("Couldn't accept connection: out of file descriptors.")
+      else:
+        log_tb()
+        log.error("Exception on OpenFlow listener.  Aborting.")
+        try:
+          listener.close()
+        except:
+          pass
+        return True
+    else:
+      # Normal socket
+      if sock_error == ECONNRESET:
+        con.info("Connection reset")
+      else:
+        log_tb()
+    return False
+
+  def run (self):
+    listener = self._listen()
+    if listener is None:
+      return
+
+    if self.epoll:
+      yield from self._run_epoll(listener)
+    else:
+      yield from self._run_select(listener)
+
+    log.debug("No longer listening for connections")
+
+    #pox.core.quit()
+
+  def _run_select (self, listener):
+    # List of open sockets/connections to select on
+    sockets = [listener]
 
     con = None
     while core.running:
@@ -1101,39 +1407,9 @@ class OpenFlow_01_Task (Task):
           timestamp = time.time()
           for con in rlist:
             if con is listener:
-              new_sock = listener.accept()[0]
-
-              if self.ssl_key or self.ssl_cert or self.ssl_ca_cert:
-                cert_reqs = ssl.CERT_REQUIRED
-                if self.ssl_ca_cert is None:
-                  cert_reqs = ssl.CERT_NONE
-                new_sock = ssl.wrap_socket(new_sock, server_side=True,
-                    keyfile = self.ssl_key, certfile = self.ssl_cert,
-                    ca_certs = self.ssl_ca_cert, cert_reqs = cert_reqs,
-                    do_handshake_on_connect = False,
-                    suppress_ragged_eofs = True)
-                #FIXME: We currently do a blocking handshake so that SSL errors
-                #       can't occur out of the blue later.  This isn't a good
-                #       thing, but getting around it will take some effort.
-                try:
-                  new_sock.setblocking(1)
-                  new_sock.do_handshake()
-                except ssl.SSLError as exc:
-                  if exc.errno == 8 and "EOF occurred" in exc.strerror:
-                    # Annoying, but just ignore
-                    pass
-                  else:
-                    #log.exception("SSL negotiation failed")
-                    log.warn("SSL negotiation failed: " + str(exc))
-                  continue
-
-              if pox.openflow.debug.pcap_traces:
-                new_sock = wrap_socket(new_sock)
-              new_sock.setblocking(0)
-              # Note that instantiating a Connection object fires a
-              # ConnectionUp event (after negotation has completed)
-              newcon = Connection(new_sock)
-              sockets.append( newcon )
+              newcon = self._accept(listener)
+              if newcon is not None:
+                sockets.append( newcon )
               #print str(newcon) + " connected"
             else:
               con.idle_time = timestamp
@@ -1143,35 +1419,9 @@ class OpenFlow_01_Task (Task):
       except KeyboardInterrupt:
         break
       except:
-        def log_tb ():
-          log.exception("Exception reading connection " + str(con))
-
-        do_break = False # Break OpenFlow loop?
-        do_close = True # Close this socket?
-
-        sock_error = None
-        if sys.exc_info()[0] is socket.error:
-          sock_error = sys.exc_info()[1][0]
-
-        if con is listener:
-          do_close = False
-          if sock_error == ECONNRESET:
-            con.info("Connection reset")
-          elif sock_error == EMFILE:
-            log.error("Couldn't accept connection: out of file descriptors.")
-          else:
-            do_close = True
-            log_tb()
-            log.error("Exception on OpenFlow listener.  Aborting.")
-            do_break = True
-        else:
-          # Normal socket
-          if sock_error == ECONNRESET:
-            con.info("Connection reset")
-          else:
-            log_tb()
+        do_break = self._handle_exception(con, listener)
 
-        if do_close:
+        if con is not listener:
           try:
             con.close()
           except:
@@ -1185,18 +1435,95 @@ class OpenFlow_01_Task (Task):
           # Leave the OpenFlow loop
           break
 
-    log.debug("No longer listening for connections")
+  def _run_epoll (self, listener):
+    """
+    Serves connections with epoll
 
-    #pox.core.quit()
+    Each socket is registered with one epoll object when it's accepted,
+    and the task waits on the epoll object's own descriptor, which is
+    readable whenever any of them is.  Then only the sockets which are
+    ready get looked at, found by file descriptor.
+    """
+    poller = select.epoll()
+    listener_fd = listener.fileno()
+    poller.register(listener_fd, select.EPOLLIN)
+
+    # File descriptor -> Connection
+    connections = {}
+
+    def drop (fd):
+      con = connections.pop(fd, None)
+      try:
+        poller.unregister(fd)
+      except:
+        pass
+      if con is not None:
+        try:
+          con.close()
+        except:
+          pass
+
+    try:
+      while core.running:
+        rlist, wlist, elist = yield Select([poller], [], [], 5)
+        if not rlist:
+          # Quiet for a while; forget connections closed elsewhere
+          for fd, con in list(connections.items()):
+            try:
+              if con.fileno() == fd: continue
+            except:
+              pass
+            drop(fd)
+          continue
+
+        timestamp = time.time()
+        for fd, event in poller.poll(0):
+          con = None
+          try:
+            if fd == listener_fd:
+              con = listener
+              for _ in range(self.ACCEPT_BATCH):
+                try:
+                  newcon = self._accept(listener)
+                except BlockingIOError:
+                  break
+                if newcon is None: continue
+                new_fd = newcon.fileno()
+                drop(new_fd) # Its descriptor's previous owner is gone
+                connections[new_fd] = newcon
+                poller.register(new_fd, select.EPOLLIN)
+              continue
+
+            con = connections.get(fd)
+            if con is None:
+              drop(fd)
+            elif event & select.EPOLLIN:
+              con.idle_time = timestamp
+              if con.read() is False:
+                drop(fd)
+            elif event & (select.EPOLLERR | select.EPOLLHUP):
+              drop(fd)
+          except KeyboardInterrupt:
+            return
+          except:
+            if self._handle_exception(con, listener):
+              return
+            if con is not listener:
+              drop(fd)
+    finally:
+      for fd in list(connections):
+        drop(fd)
+      poller.close()
 
 
 
 # Used by the Connection class
 deferredSender = None
+sendFlusher = None
 
 def launch (port=6633, address="0.0.0.0", name=None,
             private_key=None, certificate=None, ca_cert=None,
-            __INSTANCE__=None):
+            epoll=False, reuse_port=None, __INSTANCE__=None):
   """
   Start a listener for OpenFlow connections
 
@@ -1204,6 +1531,13 @@ def launch (port=6633, address="0.0.0.0", name=None,
   combinations and pointing to reasonable key/cert files.  These have the same
   meanings as with Open vSwitch's old test controller, but they are more
   flexible (e.g., ca-cert can be skipped).
+
+  --epoll serves the connections from an epoll object of the listener's
+  own, so that only the switches with something to read are visited,
+  which scales to thousands of them (Linux only).
+
+  --reuse_port sets SO_REUSEPORT, so that other processes can listen on
+  the same port and share the switches' connections.
   """
   if name is None:
     basename = "of_01"
@@ -1217,15 +1551,21 @@ def launch (port=6633, address="0.0.0.0", name=None,
     log.warn("of_01 '%s' already started", name)
     return None
 
-  global deferredSender
+  global deferredSender, sendFlusher
   if not deferredSender:
     deferredSender = DeferredSender()
+  if not sendFlusher:
+    sendFlusher = SendFlusher()
+    sendFlusher.start()
 
   if of._logger is None:
     of._logger = core.getLogger('libopenflow_01')
 
   l = OpenFlow_01_Task(port = int(port), address = address,
                        ssl_key = private_key, ssl_cert = certificate,
-                       ssl_ca_cert = ca_cert)
+                       ssl_ca_cert = ca_cert,
+                       epoll = pox.lib.util.str_to_bool(epoll),
+                       reuse_port = reuse_port if reuse_port is None
+                           else pox.lib.util.str_to_bool(reuse_port))
   core.register(name, l)
   return l
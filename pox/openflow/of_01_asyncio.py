@@ -0,0 +1,353 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+OpenFlow 1.0 switch connections over asyncio streams
+
+This is a listener like of_01's, but its connections are served by an
+asyncio event loop on a thread of its own rather than by recoco's
+SelectHub and of_01's DeferredSender thread.  A connection is an of_01
+Connection, so the handshake, handlers and events are all the same and
+components can't tell the difference: what's read from a switch is
+handed to POX's scheduler with core.callLater and handled there, and
+what's sent to a switch goes back to the loop, where everything sent
+before it gets to run is written at once.  The stream's transport keeps
+what the socket hasn't taken yet, and Backpressure is raised from how
+much that is.  Reading from a switch stops while POX is more than
+READ_HIGH_WATER bytes behind with it.
+
+uvloop's event loop is used if uvloop is installed (--uvloop=False not
+to).  The loop is the listener's .loop, so other asyncio code, such as a
+telemetry exporter, can run on it too:
+
+  asyncio.run_coroutine_threadsafe(export(), core.of_01.loop)
+
+Use it in place of of_01; it registers as of_01 so that the default one
+isn't started:
+  ./pox.py openflow.of_01_asyncio --port=6633 forwarding.l2_learning
+"""
+
+import asyncio
+import socket
+import threading
+import time
+from collections import deque
+
+from pox.core import core
+import pox
+import pox.lib.util
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.of_01 import Connection, OpenFlow_01_Task
+
+log = core.getLogger()
+
+
+class StreamSocket (object):
+  """
+  The parts of a socket a Connection uses, for an asyncio stream
+
+  It can be used from any thread; closing happens on the loop, after
+  whatever was already written.
+  """
+  def __init__ (self, loop, writer):
+    self._loop = loop
+    self._writer = writer
+
+  def fileno (self):
+    sock = self._writer.get_extra_info('socket')
+    return -1 if sock is None else sock.fileno()
+
+  def getpeername (self):
+    return self._writer.get_extra_info('peername')
+
+  def shutdown (self, how):
+    self.close()
+
+  def close (self):
+    self._loop.call_soon_threadsafe(self._close)
+
+  def _close (self):
+    if not self._writer.is_closing():
+      self._writer.close()
+
+
+class AsyncioConnection (Connection):
+  """
+  A Connection whose data comes and goes by way of an asyncio stream
+
+  It's made on the loop; the rest of POX uses it from the scheduler.
+  """
+  # Bytes read but not yet handled above which reading stops, and below
+  # which it starts again
+  READ_HIGH_WATER = 1 << 20
+  READ_LOW_WATER = 1 << 18
+
+  def __init__ (self, loop, writer):
+    self.loop = loop
+    self.writer = writer
+
+    # The start of a message whose end hasn't been read yet
+    self._partial = b''
+
+    # How much has been read but not handled, and whether reading waits
+    # for it to be
+    self._unhandled = 0
+    self._read_paused = False
+    self._read_lock = threading.Lock()
+    self._can_read = asyncio.Event()
+
+    writer.transport.set_write_buffer_limits(high=self.SEND_HIGH_WATER,
+                                             low=self.SEND_LOW_WATER)
+
+    Connection.__init__(self, StreamSocket(loop, writer))
+
+  def _call_on_loop (self, f):
+    try:
+      self.loop.call_soon_threadsafe(f)
+    except RuntimeError:
+      # The loop is closed
+      pass
+
+  def _flush (self):
+    """
+    Have the loop write everything queued
+    """
+    self._call_on_loop(self._write)
+
+  def _write (self):
+    with self._send_lock:
+      queue = self._send_queue
+      if not queue: return
+      self._send_queue = []
+      self._send_queued = 0
+    if self.writer.is_closing(): return
+    self.writer.writelines(queue)
+    if (not self.congested and
+        self.writer.transport.get_write_buffer_size() > self.SEND_HIGH_WATER):
+      core.callLater(self._check_backpressure)
+      asyncio.ensure_future(self._drained())
+
+  async def _drained (self):
+    """
+    Wait for the transport to get down to SEND_LOW_WATER
+    """
+    try:
+      await self.writer.drain()
+    except ConnectionError:
+      return
+    core.callLater(self._check_backpressure)
+
+  @property
+  def send_queue_bytes (self):
+    """
+    How many bytes sent to this connection haven't gone out yet
+    """
+    transport = self.writer.transport
+    if transport.is_closing():
+      return self._send_queued
+    return self._send_queued + transport.get_write_buffer_size()
+
+  def _received (self, size):
+    """
+    Count data read, returning True if reading should wait (on the loop)
+    """
+    with self._read_lock:
+      self._unhandled += size
+      if self._unhandled > self.READ_HIGH_WATER:
+        self._read_paused = True
+        self._can_read.clear()
+      return self._read_paused
+
+  def _handle (self, data):
+    """
+    Handle data read from the switch (on the scheduler)
+    """
+    with self._read_lock:
+      self._unhandled -= len(data)
+      resume = self._read_paused and self._unhandled <= self.READ_LOW_WATER
+      if resume:
+        self._read_paused = False
+    if resume:
+      self._call_on_loop(self._can_read.set)
+    if self.disconnected: return
+
+    self.idle_time = time.time()
+    if self._partial:
+      data = self._partial + data
+    offset, ok = self._handle_data(data)
+    self._partial = data[offset:]
+    if not ok:
+      self.close()
+
+  def _lost (self):
+    """
+    The switch went away (on the scheduler)
+    """
+    if not self.disconnected:
+      self.close()
+
+
+class OpenFlow_01_Asyncio (object):
+  """
+  Listens for OpenFlow connections on an asyncio event loop
+  """
+  # How much each read of a connection asks for
+  READ_SIZE = 1 << 16
+
+  def __init__ (self, port = 6633, address = '0.0.0.0', use_uvloop = None):
+    """
+    Initialize
+
+    uvloop's loop is used if it's installed, unless use_uvloop is False.
+    """
+    self.port = int(port)
+    self.address = address
+    self.loop = _new_loop(use_uvloop)
+    self.server = None
+    self._thread = None
+
+    # Calls for the scheduler from the loop, made in order by _run_calls.
+    # It's only handed to callLater when the queue was empty, so a burst
+    # of reads costs the scheduler one wakeup.
+    self._calls = deque()
+
+    core.addListener(pox.core.GoingUpEvent, self._handle_GoingUpEvent)
+    core.addListener(pox.core.GoingDownEvent, self._handle_GoingDownEvent)
+
+  def _handle_GoingUpEvent (self, event):
+    self.start()
+
+  def _handle_GoingDownEvent (self, event):
+    self.stop()
+
+  def start (self):
+    if self._thread is not None:
+      return
+    # Everything read comes to the scheduler by way of callLater.  Have
+    # it make the pipe it's woken with now, as a select() SelectHub can't
+    # take it once thousands of switches have taken the low descriptors.
+    core.callLater(self._run_calls)
+    self._thread = threading.Thread(target=self._run, name="of_01_asyncio")
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop (self):
+    try:
+      self.loop.call_soon_threadsafe(self.loop.stop)
+    except RuntimeError:
+      pass
+
+  def _run (self):
+    asyncio.set_event_loop(self.loop)
+    try:
+      self.server = self.loop.run_until_complete(
+          asyncio.start_server(self._serve, self.address, self.port,
+                               reuse_address = True,
+                               reuse_port = OpenFlow_01_Task.REUSE_PORT,
+                               backlog = socket.SOMAXCONN))
+    except OSError as e:
+      log.error("Error %s while binding %s:%s: %s",
+                e.errno, self.address, self.port, e.strerror)
+      self.loop.close()
+      return
+    log.debug("Listening on %s:%s", self.address, self.port)
+
+    try:
+      self.loop.run_forever()
+    finally:
+      self.server.close()
+      # Let the connections see they're done with
+      tasks = asyncio.all_tasks(self.loop)
+      for task in tasks:
+        task.cancel()
+      self.loop.run_until_complete(asyncio.gather(*tasks,
+                                                  return_exceptions = True))
+      self.loop.close()
+      log.debug("No longer listening for connections")
+
+  async def _serve (self, reader, writer):
+    con = AsyncioConnection(self.loop, writer)
+    try:
+      while True:
+        try:
+          data = await reader.read(self.READ_SIZE)
+        except ConnectionError:
+          break
+        if not data:
+          break
+        paused = con._received(len(data))
+        self._call(con._handle, data)
+        if paused:
+          await con._can_read.wait()
+    finally:
+      self._call(con._lost)
+
+  def _call (self, f, *args):
+    """
+    Have f called on the scheduler (from the loop)
+    """
+    self._calls.append((f, args))
+    if len(self._calls) == 1:
+      core.callLater(self._run_calls)
+
+  def _run_calls (self):
+    calls = self._calls
+    while calls:
+      f, args = calls.popleft()
+      try:
+        f(*args)
+      except:
+        log.exception("Exception calling %s", f)
+
+
+def _new_loop (use_uvloop):
+  """
+  A new event loop; uvloop's unless it's unwanted or not installed
+  """
+  if use_uvloop is not False:
+    try:
+      import uvloop
+      return uvloop.new_event_loop()
+    except ImportError:
+      if use_uvloop:
+        log.warn("uvloop is not installed; using asyncio's own loop")
+  return asyncio.new_event_loop()
+
+
+def launch (port=6633, address="0.0.0.0", name=None, uvloop=None):
+  """
+  Start a listener for OpenFlow connections served by asyncio
+
+  --uvloop=False uses asyncio's own event loop even if uvloop is there.
+  """
+  if name is None:
+    basename = "of_01"
+    counter = 1
+    name = basename
+    while core.hasComponent(name):
+      counter += 1
+      name = "%s-%s" % (basename, counter)
+
+  if core.hasComponent(name):
+    log.warn("of_01 '%s' already started", name)
+    return None
+
+  if of._logger is None:
+    of._logger = core.getLogger('libopenflow_01')
+
+  if uvloop is not None:
+    uvloop = pox.lib.util.str_to_bool(uvloop)
+
+  l = OpenFlow_01_Asyncio(port = int(port), address = address,
+                          use_uvloop = uvloop)
+  core.register(name, l)
+  return l
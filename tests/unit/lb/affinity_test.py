@@ -0,0 +1,74 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.addresses import IPAddr
+from lb.affinity import AffinityTable, pack_key
+
+CLIENT = IPAddr("10.0.0.5")
+VIP = IPAddr("10.0.0.9")
+
+
+def key(port):
+    return pack_key(CLIENT, VIP, 6, port, 5001)
+
+
+class AffinityTableTest(unittest.TestCase):
+    def test_pack_key(self):
+        self.assertNotEqual(key(1000), key(1001))
+        self.assertNotEqual(key(1000), pack_key(VIP, CLIENT, 6, 1000, 5001))
+        self.assertEqual(key(1000), key(1000))
+
+    def test_lookup(self):
+        t = AffinityTable(ttl=10)
+        self.assertIsNone(t.lookup(key(1), now=0))
+        t.insert(key(1), "s1", now=0)
+        self.assertEqual(t.lookup(key(1), now=1), "s1")
+        self.assertEqual(len(t), 1)
+
+    def test_expiry(self):
+        t = AffinityTable(ttl=10)
+        t.insert(key(1), "s1", now=0)
+        t.insert(key(2), "s2", now=0)
+        # Using an entry keeps it alive
+        for now in range(1, 30, 5):
+            self.assertEqual(t.lookup(key(1), now=now), "s1")
+        self.assertIsNone(t.lookup(key(2), now=30))
+        self.assertEqual(len(t), 1)
+        t.expire(now=100)
+        self.assertEqual(len(t), 0)
+        self.assertEqual(sum(len(s) for s in t._wheel), 0)
+
+    def test_remove(self):
+        t = AffinityTable(ttl=10)
+        t.insert(key(1), "s1", now=0)
+        self.assertTrue(t.remove(key(1)))
+        self.assertFalse(t.remove(key(1)))
+        self.assertIsNone(t.lookup(key(1), now=1))
+        self.assertEqual(len(t), 0)
+        # Putting it back doesn't leave it in the wheel twice
+        t.insert(key(1), "s2", now=2)
+        self.assertEqual(sum(len(s) for s in t._wheel), 1)
+        self.assertEqual(t.lookup(key(1), now=3), "s2")
+
+    def test_remove_backend(self):
+        t = AffinityTable(ttl=10)
+        for port in range(10):
+            t.insert(key(port), "s%i" % (port % 2), now=0)
+        self.assertEqual(t.remove_backend("s0"), 5)
+        self.assertEqual(len(t), 5)
+        self.assertIsNone(t.lookup(key(0), now=1))
+        self.assertEqual(t.lookup(key(1), now=1), "s1")
+
+    def test_bounded(self):
+        t = AffinityTable(ttl=10, max_entries=100)
+        for port in range(1000):
+            t.insert(key(port), "s1", now=port / 100.0)
+        self.assertLessEqual(len(t), 100)
+        # The newest ones survive
+        self.assertEqual(t.lookup(key(999), now=10), "s1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet, ETHER_BROADCAST
+from pox.lib.packet.arp import arp
+from lb.arp import ArpResponder, punt_rule
+
+VIP = IPAddr("10.0.0.9")
+VMAC = EthAddr("00:00:00:00:00:09")
+CLIENT = IPAddr("10.0.0.5")
+CLIENT_MAC = EthAddr("00:00:00:00:00:05")
+
+
+def arp_packet(opcode, protodst, src=CLIENT, src_mac=CLIENT_MAC):
+    a = arp(opcode=opcode, protosrc=src, hwsrc=src_mac, protodst=protodst)
+    e = ethernet(type=ethernet.ARP_TYPE, src=src_mac, dst=ETHER_BROADCAST)
+    e.payload = a
+    return e.pack()
+
+
+class ArpResponderTest(unittest.TestCase):
+    def setUp(self):
+        self.responder = ArpResponder()
+        self.responder.add(VIP, VMAC)
+
+    def test_reply(self):
+        data = self.responder.reply(arp_packet(arp.REQUEST, VIP), 3)
+        msg = of.ofp_packet_out()
+        self.assertEqual(msg.unpack(data), (len(data), len(data)))
+        self.assertEqual(msg.in_port, 3)
+        self.assertIsNone(msg.buffer_id)
+        self.assertEqual([a.port for a in msg.actions], [of.OFPP_IN_PORT])
+
+        e = ethernet(msg.data)
+        self.assertEqual((e.src, e.dst, e.type), (VMAC, CLIENT_MAC, ethernet.ARP_TYPE))
+        a = e.payload
+        self.assertEqual(a.opcode, arp.REPLY)
+        self.assertEqual((a.hwsrc, a.protosrc), (VMAC, VIP))
+        self.assertEqual((a.hwdst, a.protodst), (CLIENT_MAC, CLIENT))
+
+    def test_not_ours(self):
+        self.assertIsNone(self.responder.reply(arp_packet(arp.REQUEST, IPAddr("10.0.0.1")), 3))
+        self.assertIsNone(self.responder.reply(arp_packet(arp.REPLY, VIP), 3))
+        e = ethernet(type=ethernet.IP_TYPE, src=CLIENT_MAC, dst=VMAC)
+        self.assertIsNone(self.responder.reply(e.pack() + b'\0' * 28, 3))
+
+    def test_remove(self):
+        self.assertIn(VIP, self.responder)
+        self.responder.remove(VIP)
+        self.assertNotIn(VIP, self.responder)
+        self.assertIsNone(self.responder.reply(arp_packet(arp.REQUEST, VIP), 3))
+
+    def test_punt_rule(self):
+        msg = punt_rule(VIP)
+        self.assertEqual(msg.match.dl_type, ethernet.ARP_TYPE)
+        self.assertEqual(msg.match.nw_proto, arp.REQUEST)
+        self.assertEqual(msg.match.nw_dst, VIP)
+        self.assertEqual([a.port for a in msg.actions], [of.OFPP_CONTROLLER])
+        self.assertEqual(punt_rule(VIP, of.OFPFC_DELETE_STRICT).actions, [])
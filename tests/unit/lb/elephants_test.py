@@ -0,0 +1,80 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from lb.elephants import SpaceSaving, ElephantDetector, least_loaded_path
+
+
+class SpaceSavingTest(unittest.TestCase):
+    def test_exact_under_capacity(self):
+        sketch = SpaceSaving(4)
+        for key, count in [(1, 5), (2, 3), (1, 2), (3, 1)]:
+            sketch.add(key, count)
+        self.assertEqual(sketch.estimate(1), (7, 0))
+        self.assertEqual([k for k, c, e in sketch.top(2)], [1, 2])
+
+    def test_heavy_hitters_survive(self):
+        sketch = SpaceSaving(8)
+        # Two heavy keys among a thousand one-off mice
+        for i in range(1000):
+            sketch.add(1000 + i)
+            if i % 4 == 0:
+                sketch.add(1, 4)
+                sketch.add(2, 2)
+        self.assertEqual(len(sketch), 8)
+        self.assertEqual([k for k, c, e in sketch.top(2)], [1, 2])
+        count, error = sketch.estimate(1)
+        self.assertLessEqual(count - error, 1000)
+        self.assertGreaterEqual(count, 1000)
+
+    def test_decay(self):
+        sketch = SpaceSaving(4)
+        sketch.add(1, 10)
+        sketch.add(2, 1)
+        sketch.decay(0.5)
+        self.assertEqual(sketch.estimate(1), (5, 0))
+        self.assertNotIn(2, sketch)
+        sketch.add(3, 1)
+        sketch.add(4, 1)
+        sketch.add(5, 1)
+        sketch.add(6, 1)
+        self.assertIn(1, sketch)
+
+
+class ElephantDetectorTest(unittest.TestCase):
+    def test_elephants(self):
+        d = ElephantDetector(interval=1, min_rate=1000, top=2, decay=0.5)
+        for second in range(1, 6):
+            d.flow_sample(2, [('big', 5000 * second, 's1'), ('small', 100 * second, 's1'),
+                              ('mid', 1500 * second, 's3')])
+            found = d.elephants()
+            d.end_round()
+        self.assertEqual([(k, info) for k, info, rate in found], [('big', 's1'), ('mid', 's3')])
+        self.assertAlmostEqual(found[0][2], 5000, delta=500)
+
+    def test_counted_once(self):
+        d = ElephantDetector(interval=1, min_rate=1000)
+        d.flow_sample(2, [('f', 4000, None)])
+        d.flow_sample(4, [('f', 4000, None)])
+        self.assertEqual(d.sketch.estimate('f'), (4000, 0))
+        # Gone from switch 2, so switch 4 counts it from now on
+        d.flow_sample(2, [])
+        d.flow_sample(4, [('f', 6000, None)])
+        self.assertEqual(d.sketch.estimate('f'), (10000, 0))
+
+
+class LeastLoadedPathTest(unittest.TestCase):
+    def test_choice(self):
+        paths = [(5, 2, 1), (5, 2, 4, 1), (5, 2, 3, 1)]
+        load = {(5, 2): 10, (2, 1): 10, (2, 4): 3, (4, 1): 3}
+        # Every path starts with 5->2, so only what comes after counts
+        best, loads = least_loaded_path(paths, load)
+        self.assertEqual(best, (5, 2, 3, 1))
+        self.assertEqual(loads, {(5, 2, 1): 10, (5, 2, 4, 1): 3, (5, 2, 3, 1): 0})
+        load[(2, 3)] = 10
+        self.assertEqual(least_loaded_path(paths, load)[0], (5, 2, 4, 1))
+        load[(2, 4)] = 10
+        # Ties go to the shortest
+        self.assertEqual(least_loaded_path(paths, load)[0], (5, 2, 1))
+        self.assertEqual(least_loaded_path([], load), (None, {}))
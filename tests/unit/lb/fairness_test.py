@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from lb.fairness import SlidingCounts, FairnessStats, jain_index, max_over_mean
+
+
+class FairnessFunctionsTest(unittest.TestCase):
+    def test_jain_index(self):
+        self.assertEqual(jain_index([5, 5, 5, 5]), 1.0)
+        self.assertEqual(jain_index([8, 0, 0, 0]), 0.25)
+        self.assertEqual(jain_index([0, 0]), 1.0)
+        self.assertAlmostEqual(jain_index([1, 3]), 16 / 20.0)
+
+    def test_max_over_mean(self):
+        self.assertEqual(max_over_mean([2, 2, 2]), 1.0)
+        self.assertEqual(max_over_mean([6, 0, 0]), 3.0)
+        self.assertEqual(max_over_mean([0, 0]), 1.0)
+
+
+class SlidingCountsTest(unittest.TestCase):
+    def test_windows(self):
+        c = SlidingCounts(bucket=10, buckets=6)
+        c.add('a', 1, now=5)
+        c.add('a', 2, now=15)
+        c.add('b', 4, now=55)
+        self.assertEqual(c.totals(10, now=59), {'b': 4})
+        self.assertEqual(c.totals(60, now=59), {'a': 3, 'b': 4})
+        # The first bucket has slid out
+        self.assertEqual(c.totals(60, now=61), {'a': 2, 'b': 4})
+
+    def test_reused_bucket(self):
+        c = SlidingCounts(bucket=10, buckets=2)
+        c.add('a', 1, now=0)
+        c.add('a', 7, now=20)
+        self.assertEqual(c.totals(20, now=20), {'a': 7})
+        # Long enough ago that nothing is left
+        self.assertEqual(c.totals(20, now=100), {})
+
+
+class FairnessStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.stats = FairnessStats(windows=(60, 300), bucket=10, start=False)
+
+    def test_assignments(self):
+        s = self.stats
+        s.set_backends('web', ['s1', 's2'])
+        for i in range(3):
+            s.assigned('web', 's1', now=100)
+        s.assigned('web', 's2', now=100)
+        pool = s.report(now=100)['pools']['web']
+        self.assertEqual(pool['backends']['s1']['assignments'], {'60': 3, '300': 3})
+        self.assertEqual(pool['backends']['s2']['active'], 1)
+        self.assertEqual(pool['windows']['60']['assignments']['jain'], 16 / 20.0)
+        self.assertEqual(pool['windows']['60']['assignments']['max_over_mean'], 1.5)
+        # Out of the short window, but still in the long one
+        pool = s.report(now=200)['pools']['web']
+        self.assertEqual(pool['backends']['s1']['assignments'], {'60': 0, '300': 3})
+        self.assertEqual(pool['windows']['60']['assignments']['jain'], 1.0)
+
+    def test_idle_backends_count(self):
+        s = self.stats
+        s.set_backends('web', ['s1', 's2', 's3', 's4'])
+        s.assigned('web', 's1', now=0)
+        pool = s.report(now=0)['pools']['web']
+        self.assertEqual(pool['windows']['60']['assignments']['jain'], 0.25)
+        self.assertEqual(pool['active']['max_over_mean'], 4.0)
+        # Without set_backends only those seen count
+        s.assigned('other', 's9', now=0)
+        self.assertEqual(list(s.report(now=0)['pools']['other']['backends']), ['s9'])
+
+    def test_bytes_not_counted_twice(self):
+        s = self.stats
+        s.assigned('web', 's1', now=0)
+        s.flow_bytes('web', 's1', 'flow', 1000, now=0)
+        s.flow_bytes('web', 's1', 'flow', 1500, now=5)
+        s.finished('web', 's1', 'flow', 1800, now=10)
+        backend = s.report(now=10)['pools']['web']['backends']['s1']
+        self.assertEqual(backend['bytes']['60'], 1800)
+        self.assertEqual(backend['active'], 0)
+        # A flow the statistics never saw
+        s.finished('web', 's1', 'other', 200, now=10)
+        self.assertEqual(s.report(now=10)['pools']['web']['backends']['s1']['bytes']['60'],
+                         2000)
+        self.assertEqual(s._seen, {})
+
+    def test_stale_flows_forgotten(self):
+        s = self.stats
+        s.flow_bytes('web', 's1', 'gone', 100, now=0)
+        s.flow_bytes('web', 's1', 'live', 100, now=0)
+        s.flow_bytes('web', 's1', 'live', 200, now=250)
+        s.flow_bytes('web', 's1', 'live', 300, now=400)
+        self.assertEqual(set(s._seen), {'live'})
+
+    def test_forget_pool(self):
+        s = self.stats
+        s.assigned('s1', 2, now=0)
+        s.assigned('s2', 2, now=0)
+        s.forget_pool('s1')
+        self.assertEqual(s.active, {('s2', 2): 1})
+        # The assignments stay in their windows
+        self.assertEqual(s.report(now=0)['pools']['s1']['backends']['2']['assignments']['60'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.ipv4 import ipv4
+from pox.openflow.discovery import LLDPSender
+
+import hash_lb
+from lb.fairness import FairnessStats
+
+
+class FakeConnection(object):
+    def __init__(self, dpid=1):
+        self.dpid = dpid
+        self.sent = []
+
+    def addListeners(self, sink):
+        pass
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+class Event(object):
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+def packet_in(port, src="10.0.0.1"):
+    i = ipv4(protocol=ipv4.UDP_PROTOCOL, srcip=IPAddr(src),
+             dstip=IPAddr("10.0.0.9"))
+    e = ethernet(type=ethernet.IP_TYPE, src=EthAddr("00:00:00:00:00:01"),
+                 dst=EthAddr("00:00:00:00:00:09"))
+    e.payload = i
+    data = e.pack()
+    return Event(parsed=ethernet(data), port=port,
+                 ofp=of.ofp_packet_in(data=data, in_port=port))
+
+
+def lldp_in(port):
+    e = LLDPSender._create_discovery_packet(2, 1, EthAddr("00:00:00:00:00:02"), 120)
+    return Event(parsed=ethernet(e.pack()), port=port, ofp=None)
+
+
+class HashLoadBalancerTest(unittest.TestCase):
+    def make(self, **kw):
+        self.connection = FakeConnection()
+        lb = hash_lb.HashLoadBalancer(self.connection, **kw)
+        # Ports 2 and 3 go to other switches
+        for port in (2, 3):
+            lb._handle_PacketIn(lldp_in(port))
+        return lb
+
+    def flow_mods(self):
+        return [m for m in self.connection.sent if isinstance(m, of.ofp_flow_mod)]
+
+    def test_classify_and_forward(self):
+        lb = self.make()
+        self.assertEqual(lb.switch_ports, {2, 3})
+        lb._handle_PacketIn(packet_in(1))
+        self.assertEqual(lb.host_ports, {1})
+        mod, out = self.connection.sent
+        self.assertIn(mod.actions[0].port, (2, 3))
+        self.assertEqual(out.actions[0].port, mod.actions[0].port)
+        self.assertEqual(mod.match.in_port, 1)
+        # Nothing to count out, so no timeout or cookie
+        self.assertEqual(mod.cookie, 0)
+        self.assertEqual(mod.idle_timeout, 0)
+
+    def test_not_back_out_of_its_port(self):
+        lb = self.make()
+        for i in range(20):
+            lb._handle_PacketIn(packet_in(2, "10.0.1.%i" % i))
+        self.assertEqual(set(m.actions[0].port for m in self.flow_mods()), {3})
+
+    def flow_removed(self, lb, mod, byte_count=1000):
+        removed = of.ofp_flow_removed(match=mod.match, cookie=mod.cookie,
+                                      byte_count=byte_count)
+        lb._handle_FlowRemoved(Event(ofp=removed))
+
+    def test_bounded_released(self):
+        lb = self.make(selector='bounded')
+        for i in range(4):
+            lb._handle_PacketIn(packet_in(1, "10.0.1.%i" % i))
+        selector = lb._selectors[1]
+        self.assertEqual(selector.total, 4)
+        mods = self.flow_mods()
+        self.assertEqual(mods[0].idle_timeout, hash_lb.FLOW_IDLE_TIMEOUT)
+        self.assertEqual(mods[0].cookie, 1 << 16 | mods[0].actions[0].port)
+        for mod in mods:
+            self.flow_removed(lb, mod)
+        self.assertEqual(selector.total, 0)
+        self.assertEqual(set(selector.loads.values()), {0})
+
+    def test_fairness(self):
+        stats = FairnessStats(start=False)
+        lb = self.make(fairness=stats)
+        for i in range(4):
+            lb._handle_PacketIn(packet_in(1, "10.0.1.%i" % i))
+        self.assertEqual(sum(stats.active.values()), 4)
+        self.assertEqual(set(pool for pool, port in stats.active), {"s1"})
+        mods = self.flow_mods()
+        self.assertEqual(mods[0].flags, of.OFPFF_SEND_FLOW_REM)
+        self.flow_removed(lb, mods[0], 500)
+        self.assertEqual(sum(stats.active.values()), 3)
+        port = mods[0].actions[0].port
+        self.assertEqual(stats.bytes.totals(60)[("s1", port)], 500)
+        # The rest went with the switch
+        lb._handle_ConnectionDown(Event())
+        self.assertEqual(stats.active, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.addresses import IPAddr
+from pox.lib.packet.ipv4 import ipv4
+from pox.lib.packet.tcp import tcp
+from lb.hashing import FlowHasher, FIELDS
+
+A = IPAddr("10.0.0.5")
+B = IPAddr("10.0.0.9")
+
+
+def make_packet(src, dst, sport, dport):
+    t = tcp()
+    t.srcport = sport
+    t.dstport = dport
+    ip = ipv4()
+    ip.srcip = src
+    ip.dstip = dst
+    ip.protocol = ipv4.TCP_PROTOCOL
+    ip.payload = t
+    return ipv4(raw=ip.pack())
+
+
+class FlowHasherTest(unittest.TestCase):
+    def test_fields(self):
+        p1 = make_packet(A, B, 40000, 5001)
+        p2 = make_packet(A, B, 40001, 5001)
+        self.assertEqual(FlowHasher('src').hash(p1), FlowHasher('src').hash(p2))
+        for fields in ('src_port', '5tuple', 'symmetric_l4'):
+            h = FlowHasher(fields)
+            self.assertNotEqual(h.hash(p1), h.hash(p2), fields)
+
+    def test_packet_matches_fields(self):
+        p = make_packet(A, B, 40000, 5001)
+        for fields in FIELDS:
+            h = FlowHasher(fields)
+            self.assertEqual(h.hash(p), h.hash_fields(A, B, ipv4.TCP_PROTOCOL, 40000, 5001))
+
+    def test_symmetric(self):
+        h = FlowHasher('symmetric_l4')
+        self.assertEqual(h.hash(make_packet(A, B, 40000, 5001)),
+                         h.hash(make_packet(B, A, 5001, 40000)))
+        h = FlowHasher('5tuple')
+        self.assertNotEqual(h.hash(make_packet(A, B, 40000, 5001)),
+                            h.hash(make_packet(B, A, 5001, 40000)))
+
+    def test_basis(self):
+        self.assertNotEqual(FlowHasher('src', 1).hash_fields(A),
+                            FlowHasher('src', 2).hash_fields(A))
+
+    def test_unknown(self):
+        self.assertRaises(RuntimeError, FlowHasher, 'dst')
+
+
+if __name__ == '__main__':
+    unittest.main()
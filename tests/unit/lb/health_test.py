@@ -0,0 +1,98 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.arp import arp
+from lb.health import HealthChecker, BackendHealth
+
+VIP = IPAddr("10.0.0.9")
+VMAC = EthAddr("00:00:00:00:00:09")
+SERVERS = [(IPAddr("10.0.0.%i" % i), EthAddr("00:00:00:00:00:0%i" % i))
+           for i in range(1, 3)]
+
+
+class RecordingChecker(HealthChecker):
+    def __init__(self, *args, **kw):
+        kw['start'] = False
+        super(RecordingChecker, self).__init__(*args, **kw)
+        self.sent = []
+
+    def _send(self, dpid, data):
+        self.sent.append((dpid, data))
+        return True
+
+
+class Event(object):
+    def __init__(self, packet):
+        self.parsed = ethernet(packet.pack())
+
+
+def arp_reply(ip, mac):
+    a = arp(opcode=arp.REPLY, protosrc=ip, hwsrc=mac, protodst=VIP, hwdst=VMAC)
+    e = ethernet(type=ethernet.ARP_TYPE, src=mac, dst=VMAC)
+    e.payload = a
+    return Event(e)
+
+
+class HealthCheckerTest(unittest.TestCase):
+    def setUp(self):
+        locations = {SERVERS[0][1]: (1, 1), SERVERS[1][1]: (1, 2)}
+        self.checker = RecordingChecker(SERVERS, locations.get, VIP, VMAC,
+                                        fall=2, rise=2)
+        self.events = []
+        self.checker.addListener(BackendHealth,
+                                 lambda e: self.events.append((e.backend, e.up)))
+
+    def round(self, now, answering):
+        self.checker.probe(now)
+        for ip, mac in SERVERS:
+            if ip in answering:
+                self.assertTrue(self.checker.handle_packet_in(arp_reply(ip, mac)))
+
+    def test_probes(self):
+        self.checker.probe(0)
+        self.assertEqual([dpid for dpid, data in self.checker.sent], [1, 1])
+
+    def test_down_and_up(self):
+        s1, s2 = SERVERS[0][0], SERVERS[1][0]
+        self.round(0, {s1, s2})
+        self.round(1, {s1})
+        self.assertEqual(self.events, [])
+        self.round(2, {s1})
+        self.round(3, {s1})
+        self.assertEqual(self.events, [(s2, False)])
+        self.assertEqual(self.checker.down, {s2})
+        self.round(4, {s1, s2})
+        self.round(5, {s1, s2})
+        self.assertEqual(self.events, [(s2, False), (s2, True)])
+        self.assertTrue(self.checker.is_up(s2))
+
+    def test_tcp_port_per_backend(self):
+        ports = {SERVERS[0][0]: 80}
+        locations = {SERVERS[0][1]: (1, 1), SERVERS[1][1]: (1, 2)}
+        checker = RecordingChecker(SERVERS, locations.get, VIP, VMAC,
+                                   tcp_port=ports.get)
+        checker.probe(0)
+        syns = []
+        for dpid, data in checker.sent:
+            offset = 0
+            while offset < len(data):
+                po = of.ofp_packet_out()
+                offset, length = po.unpack(data, offset)
+                e = ethernet(po.data)
+                if e.type == ethernet.IP_TYPE:
+                    syns.append((e.payload.dstip, e.payload.payload.dstport))
+        self.assertEqual(syns, [(SERVERS[0][0], 80)])
+
+    def test_ignores_others(self):
+        self.checker.probe(0)
+        self.assertFalse(self.checker.handle_packet_in(
+            arp_reply(IPAddr("10.0.0.7"), EthAddr("00:00:00:00:00:07"))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from lb.install import PathInstaller
+
+
+class RecordingInstaller(PathInstaller):
+    def __init__(self, *args, **kw):
+        super(RecordingInstaller, self).__init__(*args, **kw)
+        self.sent = []
+        self.connected = set([1, 2, 3])
+
+    def _send(self, dpid, data):
+        if dpid not in self.connected:
+            return False
+        self.sent.append((dpid, data))
+        return True
+
+
+def message_types(data):
+    types = []
+    offset = 0
+    while offset < len(data):
+        types.append(data[offset + 1])
+        offset += int.from_bytes(data[offset + 2:offset + 4], 'big')
+    return types
+
+
+def barrier_xid(data):
+    offset = 0
+    while offset < len(data):
+        length = int.from_bytes(data[offset + 2:offset + 4], 'big')
+        if data[offset + 1] == of.OFPT_BARRIER_REQUEST:
+            return int.from_bytes(data[offset + 4:offset + 8], 'big')
+        offset += length
+
+
+class PathInstallerTest(unittest.TestCase):
+    def setUp(self):
+        self.installer = RecordingInstaller(timeout=4)
+        self.release = of.ofp_packet_out(action=of.ofp_action_output(port=of.OFPP_TABLE))
+
+    def install(self, now=0):
+        messages = {1: [of.ofp_flow_mod(), of.ofp_flow_mod()], 2: [of.ofp_flow_mod()]}
+        return self.installer.install(messages, release=(1, self.release), now=now)
+
+    def test_one_write_per_switch(self):
+        self.install()
+        self.assertEqual([dpid for dpid, data in self.installer.sent], [1, 2])
+        flow_mod, barrier = of.OFPT_FLOW_MOD, of.OFPT_BARRIER_REQUEST
+        self.assertEqual(message_types(self.installer.sent[0][1]),
+                         [flow_mod, flow_mod, barrier])
+        self.assertEqual(message_types(self.installer.sent[1][1]), [flow_mod, barrier])
+
+    def test_release_after_all_barriers(self):
+        self.install()
+        (d1, data1), (d2, data2) = self.installer.sent
+        self.assertTrue(self.installer.barrier_in(d2, barrier_xid(data2)))
+        self.assertEqual(len(self.installer.sent), 2)
+        self.assertFalse(self.installer.barrier_in(d2, barrier_xid(data2)))
+        self.assertTrue(self.installer.barrier_in(d1, barrier_xid(data1)))
+        self.assertEqual(self.installer.sent[-1], (1, self.release.pack()))
+        self.assertEqual(len(self.installer), 0)
+
+    def test_disconnected_switch(self):
+        self.installer.connected.discard(2)
+        self.assertEqual(self.install(), 1)
+        dpid, data = self.installer.sent[0]
+        self.installer.barrier_in(dpid, barrier_xid(data))
+        self.assertEqual(self.installer.sent[-1], (1, self.release.pack()))
+
+    def test_nothing_to_install(self):
+        self.installer.install({}, release=(1, self.release))
+        self.assertEqual(self.installer.sent, [(1, self.release.pack())])
+
+    def test_forget_switch(self):
+        self.install()
+        self.installer.forget_switch(1)
+        self.installer.forget_switch(2)
+        self.assertEqual(self.installer.sent[-1], (1, self.release.pack()))
+        self.assertEqual(len(self.installer), 0)
+
+    def test_expire(self):
+        self.install(now=0)
+        self.installer.expire(3)
+        self.assertEqual(len(self.installer), 2)
+        self.installer.expire(4)
+        self.assertEqual(len(self.installer), 0)
+        self.assertEqual(len(self.installer.sent), 2)
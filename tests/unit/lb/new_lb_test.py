@@ -0,0 +1,198 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.discovery import Link
+from pox.host_tracker.host_tracker import HostEvent, MacEntry
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ethernet import ethernet
+from pox.lib.packet.ipv4 import ipv4
+from pox.lib.packet.tcp import tcp
+
+import new_lb
+from lb.fairness import FairnessStats
+from lb.install import PathInstaller
+from lb.selection import make_selector
+
+# The client is on switch 1, port 1; switch 1's port 2 goes to switch 2's
+# port 1, and the servers are on switch 2, ports 2 to 5
+CLIENT = IPAddr("10.0.0.100")
+CLIENT_MAC = EthAddr("00:00:00:00:00:64")
+LINKS = [(1, 2, 2, 1)]
+
+
+class RecordingInstaller(PathInstaller):
+    def __init__(self, *args, **kw):
+        super(RecordingInstaller, self).__init__(*args, **kw)
+        self.sent = []
+
+    def _send(self, dpid, data):
+        self.sent.append((dpid, data))
+        return True
+
+
+class Event(object):
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+def flow_mods(data):
+    """ The flow_mods in a write."""
+    found = []
+    offset = 0
+    while offset < len(data):
+        length = int.from_bytes(data[offset + 2:offset + 4], 'big')
+        if data[offset + 1] == of.OFPT_FLOW_MOD:
+            msg = of.ofp_flow_mod()
+            msg.unpack(data[offset:offset + length])
+            found.append(msg)
+        offset += length
+    return found
+
+
+def link_events(added):
+    events = []
+    for d1, p1, d2, p2 in LINKS:
+        for link in (Link(d1, p1, d2, p2), Link(d2, p2, d1, p1)):
+            events.append(Event(added=added, link=link))
+    return events
+
+
+def packet_in(dpid, port, sport, src=CLIENT, src_mac=CLIENT_MAC):
+    t = tcp()
+    t.srcport = sport
+    t.dstport = new_lb.SERVICE_PORT
+    t.off = 5
+    i = ipv4(protocol=ipv4.TCP_PROTOCOL, srcip=src, dstip=new_lb.VIP)
+    i.payload = t
+    e = ethernet(type=ethernet.IP_TYPE, src=src_mac, dst=new_lb.VMAC)
+    e.payload = i
+    data = e.pack()
+    return Event(parsed=ethernet(data), data=data, port=port, dpid=dpid,
+                 ofp=of.ofp_packet_in(data=data, in_port=port), connection=None)
+
+
+class LoadBalancerTest(unittest.TestCase):
+    def setUp(self):
+        self.lb = self.make()
+
+    def make(self, **kw):
+        lb = new_lb.LoadBalancer(**kw)
+        lb.installer = RecordingInstaller()
+        self.connect(lb)
+        macs = [(1, 1, CLIENT_MAC)] + [(2, i + 2, mac)
+                                       for i, mac in enumerate(new_lb.SERVER_MACS)]
+        for dpid, port, mac in macs:
+            lb._handle_host_tracker_HostEvent(HostEvent(MacEntry(dpid, port, mac),
+                                                        join=True))
+        return lb
+
+    def connect(self, lb):
+        for dpid in (1, 2):
+            lb._handle_openflow_ConnectionUp(Event(dpid=dpid, connection=None))
+        for event in link_events(True):
+            lb._handle_openflow_discovery_LinkEvent(event)
+
+    def sent_flow_mods(self, dpid=None):
+        self.lb.installer.sent, sent = [], self.lb.installer.sent
+        return [m for d, data in sent if dpid is None or d == dpid
+                for m in flow_mods(data)]
+
+    def connection(self, sport=40000):
+        self.lb._handle_openflow_PacketIn(packet_in(1, 1, sport))
+        mods = self.sent_flow_mods()
+        first = [m for m in mods if m.cookie]
+        self.assertEqual(len(first), 1)
+        return first[0], mods
+
+    def flow_removed(self, msg, dpid=1):
+        removed = of.ofp_flow_removed(match=msg.match, cookie=msg.cookie,
+                                      byte_count=1000)
+        self.lb._handle_openflow_FlowRemoved(Event(ofp=removed, dpid=dpid))
+
+    def test_path(self):
+        first, mods = self.connection()
+        server = IPAddr(first.cookie)
+        # The first hop, the return rewrite rule, and the server's switch
+        self.assertEqual(len(mods), 3)
+        self.assertEqual(first.actions[-1].port, 2)
+        self.assertIn(new_lb.SERVER_MACS[new_lb.SERVER_IPS.index(server)],
+                      [m.match.dl_dst for m in mods])
+        # The connection's rules and the return rule, to go when it does
+        self.assertEqual(sorted(type(k).__name__ for k in self.lb.server_rules[server]),
+                         ['int', 'tuple'])
+
+    def test_switch_port_ignored(self):
+        # A packet for the VIP coming in from the other switch isn't a client's
+        self.assertFalse(self.lb.paths.is_edge_port(1, 2))
+        self.lb._handle_openflow_PacketIn(packet_in(1, 2, 40000))
+        self.assertEqual(self.lb.installer.sent, [])
+
+    def test_flow_removed(self):
+        lb = self.lb = self.make(selector=make_selector('bounded', new_lb.SERVER_IPS))
+        first, mods = self.connection()
+        server = IPAddr(first.cookie)
+        selector = lb.services.lookup(new_lb.VIP, ipv4.TCP_PROTOCOL,
+                                      new_lb.SERVICE_PORT).pool.selector
+        self.assertEqual(selector.total, 1)
+        self.flow_removed(first)
+        self.assertEqual(selector.total, 0)
+        self.assertEqual(
+            [k for k in lb.server_rules[server] if not isinstance(k, tuple)], [])
+
+    def test_disconnect_releases(self):
+        lb = self.lb = self.make(selector=make_selector('bounded', new_lb.SERVER_IPS))
+        for sport in (40000, 40001):
+            self.connection(sport)
+        selector = lb.services.lookup(new_lb.VIP, ipv4.TCP_PROTOCOL,
+                                      new_lb.SERVICE_PORT).pool.selector
+        self.assertEqual(selector.total, 2)
+        # Switch 2's going doesn't end them; switch 1's does
+        lb._handle_openflow_ConnectionDown(Event(dpid=2))
+        self.assertEqual(selector.total, 2)
+        lb._handle_openflow_ConnectionDown(Event(dpid=1))
+        self.assertEqual(selector.total, 0)
+        self.assertEqual(set(selector.loads.values()), {0})
+
+    def test_disconnect_fairness(self):
+        stats = FairnessStats(start=False)
+        self.lb.set_fairness(stats)
+        self.addCleanup(self.lb.poller.stop)
+        for sport in (40000, 40001):
+            self.connection(sport)
+        self.assertEqual(sum(stats.active.values()), 2)
+        self.lb._handle_openflow_ConnectionDown(Event(dpid=1))
+        self.assertEqual(stats.active, {})
+
+    def test_reconnect(self):
+        self.connection()
+        for event in link_events(False):
+            self.lb._handle_openflow_discovery_LinkEvent(event)
+        self.lb._handle_openflow_ConnectionDown(Event(dpid=1))
+        self.assertTrue(self.lb.paths.is_edge_port(1, 2))
+        self.connect(self.lb)
+        self.assertFalse(self.lb.paths.is_edge_port(1, 2))
+        first, mods = self.connection(40001)
+        self.assertEqual(first.actions[-1].port, 2)
+
+    def test_return_rule_resent(self):
+        first, mods = self.connection()
+        server = IPAddr(first.cookie)
+        # The pair's return rule is already on switch 1
+        first, mods = self.connection(40001)
+        self.assertEqual(len(mods), 2)
+        # But not once it's gone with the switch
+        self.lb._handle_openflow_ConnectionDown(Event(dpid=1))
+        self.assertEqual(self.lb.return_rules, {})
+        self.assertNotIn('return', [k[0] for k in self.lb.server_rules[server]
+                                    if isinstance(k, tuple)])
+        self.connect(self.lb)
+        first, mods = self.connection(40002)
+        self.assertEqual(len(mods), 3)
+        self.assertEqual(len(self.lb.return_rules), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
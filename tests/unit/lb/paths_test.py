@@ -0,0 +1,141 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.discovery import Link
+from lb.paths import PathTable, LeastUtilizedPaths, cook, hop_links
+
+
+def link_both(table, d1, p1, d2, p2):
+    table.add_link(Link(d1, p1, d2, p2))
+    table.add_link(Link(d2, p2, d1, p1))
+
+
+def lab_topology(k=1):
+    """ The six switch topology from topology.py."""
+    t = PathTable(k)
+    link_both(t, 1, 3, 2, 1)
+    link_both(t, 1, 4, 3, 3)
+    link_both(t, 2, 2, 4, 1)
+    link_both(t, 3, 4, 4, 2)
+    link_both(t, 2, 3, 5, 3)
+    link_both(t, 4, 3, 6, 3)
+    link_both(t, 1, 5, 4, 4)
+    link_both(t, 2, 4, 3, 5)
+    return t
+
+
+class PathTableTest(unittest.TestCase):
+    def test_shortest(self):
+        t = lab_topology()
+        path = t.get_path(5, 1)
+        self.assertEqual(path, ((5, None, 3), (2, 3, 1), (1, 3, None)))
+        self.assertEqual(cook(path, 1, 2), [(5, 1, 3), (2, 3, 1), (1, 3, 2)])
+
+    def test_same_switch(self):
+        t = lab_topology()
+        self.assertEqual(cook(t.get_path(3, 3), 1, 2), [(3, 1, 2)])
+
+    def test_unreachable(self):
+        t = lab_topology()
+        self.assertIsNone(t.get_path(5, 7))
+        link_both(t, 6, 4, 7, 1)
+        self.assertEqual(len(t.get_path(5, 7)), 5)
+
+    def test_k_shortest(self):
+        t = lab_topology(k=3)
+        paths = t.get_paths(5, 3)
+        self.assertEqual(len(paths), 3)
+        self.assertEqual([len(p) for p in paths], [3, 4, 4])
+        self.assertEqual(len(set(paths)), 3)
+
+    def test_edge_ports(self):
+        t = lab_topology()
+        self.assertFalse(t.is_edge_port(1, 3))
+        self.assertFalse(t.is_edge_port(2, 1))
+        self.assertTrue(t.is_edge_port(1, 1))
+        # Still a switch port while the other direction is up
+        t.remove_link(Link(1, 3, 2, 1))
+        self.assertFalse(t.is_edge_port(1, 3))
+        t.remove_link(Link(2, 1, 1, 3))
+        self.assertTrue(t.is_edge_port(1, 3))
+        self.assertTrue(t.is_edge_port(2, 1))
+        t.remove_switch(6)
+        self.assertTrue(t.is_edge_port(4, 3))
+        self.assertFalse(t.is_edge_port(4, 1))
+
+    def test_alternatives(self):
+        t = lab_topology()
+        self.assertEqual(t.alternatives(5, 1), (t.get_path(5, 1),))
+        paths = t.alternatives(5, 1, slack=1)
+        self.assertEqual([len(p) for p in paths], [3, 4, 4])
+        self.assertEqual(set(p[1][0] for p in paths), {2})
+        # Not cached, and k doesn't change
+        self.assertEqual(len(t.get_paths(5, 1)), 1)
+        self.assertEqual(t.alternatives(5, 7), ())
+
+    def test_remove_invalidates_only_users(self):
+        t = lab_topology()
+        t.precompute([5, 6], [1, 3])
+        self.assertEqual(len(t), 4)
+        t.remove_link(Link(2, 1, 1, 3))
+        # 5->1 went over 2->1; 6->1 and 6->3 didn't
+        self.assertEqual(len(t), 3)
+        self.assertEqual(len(t.get_path(5, 1)), 4)
+
+    def test_add_invalidates_improved(self):
+        t = lab_topology()
+        t.precompute([5, 6], [1, 3])
+        link_both(t, 5, 4, 1, 6)
+        self.assertEqual(t.get_path(5, 1), ((5, None, 4), (1, 6, None)))
+        self.assertIn((6, 3), t._paths)
+
+    def test_parallel_link_takes_over(self):
+        t = lab_topology()
+        t.add_link(Link(5, 7, 2, 8))
+        t.get_path(5, 1)
+        t.remove_link(Link(5, 3, 2, 3))
+        self.assertEqual(t.get_path(5, 1)[0], (5, None, 7))
+
+    def test_remove_switch(self):
+        t = lab_topology()
+        t.get_path(5, 6)
+        t.remove_switch(2)
+        self.assertIsNone(t.get_path(5, 6))
+
+
+class LeastUtilizedPathsTest(unittest.TestCase):
+    def test_choice_and_invalidation(self):
+        t = lab_topology(k=3)
+        utilization = {}
+        choice = LeastUtilizedPaths(t, utilization, threshold=0.1)
+        shortest = t.get_path(5, 1)
+        self.assertEqual(choice.get_path(5, 1), shortest)
+
+        # Small changes don't move it
+        utilization[(2, 1)] = 0.05
+        self.assertEqual(choice.update({(2, 1): 0.05}), 0)
+        self.assertIs(choice.get_path(5, 1), shortest)
+
+        utilization[(2, 1)] = 0.9
+        self.assertEqual(choice.update({(2, 1): 0.9}), 1)
+        path = choice.get_path(5, 1)
+        self.assertEqual(len(path), 4)
+        self.assertNotIn(2, [h[0] for h in path[2:]])
+
+        # Links no candidate uses don't matter
+        self.assertEqual(choice.update({(6, 4): 0.9}), 0)
+        self.assertEqual(len(choice), 1)
+
+    def test_paths_change(self):
+        t = lab_topology(k=2)
+        choice = LeastUtilizedPaths(t, {})
+        choice.get_path(5, 1)
+        t.remove_link(Link(2, 1, 1, 3))
+        self.assertNotIn((2, 1), hop_links(choice.get_path(5, 1)))
+        self.assertIsNone(choice.get_path(5, 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.addresses import IPAddr
+from lb.proactive import split_prefix, apportion, assign_buckets
+
+
+class BucketTest(unittest.TestCase):
+    def test_split_prefix(self):
+        buckets = split_prefix((IPAddr("10.0.0.0"), 24), 2)
+        self.assertEqual(buckets, [(IPAddr("10.0.0.0"), 26), (IPAddr("10.0.0.64"), 26),
+                                   (IPAddr("10.0.0.128"), 26), (IPAddr("10.0.0.192"), 26)])
+        # Can't split past a single host
+        self.assertEqual(len(split_prefix((IPAddr("10.0.0.0"), 30), 8)), 4)
+
+    def test_apportion(self):
+        self.assertEqual(apportion(16, [1, 1, 2]), [4, 4, 8])
+        self.assertEqual(sum(apportion(10, [1, 1, 1])), 10)
+        self.assertEqual(apportion(4, [0, 0]), [0, 0])
+
+    def test_assign_spreads(self):
+        self.assertEqual(assign_buckets([None] * 8, [1, 1, 1, 1]),
+                         [0, 1, 2, 3, 0, 1, 2, 3])
+
+    def test_reassign_moves_little(self):
+        before = assign_buckets([None] * 64, [1, 1, 1, 1])
+        after = assign_buckets(before, [1, 1, 1, 0])
+        moved = [b for b in range(64) if before[b] != after[b]]
+        # Only the dropped server's buckets move
+        self.assertEqual(len(moved), 16)
+        self.assertTrue(all(before[b] == 3 for b in moved))
+        self.assertNotIn(3, after)
+
+        again = assign_buckets(after, [1, 1, 1, 1])
+        self.assertEqual(sum(1 for b in range(64) if after[b] != again[b]), 16)
+
+    def test_no_servers(self):
+        self.assertEqual(assign_buckets([0, 1], [0, 0]), [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os.path
+import random
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from lb.selection import make_selector, SELECTORS
+
+BACKENDS = ["10.0.0.%i" % i for i in range(1, 9)]
+
+
+class SelectorTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.hashes = [rng.getrandbits(32) for _ in range(2000)]
+
+    def test_empty(self):
+        for name in SELECTORS:
+            self.assertIsNone(make_selector(name).select(1234), name)
+
+    def test_uses_all_backends(self):
+        for name in SELECTORS:
+            s = make_selector(name, BACKENDS)
+            picked = set(s.select(h) for h in self.hashes)
+            self.assertEqual(picked, set(BACKENDS), name)
+
+    def test_removal_only_moves_removed(self):
+        before = make_selector('ring', BACKENDS)
+        after = make_selector('ring', BACKENDS)
+        after.remove_backend(BACKENDS[3])
+        for h in self.hashes:
+            if before.select(h) != BACKENDS[3]:
+                self.assertEqual(before.select(h), after.select(h))
+
+    def test_maglev_disruption(self):
+        before = make_selector('maglev', BACKENDS)
+        after = make_selector('maglev', BACKENDS)
+        after.remove_backend(BACKENDS[3])
+        moved = sum(1 for h in self.hashes if before.select(h) != after.select(h)
+                    and before.select(h) != BACKENDS[3])
+        # Maglev trades a little disruption for balance
+        self.assertLess(moved, len(self.hashes) * 0.05)
+
+    def test_order_independent(self):
+        for name in ('ring', 'maglev'):
+            a = make_selector(name, BACKENDS)
+            b = make_selector(name, list(reversed(BACKENDS)))
+            self.assertEqual([a.select(h) for h in self.hashes],
+                             [b.select(h) for h in self.hashes], name)
+
+    def test_bounded_loads(self):
+        s = make_selector('bounded', BACKENDS, c=1.25)
+        # Every flow hashes to the same place, but nobody goes over the bound
+        for i in range(80):
+            s.select(42)
+        self.assertLessEqual(max(s.loads.values()), 13)
+        self.assertEqual(s.total, 80)
+        for backend, load in list(s.loads.items()):
+            for i in range(load):
+                s.release(backend)
+        self.assertEqual(s.total, 0)
+
+    def test_least_conn_avoids_loaded(self):
+        s = make_selector('least_conn', BACKENDS)
+        s.set_load(BACKENDS[0], flows=1000)
+        picked = [s.select(h) for h in self.hashes]
+        self.assertLess(picked.count(BACKENDS[0]), len(self.hashes) / len(BACKENDS) / 2)
+        # Flows we've handed out since the last report count too
+        self.assertEqual(sum(s.pending.values()), len(self.hashes))
+        s.set_load(BACKENDS[1], flows=0)
+        self.assertEqual(s.pending[BACKENDS[1]], 0)
+
+    def test_least_bytes(self):
+        s = make_selector('least_bytes', BACKENDS)
+        for b in BACKENDS:
+            s.set_load(b, flows=10, rate=100.0)
+        s.set_load(BACKENDS[2], rate=10000.0)
+        picked = [s.select(h) for h in self.hashes]
+        self.assertLess(picked.count(BACKENDS[2]), len(self.hashes) / len(BACKENDS) / 2)
+
+    def test_weights(self):
+        weights = {BACKENDS[0]: 3, BACKENDS[1]: 0.5, BACKENDS[2]: 0}
+        for name in SELECTORS:
+            s = make_selector(name, BACKENDS)
+            self.assertTrue(s.set_weights(weights), name)
+            self.assertFalse(s.set_weights(dict(weights)), name)
+            picked = [s.select(h) for h in self.hashes]
+            share = len(self.hashes) / (len(BACKENDS) - 3 + 3.5)
+            if name != 'bounded':
+                self.assertGreater(picked.count(BACKENDS[0]), share * 2, name)
+            self.assertLess(picked.count(BACKENDS[1]), share * 0.8, name)
+            self.assertEqual(picked.count(BACKENDS[2]), 0, name)
+
+    def test_equal_weights_change_nothing(self):
+        for name in ('modulo', 'ring', 'maglev'):
+            a = make_selector(name, BACKENDS)
+            b = make_selector(name, BACKENDS)
+            b.set_weights({backend: 1 for backend in BACKENDS})
+            self.assertEqual([a.select(h) for h in self.hashes],
+                             [b.select(h) for h in self.hashes], name)
+
+    def test_ring_weight_moves_only_its_flows(self):
+        before = make_selector('ring', BACKENDS)
+        after = make_selector('ring', BACKENDS)
+        after.set_weights({BACKENDS[3]: 0.2})
+        for h in self.hashes:
+            if after.select(h) != before.select(h):
+                self.assertEqual(before.select(h), BACKENDS[3])
+
+    def test_unknown(self):
+        self.assertRaises(RuntimeError, make_selector, 'nope')
+
+
+if __name__ == '__main__':
+    unittest.main()
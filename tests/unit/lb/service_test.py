@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os.path
+import json
+import tempfile
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.lib.packet.ipv4 import ipv4
+from lb.service import Pool, Service, ServiceTable, load_services
+
+TCP = ipv4.TCP_PROTOCOL
+UDP = ipv4.UDP_PROTOCOL
+
+
+def servers(*last):
+    return [(IPAddr("10.0.0.%i" % i), EthAddr("00:00:00:00:00:%02x" % i)) for i in last]
+
+
+class ServiceTableTest(unittest.TestCase):
+    def setUp(self):
+        self.web = Pool('web', servers(1, 2), 'ring')
+        self.table = ServiceTable()
+        self.http = Service("10.0.1.1", "00:00:00:00:01:01", [80, 443], self.web, [TCP])
+        self.table.add(self.http)
+
+    def test_lookup(self):
+        vip = IPAddr("10.0.1.1")
+        self.assertIs(self.table.lookup(vip, TCP, 80), self.http)
+        self.assertIs(self.table.lookup(vip, TCP, 443), self.http)
+        self.assertIsNone(self.table.lookup(vip, UDP, 80))
+        self.assertIsNone(self.table.lookup(vip, TCP, 8080))
+        self.assertIs(self.table.from_backend(IPAddr("10.0.0.2"), TCP, 443), self.http)
+        self.assertIsNone(self.table.from_backend(IPAddr("10.0.0.3"), TCP, 443))
+
+    def test_shared_pool(self):
+        dns = Service("10.0.1.2", "00:00:00:00:01:02", [53], self.web, [UDP])
+        self.table.add(dns)
+        self.assertEqual(list(self.table.pools_of(IPAddr("10.0.0.1"))), [self.web])
+        self.table.remove("10.0.1.1")
+        self.assertEqual(list(self.table.pools_of(IPAddr("10.0.0.1"))), [self.web])
+        self.table.remove("10.0.1.2")
+        self.assertEqual(list(self.table.pools_of(IPAddr("10.0.0.1"))), [])
+        self.assertEqual(self.table.backends, {})
+
+    def test_probe_port(self):
+        dns = Service("10.0.1.2", "00:00:00:00:01:02", [53], Pool('dns', servers(3)), [UDP])
+        self.table.add(dns)
+        self.assertEqual(self.table.probe_port(IPAddr("10.0.0.1")), 80)
+        self.assertIsNone(self.table.probe_port(IPAddr("10.0.0.3")))
+        self.assertIsNone(self.table.probe_port(IPAddr("10.0.0.9")))
+
+    def test_conflicts(self):
+        again = Service("10.0.1.1", "00:00:00:00:01:01", [8080], self.web)
+        self.assertRaises(RuntimeError, self.table.add, again)
+        # The same backend port behind another VIP
+        other = Service("10.0.1.3", "00:00:00:00:01:03", [443], Pool('x', servers(2, 3)))
+        self.assertRaises(RuntimeError, self.table.add, other)
+        self.assertIsNone(self.table.lookup(IPAddr("10.0.1.3"), TCP, 443))
+
+    def test_remove(self):
+        self.assertIs(self.table.remove(IPAddr("10.0.1.1")), self.http)
+        self.assertIsNone(self.table.lookup(IPAddr("10.0.1.1"), TCP, 80))
+        self.assertIsNone(self.table.from_backend(IPAddr("10.0.0.1"), TCP, 80))
+        self.assertIsNone(self.table.remove("10.0.1.1"))
+        self.assertEqual(len(self.table), 0)
+
+    def test_many_vips(self):
+        table = ServiceTable()
+        for i in range(500):
+            pool = Pool(str(i), [(IPAddr("10.1.%i.%i" % (i >> 8, i & 255)),
+                                  EthAddr("02:00:00:00:%02x:%02x" % (i >> 8, i & 255)))])
+            table.add(Service(IPAddr("10.2.%i.%i" % (i >> 8, i & 255)),
+                              "00:00:00:00:01:01", [80], pool))
+        self.assertEqual(len(table), 500)
+        self.assertEqual(table.lookup(IPAddr("10.2.1.7"), UDP, 80).pool.name, "263")
+
+
+class LoadServicesTest(unittest.TestCase):
+    def test_load(self):
+        config = {
+            "pools": {"web": {"servers": [["10.0.0.1", "00:00:00:00:00:01"],
+                                          ["10.0.0.2", "00:00:00:00:00:02"]],
+                              "selector": "maglev"}},
+            "services": [{"vip": "10.0.1.1", "vmac": "00:00:00:00:01:01",
+                          "ports": [80], "protocols": ["tcp"], "pool": "web"},
+                         {"vip": "10.0.1.2", "vmac": "00:00:00:00:01:02",
+                          "ports": [53], "pool": "web", "dsr": True}],
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(config, f)
+        try:
+            services = load_services(f.name)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual([s.vip for s in services], [IPAddr("10.0.1.1"), IPAddr("10.0.1.2")])
+        self.assertIs(services[0].pool, services[1].pool)
+        self.assertEqual(services[0].protocols, (TCP,))
+        self.assertEqual(services[1].protocols, (TCP, UDP))
+        self.assertEqual([s.dsr for s in services], [False, True])
+        self.assertEqual(type(services[0].pool.selector).__name__, 'MaglevSelector')
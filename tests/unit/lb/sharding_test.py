@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os.path
+import socket
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from lb.sharding import SharedState, StateChanged, _Channel, switch_key
+
+
+class Event(object):
+    def __init__(self, dpid):
+        self.dpid = dpid
+
+
+class SharedStateTest(unittest.TestCase):
+    """ A first copy and two others, joined by socket pairs."""
+
+    def setUp(self):
+        self.hub = SharedState(0, 3, start=False)
+        self.workers = []
+        for worker in (1, 2):
+            ours, theirs = socket.socketpair()
+            shared = SharedState(worker, 3, hub=theirs, start=False)
+            self.hub._peers.append(_Channel(ours))
+            self.workers.append(shared)
+        self.pump()
+
+    def tearDown(self):
+        self.hub.close()
+        for shared in self.workers:
+            shared.close()
+
+    def pump(self):
+        """ Read everything each side has been sent, until nothing's left."""
+        for i in range(10):
+            for channel in list(self.hub._peers):
+                channel.sock.setblocking(False)
+                try:
+                    channel.sock.recv(1, socket.MSG_PEEK)
+                except BlockingIOError:
+                    continue
+                self.hub._read(channel)
+            for shared in self.workers:
+                shared._hub.sock.setblocking(False)
+                try:
+                    shared._hub.sock.recv(1, socket.MSG_PEEK)
+                except BlockingIOError:
+                    continue
+                shared._read(shared._hub)
+
+    def test_set_everywhere(self):
+        events = []
+        self.workers[1].addListener(StateChanged,
+                                    lambda e: events.append((e.key, e.value, e.worker)))
+        self.workers[0].set("a", {'x': 1})
+        self.pump()
+        for shared in [self.hub] + self.workers:
+            self.assertEqual(shared.get("a"), {'x': 1})
+        self.assertEqual(events, [("a", {'x': 1}, 1)])
+
+        self.hub.delete("a")
+        self.pump()
+        for shared in [self.hub] + self.workers:
+            self.assertNotIn("a", shared.state)
+
+    def test_joining_gets_state(self):
+        self.hub.set("a", 1)
+        ours, theirs = socket.socketpair()
+        late = SharedState(3, 4, hub=theirs, start=False)
+        self.hub._peers.append(_Channel(ours))
+        self.workers.append(late)
+        self.pump()
+        self.assertEqual(late.get("a"), 1)
+
+    def test_same_key_at_once(self):
+        self.workers[0].set("a", 1)
+        self.workers[1].set("a", 2)
+        self.pump()
+        values = set(shared.get("a") for shared in [self.hub] + self.workers)
+        self.assertEqual(len(values), 1)
+
+    def test_switch_owner(self):
+        self.workers[0]._handle_openflow_ConnectionUp(Event(5))
+        self.pump()
+        self.assertEqual(self.hub.owner(5), 1)
+        # It reconnected to the other one before this one saw it go
+        self.workers[1]._handle_openflow_ConnectionUp(Event(5))
+        self.pump()
+        self.workers[0]._handle_openflow_ConnectionDown(Event(5))
+        self.pump()
+        self.assertEqual(self.hub.owner(5), 2)
+
+    def test_worker_gone(self):
+        self.workers[0].set(switch_key(5), 1)
+        self.workers[1].set(switch_key(6), 2)
+        self.pump()
+        self.workers.pop(0).close()
+        self.pump()
+        self.assertIsNone(self.hub.owner(5))
+        self.assertEqual(self.workers[0].owner(6), 2)
+        self.assertIsNone(self.workers[0].owner(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
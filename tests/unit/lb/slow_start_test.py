@@ -0,0 +1,35 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from lb.slow_start import SlowStart
+
+
+class SlowStartTest(unittest.TestCase):
+    def setUp(self):
+        self.applied = []
+        self.ramp = SlowStart(lambda b, f: self.applied.append((b, f)),
+                              duration=10, steps=5, start=False)
+
+    def test_ramp(self):
+        self.ramp.begin('a', now=100)
+        self.assertEqual(self.ramp.factor('a'), 0.2)
+        for now in range(100, 112):
+            self.ramp.tick(now)
+        self.assertEqual([f for b, f in self.applied], [0.2, 0.4, 0.6, 0.8, 1.0])
+        self.assertNotIn('a', self.ramp)
+        self.assertEqual(self.ramp.factor('a'), 1.0)
+
+    def test_only_applies_changes(self):
+        self.ramp.begin('a', now=0)
+        self.ramp.tick(0.5)
+        self.ramp.tick(1.5)
+        self.assertEqual(len(self.applied), 1)
+
+    def test_cancel(self):
+        self.ramp.begin('a', now=0)
+        self.ramp.cancel('a')
+        self.ramp.tick(5)
+        self.assertEqual(self.applied, [('a', 0.2)])
+        self.assertEqual(self.ramp.factor('a'), 1.0)
@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os.path
+import time
+from unittest import mock
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.core import core
+from lb.stats import StatsPoller, RateWindow, BackendLoad
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+class FakeOpenFlow(object):
+    def __init__(self):
+        self.connections = {}
+
+    def getConnection(self, dpid):
+        return self.connections.get(dpid)
+
+
+class StatsPollerTest(unittest.TestCase):
+    def setUp(self):
+        self.openflow = FakeOpenFlow()
+        patch = mock.patch.object(core, 'openflow', self.openflow, create=True)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.poller = StatsPoller(lambda dpid: [of.ofp_stats_request(
+            body=of.ofp_port_stats_request())], interval=5)
+        self.addCleanup(self.poller.stop)
+
+    def test_once_per_interval(self):
+        connection = self.openflow.connections[1] = FakeConnection()
+        self.poller.add_switch(1)
+        # Taken off and put back, as a switch becoming an edge one can be
+        for i in range(3):
+            self.poller.remove_switch(1)
+            self.poller.add_switch(1)
+        # Ticking for five intervals from when every heap entry is due
+        start = max(d for d, dpid in self.poller._due)
+        for t in range(0, 50):
+            self.poller._poll(start + t * self.poller.tick)
+        self.assertEqual(len(connection.sent), 5)
+
+    def test_removed(self):
+        connection = self.openflow.connections[1] = FakeConnection()
+        self.poller.add_switch(1)
+        self.poller.remove_switch(1)
+        start = time.time() + self.poller.interval
+        for t in range(0, 20):
+            self.poller._poll(start + t * self.poller.tick)
+        self.assertEqual(connection.sent, [])
+
+
+class RateWindowTest(unittest.TestCase):
+    def test_rate(self):
+        w = RateWindow(4)
+        self.assertEqual(w.rate(), 0)
+        for t in range(10):
+            w.add(float(t), t * 100.0)
+        self.assertEqual(w.count, 4)
+        self.assertAlmostEqual(w.rate(), 100.0)
+
+    def test_counter_reset(self):
+        w = RateWindow(4)
+        w.add(0.0, 5000.0)
+        w.add(1.0, 6000.0)
+        w.add(2.0, 10.0)
+        self.assertEqual(w.rate(), 0)
+        w.add(3.0, 60.0)
+        self.assertAlmostEqual(w.rate(), 50.0)
+
+
+class BackendLoadTest(unittest.TestCase):
+    def test_flows_summed_over_switches(self):
+        load = BackendLoad()
+        load.flow_sample(1, {'a': 2, 'b': 1})
+        load.flow_sample(2, {'a': 3})
+        self.assertEqual(load.flows, {'a': 5, 'b': 1})
+        load.flow_sample(1, {'b': 4})
+        self.assertEqual(load.flows, {'a': 3, 'b': 4})
+        load.forget_switch(2)
+        self.assertEqual(load.flows, {'a': 0, 'b': 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.addresses import IPAddr, EthAddr
+from pox.openflow.discovery import Link
+import pox.openflow.nicira as nx
+from lb.paths import PathTable
+from lb.switch_hash import SwitchHashRules
+
+SERVERS = [(IPAddr("10.0.0.%i" % i), EthAddr("00:00:00:00:00:0%i" % i))
+           for i in range(1, 5)]
+
+
+class RecordingRules(SwitchHashRules):
+    def __init__(self, *args, **kw):
+        super(RecordingRules, self).__init__(*args, **kw)
+        self.sent = []
+
+    def _send(self, key, value, command):
+        self.sent.append((key, value))
+        return True
+
+
+class SwitchHashTest(unittest.TestCase):
+    def setUp(self):
+        self.paths = PathTable()
+        for a, b, c, d in [(1, 3, 2, 1), (2, 2, 3, 1)]:
+            self.paths.add_link(Link(a, b, c, d))
+            self.paths.add_link(Link(c, d, a, b))
+        # Two servers on switch 1, two on switch 3, clients on switch 2
+        self.locations = {SERVERS[0][1]: (1, 1), SERVERS[1][1]: (1, 2),
+                          SERVERS[2][1]: (3, 2), SERVERS[3][1]: (3, 3)}
+        self.rules = RecordingRules(IPAddr("10.0.0.9"), 5001, (6,), SERVERS, 4)
+
+    def test_slots(self):
+        self.rules.sync(self.paths, {1, 2, 3}, self.locations)
+        slots = {k[1][1]: v for k, v in self.rules.installed.items()
+                 if k[0] == 2 and k[1][0] == 'slot'}
+        self.assertEqual(len(slots), 16)
+        self.assertEqual(sorted(v[0] for v in slots.values()), sorted(list(range(4)) * 4))
+        # Servers behind the same uplink are told apart by their slots
+        self.assertEqual(set(v[1] for v in slots.values()), {1, 2})
+        self.assertEqual(self.rules.installed[(2, ('hash', 6))], 16)
+
+    def test_server_down_moves_only_its_slots(self):
+        self.rules.sync(self.paths, {1, 2, 3}, self.locations)
+        self.rules.sent = []
+        del self.locations[SERVERS[3][1]]
+        self.rules.sync(self.paths, {1, 2, 3}, self.locations)
+        changed = [k for k, v in self.rules.sent if k[1][0] == 'slot']
+        # Four slots on each of the three edge switches
+        self.assertEqual(len(changed), 12)
+        self.assertFalse(any(k[1][0] == 'hash' for k, v in self.rules.sent))
+
+    def test_multipath_pack(self):
+        a = nx.nx_action_multipath(max_link=15, basis=3, dst=nx.NXM_NX_REG0)
+        packed = a.pack()
+        self.assertEqual(len(packed), 32)
+        b = nx.nx_action_multipath()
+        b.unpack(packed)
+        self.assertEqual(a, b)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.discovery import Link
+from lb.utilization import PortSeries, LinkMonitor, port_speed
+
+
+def port_stats(port_no, tx_bytes, rx_bytes=0, tx_packets=0, rx_packets=0):
+    return of.ofp_port_stats(port_no=port_no, tx_bytes=tx_bytes, rx_bytes=rx_bytes,
+                             tx_packets=tx_packets, rx_packets=rx_packets)
+
+
+class LinkEvent(object):
+    def __init__(self, link, added=True):
+        self.link = link
+        self.added = added
+        self.removed = not added
+
+
+class PortSeriesTest(unittest.TestCase):
+    def test_rates(self):
+        s = PortSeries(4)
+        self.assertFalse(s.add(0.0, 0, 0, 0, 0))
+        self.assertTrue(s.add(2.0, 2000, 1000, 20, 10))
+        self.assertEqual((s.current('tx_bytes'), s.current('rx_bytes')), (1000, 500))
+        self.assertEqual((s.current('tx_packets'), s.current('rx_packets')), (10, 5))
+        # Old and repeated samples are ignored
+        self.assertFalse(s.add(2.0, 5000, 1000, 20, 10))
+
+    def test_ring_and_percentiles(self):
+        s = PortSeries(4)
+        total = 0
+        for t, rate in enumerate([5, 1, 2, 3, 4, 100]):
+            total += rate
+            s.add(float(t + 1), total, 0, 0, 0)
+        self.assertEqual(s.count, 4)
+        # 5 and 1 have been pushed out of the ring by 2, 3, 4 and 100
+        self.assertEqual(s.percentile('tx_bytes', 50), 3)
+        self.assertEqual(s.percentile('tx_bytes', 95), 100)
+        self.assertEqual(s.percentile('tx_bytes', 0), 2)
+        self.assertEqual(s.current(), 100)
+
+    def test_counter_reset(self):
+        s = PortSeries(4)
+        s.add(0.0, 5000, 0, 0, 0)
+        self.assertFalse(s.add(1.0, 10, 0, 0, 0))
+        self.assertTrue(s.add(2.0, 60, 0, 0, 0))
+        self.assertEqual(s.current(), 50)
+
+
+class LinkMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.monitor = LinkMonitor(size=8, default_speed=8000, start=False)
+        self.monitor._handle_openflow_discovery_LinkEvent(LinkEvent(Link(1, 3, 2, 1)))
+        self.events = []
+        self.monitor.addListenerByName('LinkUtilization', self.events.append)
+
+    def test_utilization(self):
+        m = self.monitor
+        m.port_sample(1, [port_stats(3, 0), port_stats(1, 0)], now=0.0)
+        self.assertEqual(self.events, [])
+        m.port_sample(1, [port_stats(3, 500), port_stats(1, 100)], now=1.0)
+        self.assertEqual(self.events[0].links, {(1, 2): 0.5})
+        self.assertEqual(set(self.events[0].ports), {1, 3})
+        self.assertEqual(m.utilization(1, 2), 0.5)
+        self.assertEqual(m.utilization(2, 1), 0)
+
+        report = m.report()['links']
+        self.assertEqual([(l['src'], l['dst'], l['port']) for l in report], [(1, 2, 3)])
+        self.assertEqual(report[0]['utilization'], 0.5)
+        self.assertEqual(report[0]['p95'], 0.5)
+
+        m._handle_openflow_discovery_LinkEvent(LinkEvent(Link(1, 3, 2, 1), added=False))
+        self.assertEqual(m.link_utilization(), {})
+        self.assertEqual(m.report()['links'], [])
+
+    def test_port_speed(self):
+        self.assertEqual(port_speed(of.OFPPF_10GB_FD | of.OFPPF_COPPER), 10 ** 10)
+        self.assertEqual(port_speed(of.OFPPF_100MB_HD), 10 ** 8)
+        self.assertIsNone(port_speed(of.OFPPF_COPPER))
+        self.monitor.speeds[(1, 3)] = 4000
+        self.monitor.port_sample(1, [port_stats(3, 0)], now=0.0)
+        self.monitor.port_sample(1, [port_stats(3, 250)], now=1.0)
+        self.assertEqual(self.monitor.utilization(1, 2), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -100,5 +100,12 @@ class EpollSelectTest(unittest.TestCase):
       check( ([],[],[]), self.es.select(sockets, [], sockets, 0))
       check( ([],sockets,[]), self.es.select(sockets, sockets, sockets, 0))
 
+  def test_closed_socket(self):
+    c = socket.create_connection( (self.ip, self.port))
+    self.es.select([c], [], [c], 0)
+    # closed before it's dropped from the lists
+    c.close()
+    self.assertEqual(([],[],[]), self.es.select([], [], [], 0))
+
 if __name__ == '__main__':
   unittest.main()
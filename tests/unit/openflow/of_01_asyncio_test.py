@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import time
+import socket
+import struct
+import asyncio
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.of_01_asyncio as of_01_asyncio
+
+
+class AsyncioListenerTest (unittest.TestCase):
+  def setUp (self):
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    self.listener = of_01_asyncio.OpenFlow_01_Asyncio(port=port,
+                                                      address='127.0.0.1',
+                                                      use_uvloop=False)
+    self.listener.start()
+    deadline = time.time() + 5
+    while True:
+      try:
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        break
+      except ConnectionRefusedError:
+        if time.time() > deadline: raise
+        time.sleep(0.05)
+    self.sock.settimeout(5)
+    self.buf = b''
+
+  def tearDown (self):
+    self.sock.close()
+    self.listener.stop()
+
+  def next_message (self):
+    while len(self.buf) < 8 or len(self.buf) < struct.unpack_from("!H", self.buf, 2)[0]:
+      data = self.sock.recv(4096)
+      self.assertTrue(data)
+      self.buf += data
+    length = struct.unpack_from("!H", self.buf, 2)[0]
+    msg, self.buf = self.buf[:length], self.buf[length:]
+    return msg
+
+  def wait_for (self, ofp_type):
+    while True:
+      msg = self.next_message()
+      if msg[1] == ofp_type:
+        return msg
+
+  def test_hello (self):
+    self.assertEqual(self.next_message()[1], of.OFPT_HELLO)
+
+  def test_split_echo (self):
+    self.sock.send(of.ofp_hello().pack())
+    raw = of.ofp_echo_request(xid=77, body=b'hi').pack()
+    self.sock.send(raw[:5])
+    time.sleep(0.1)
+    self.sock.send(raw[5:])
+    reply = self.wait_for(of.OFPT_ECHO_REPLY)
+    self.assertEqual(struct.unpack_from("!L", reply, 4)[0], 77)
+    self.assertEqual(reply[8:], b'hi')
+
+  def test_many_echoes (self):
+    self.sock.send(of.ofp_hello().pack())
+    self.sock.send(b''.join(of.ofp_echo_request(xid=i).pack()
+                            for i in range(1, 201)))
+    xids = [struct.unpack_from("!L", self.wait_for(of.OFPT_ECHO_REPLY), 4)[0]
+            for i in range(200)]
+    self.assertEqual(xids, list(range(1, 201)))
+
+
+class NewLoopTest (unittest.TestCase):
+  def test_without_uvloop (self):
+    loop = of_01_asyncio._new_loop(False)
+    self.assertIsInstance(loop, asyncio.AbstractEventLoop)
+    self.assertFalse(type(loop).__module__.startswith('uvloop'))
+    loop.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
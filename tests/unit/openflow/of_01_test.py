@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+import select
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.of_01 as of_01
+
+
+class FakeSocket (object):
+  """
+  Hands out queued chunks of data to recv_into(), and swallows sends
+  """
+  def __init__ (self, chunks=()):
+    self.chunks = list(chunks)
+    self.sent = []
+    self.asked = []
+
+  def recv_into (self, buffer, nbytes=0):
+    self.asked.append(nbytes)
+    if not self.chunks:
+      return 0
+    data = self.chunks[0][:nbytes]
+    self.chunks[0] = self.chunks[0][nbytes:]
+    if not self.chunks[0]:
+      del self.chunks[0]
+    buffer[:len(data)] = data
+    return len(data)
+
+  def send (self, data, *args):
+    self.sent.append(data)
+    return len(data)
+
+
+class FakeSender (object):
+  """
+  Stands in for the DeferredSender, keeping what it's given
+  """
+  def __init__ (self):
+    self.data = {}
+
+  @property
+  def sending (self):
+    return any(self.data.values())
+
+  def send (self, con, data):
+    self.data[con] = self.data.get(con, b'') + data
+
+  def pending (self, con):
+    return len(self.data.get(con, b''))
+
+
+class FakeFlusher (object):
+  def __init__ (self):
+    self.added = []
+
+  def add (self, con):
+    self.added.append(con)
+
+
+class ConnectionReadTest (unittest.TestCase):
+  def setUp (self):
+    self._sender = of_01.deferredSender
+    of_01.deferredSender = FakeSender()
+    self.sock = FakeSocket()
+    self.con = of_01.Connection(self.sock)
+    self.got = []
+    self.con.handlers = [lambda con, msg: self.got.append(msg)] * 32
+
+  def tearDown (self):
+    of_01.deferredSender = self._sender
+
+  def feed (self, *chunks):
+    self.sock.chunks.extend(chunks)
+    while self.sock.chunks:
+      self.assertTrue(self.con.read())
+
+  def test_many_in_one_read (self):
+    msgs = [of.ofp_packet_in(in_port=i, data=b'x' * i, buffer_id=i)
+            for i in range(1, 50)]
+    self.feed(b''.join(m.pack() for m in msgs))
+    self.assertEqual([m.in_port for m in self.got], list(range(1, 50)))
+    self.assertEqual(self.got[3].data, b'xxxx')
+    self.assertIs(type(self.got[3].data), bytes)
+
+  def test_split_messages (self):
+    raw = of.ofp_echo_request(body=b'abc').pack() + of.ofp_barrier_reply(xid=7).pack()
+    # Part of a header, then the rest and part of the next message
+    self.feed(raw[:3])
+    self.assertEqual(self.got, [])
+    self.feed(raw[3:13])
+    self.assertEqual(len(self.got), 1)
+    self.assertEqual(self.got[0].body, b'abc')
+    self.feed(raw[13:])
+    self.assertEqual(self.got[1].xid, 7)
+    self.assertEqual(self.con._buf_start, self.con._buf_end)
+
+  def test_large_message (self):
+    stats = [of.ofp_flow_stats(match=of.ofp_match(in_port=i), byte_count=i)
+             for i in range(600)]
+    raw = of.ofp_stats_reply(body=stats, xid=9).pack()
+    self.assertTrue(len(raw) > 8 * of_01.Connection.RECV_MIN)
+    self.feed(raw)
+    self.assertEqual(len(self.got), 1)
+    self.assertEqual([s.byte_count for s in self.got[0].body], list(range(600)))
+    # The reads got bigger as the reply kept coming
+    self.assertTrue(max(self.sock.asked) > of_01.Connection.RECV_MIN)
+
+  def test_recv_size_shrinks (self):
+    self.con._recv_size = of_01.Connection.RECV_MIN * 8
+    self.feed(of.ofp_barrier_reply().pack())
+    self.assertEqual(self.con._recv_size, of_01.Connection.RECV_MIN * 4)
+
+  def test_bad_version (self):
+    good = of.ofp_barrier_reply(xid=1).pack()
+    bad = b'\x05' + good[1:]
+    self.sock.chunks.append(good + bad)
+    self.assertFalse(self.con.read())
+    # What came before it was still handled
+    self.assertEqual([m.xid for m in self.got], [1])
+
+  def test_closed (self):
+    self.assertFalse(self.con.read())
+
+
+class ConnectionSendTest (unittest.TestCase):
+  def setUp (self):
+    self._sender = of_01.deferredSender
+    self._flusher = of_01.sendFlusher
+    of_01.deferredSender = self.deferred = FakeSender()
+    of_01.sendFlusher = None
+    self.sock = FakeSocket()
+    self.con = of_01.Connection(self.sock)
+    self.con.dpid = 1
+    self.events = []
+    self.con.addListenerByName("Backpressure", self.events.append)
+
+  def tearDown (self):
+    of_01.deferredSender = self._sender
+    of_01.sendFlusher = self._flusher
+
+  def test_immediate_without_flusher (self):
+    self.con.send(of.ofp_barrier_request(xid=5))
+    # The HELLO, then the barrier
+    self.assertEqual(len(self.sock.sent), 2)
+    self.assertEqual(self.sock.sent[1], of.ofp_barrier_request(xid=5).pack())
+
+  def test_coalesced (self):
+    of_01.sendFlusher = flusher = FakeFlusher()
+    calls = []
+    def sendmsg (buffers):
+      calls.append(list(buffers))
+      return sum(len(b) for b in buffers)
+    self.con._sendmsg = sendmsg
+    msgs = [of.ofp_flow_mod(priority=i).pack() for i in range(10)]
+    for m in msgs:
+      self.con.send(m)
+    # Only the first send asks for a flush
+    self.assertEqual(flusher.added, [self.con])
+    self.assertEqual(self.con.send_queue_bytes, sum(len(m) for m in msgs))
+    self.con._flush()
+    self.assertEqual(calls, [msgs])
+    self.assertEqual(self.con.send_queue_bytes, 0)
+
+  def test_partial_send (self):
+    of_01.sendFlusher = FakeFlusher()
+    self.con._sendmsg = lambda buffers: 10
+    a = of.ofp_barrier_request(xid=1).pack()
+    b = of.ofp_barrier_request(xid=2).pack()
+    self.con.send(a)
+    self.con.send(b)
+    self.con._flush()
+    self.assertEqual(self.deferred.data[self.con], (a + b)[10:])
+    # Later data queues up behind it
+    self.con.send(a)
+    self.con._flush()
+    self.assertEqual(self.deferred.data[self.con], (a + b)[10:] + a)
+
+  def test_backpressure (self):
+    of_01.sendFlusher = FakeFlusher()
+    self.con.SEND_HIGH_WATER = 100
+    self.con.SEND_LOW_WATER = 40
+    self.con._sendmsg = lambda buffers: 0
+    for i in range(20):
+      self.con.send(of.ofp_barrier_request(xid=i))
+    self.assertEqual([e.congested for e in self.events], [True])
+    self.assertEqual(self.events[0].queued, 104)
+    self.con._flush()
+    self.assertEqual(len(self.events), 1)
+    # Draining to under the low mark
+    self.deferred.data[self.con] = b'x' * 50
+    self.con._check_backpressure()
+    self.assertEqual(len(self.events), 1)
+    self.deferred.data[self.con] = b'x' * 40
+    self.con._check_backpressure()
+    self.assertEqual([e.congested for e in self.events], [True, False])
+
+  def test_flushed_on_disconnect (self):
+    of_01.sendFlusher = FakeFlusher()
+    self.con.send(of.ofp_barrier_request(xid=3))
+    self.con.disconnect()
+    self.assertEqual(self.sock.sent[-1], of.ofp_barrier_request(xid=3).pack())
+
+
+@unittest.skipUnless(hasattr(select, 'epoll'), "needs epoll")
+class EpollLoopTest (unittest.TestCase):
+  def setUp (self):
+    self._sender = of_01.deferredSender
+    self._flusher = of_01.sendFlusher
+    of_01.deferredSender = FakeSender()
+    of_01.sendFlusher = None
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    self.port = s.getsockname()[1]
+    s.close()
+    self.task = of_01.OpenFlow_01_Task(port=self.port, address='127.0.0.1',
+                                       epoll=True)
+    self.accepted = []
+    accept = self.task._accept
+    def record (listener):
+      con = accept(listener)
+      self.accepted.append(con)
+      return con
+    self.task._accept = record
+    self.loop = self.task.run()
+    self.wait = next(self.loop)
+
+  def tearDown (self):
+    self.loop.close()
+    of_01.deferredSender = self._sender
+    of_01.sendFlusher = self._flusher
+
+  def waiting_on (self):
+    return self.wait._args[0]
+
+  def step (self):
+    """ Wait for the epoll object to be ready and run the loop once."""
+    poller, = self.waiting_on()
+    self.assertTrue(select.select([poller], [], [], 2)[0])
+    self.wait = self.loop.send(([poller], [], []))
+
+  def test_accept_and_close (self):
+    clients = [socket.create_connection(('127.0.0.1', self.port))
+               for i in range(3)]
+    self.step()
+    self.assertEqual(len(self.accepted), 3)
+    # Each said hello
+    for client in clients:
+      client.settimeout(2)
+      self.assertEqual(client.recv(8)[1], of.OFPT_HELLO)
+    # Still just the epoll object to wait on
+    self.assertEqual(len(self.waiting_on()), 1)
+    clients[1].close()
+    self.step()
+    self.assertEqual([c.disconnected for c in self.accepted],
+                     [False, True, False])
+    self.assertEqual(self.accepted[1].sock.fileno(), -1)
+    for client in clients:
+      client.close()
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), "no SO_REUSEPORT")
+class ReusePortTest (unittest.TestCase):
+  def setUp (self):
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    self.port = s.getsockname()[1]
+    s.close()
+
+  def listen (self, reuse_port):
+    task = of_01.OpenFlow_01_Task(port=self.port, address='127.0.0.1',
+                                  reuse_port=reuse_port)
+    listener = task._listen()
+    if listener is not None:
+      self.addCleanup(listener.close)
+    return listener
+
+  def test_shared (self):
+    self.assertIsNotNone(self.listen(True))
+    self.assertIsNotNone(self.listen(True))
+
+  def test_not_shared (self):
+    self.assertIsNotNone(self.listen(False))
+    self.assertIsNone(self.listen(False))
+
+  def test_default (self):
+    old = of_01.OpenFlow_01_Task.REUSE_PORT
+    of_01.OpenFlow_01_Task.REUSE_PORT = True
+    try:
+      self.assertIsNotNone(self.listen(None))
+      self.assertIsNotNone(self.listen(None))
+    finally:
+      of_01.OpenFlow_01_Task.REUSE_PORT = old
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -6,6 +6,7 @@ from mininet.net import Mininet
 from mininet.node import RemoteController
 from mininet.log import setLogLevel
 from mininet.cli import CLI
+import sys
 import threading
 import random
 import time
@@ -23,9 +24,6 @@ class CustomTopo(Topo):
         h7 = self.addHost('h7', mac='00:00:00:00:00:07')
         h8 = self.addHost('h8', mac='00:00:00:00:00:08')
 
-        # virtual host
-        h9 = self.addHost('h9', mac='00:00:00:00:00:09')
-
         # switches
         s1 = self.addSwitch('s1')
         s2 = self.addSwitch('s2')
@@ -54,13 +52,10 @@ class CustomTopo(Topo):
         self.addLink(s1, s4)
         self.addLink(s2, s3)
 
-        # virtual connection
-        self.addLink(s2, h9)
-
 
-def generate_traffic(host):    
+def generate_traffic(host, rng=random):
     while True:
-        traffic_duration = random.randint(1, 15)
+        traffic_duration = rng.randint(1, 15)
         
         target_host = '10.0.0.9'
 
@@ -68,10 +63,10 @@ def generate_traffic(host):
 
         time.sleep(traffic_duration)
 
-        wait_time = random.randint(1, 15)
+        wait_time = rng.randint(1, 15)
         time.sleep(wait_time)
 
-def run():
+def run(dsr=False, seed=None):
     topo = CustomTopo()
     net = Mininet(topo=topo, controller=lambda name: RemoteController(name, ip='127.0.0.1', port=6633))
     net.start()
@@ -80,12 +75,20 @@ def run():
     # Uruchomienie serwerów
     for i in range(1,5):
         host = net.get('h' + str(i))
+        if dsr:
+            # Direct server return: the servers answer from the VIP, but
+            # mustn't answer ARP for it
+            host.cmd('ip addr add 10.0.0.9/32 dev lo')
+            host.cmd('sysctl -w net.ipv4.conf.all.arp_ignore=1')
+            host.cmd('sysctl -w net.ipv4.conf.all.arp_announce=2')
         host.cmd('iperf -s &')
 
     # Generowanie ruchu
+    # With a seed, each client gets its own generator, so a run can be repeated
     for i in range(5,9):
         host = net.get('h' + str(i))
-        t = threading.Thread(target=generate_traffic, args=(host,))
+        rng = random if seed is None else random.Random(seed * 10 + i)
+        t = threading.Thread(target=generate_traffic, args=(host, rng))
         t.setDaemon(True)
         t.start()
     
@@ -94,4 +97,5 @@ def run():
 
 if __name__ == '__main__':
     setLogLevel('info')
-    run()
+    seed = [a.split('=', 1)[1] for a in sys.argv if a.startswith('--seed=')]
+    run(dsr='--dsr' in sys.argv, seed=int(seed[-1]) if seed else None)